@@ -1,17 +1,37 @@
-import os, json, re, time
+import os, json, re, time, hashlib, base64, random, zlib, io, csv
 import requests
-from datetime import datetime
-from collections import Counter
+from datetime import datetime, timedelta, timezone
+from collections import Counter, OrderedDict
 from functools import lru_cache
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import logging
+import threading
+
+try:
+    import numpy as np
+except ImportError:  # без numpy fuzzy-режим матчинга недоступен, работает точное совпадение
+    np = None
+
+try:
+    import ahocorasick  # pyahocorasick: Aho-Corasick на C для поиска ключевых слов
+except ImportError:  # фолбэк — один trie-regex (см. KeywordMatcher)
+    ahocorasick = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # без pyarrow экспорт только в CSV
+    pa = pq = None
 
 from dotenv import load_dotenv
 from flask import (
     Flask, render_template, request, jsonify,
-    session, redirect, url_for, abort, flash
+    redirect, url_for, abort, flash,
+    Response, stream_with_context, g, has_request_context
 )
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.orm import Session, joinedload
 from werkzeug.security import generate_password_hash, check_password_hash
 
 from flask_login import (
@@ -33,12 +53,119 @@ app.url_map.strict_slashes = False
 # =============================
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.join(BASE_DIR, "vector_ai.db")
+def database_url() -> str:
+    """
+    DATABASE_URL или локальный SQLite рядом с app.py.
+    Относительный путь SQLite считается от каталога приложения (а не от instance/),
+    postgres:// (Heroku и т.п.) приводится к postgresql://.
+    """
+    url = (os.getenv("DATABASE_URL") or "").strip()
+    if not url:
+        return "sqlite:///" + os.path.join(BASE_DIR, "vector_ai.db")
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    if url.startswith("sqlite:///"):
+        path = url[len("sqlite:///"):]
+        if path and path != ":memory:" and not os.path.isabs(path):
+            url = "sqlite:///" + os.path.join(BASE_DIR, path)
+    return url
+
+DATABASE_URL = database_url()
+DB_IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+app.config["SQLALCHEMY_DATABASE_URI"] = DATABASE_URL
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
+# SQLite в режиме WAL: читатели не ждут писателя, писатели ждут друг друга до busy_timeout
+SQLITE_WAL = os.getenv("SQLITE_WAL", "1") != "0"
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "15000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# пул соединений: запросы + воркеры _HH_POOL держат по соединению
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "30"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+# для сетевых СУБД (PostgreSQL): проверка соединения перед выдачей и пересоздание старых
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") != "0"
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+def sqlite_is_memory(url: str) -> bool:
+    """sqlite:// и :memory: — SQLAlchemy берёт StaticPool (одно соединение), без QueuePool."""
+    path = url.split("://", 1)[-1].lstrip("/").split("?", 1)[0]
+    return not path or path == ":memory:" or "mode=memory" in url
+
+def sqlite_engine_options() -> dict:
+    opts = {
+        "connect_args": {
+            "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000,
+            # соединение из пула может достаться другому потоку (воркеры, фон)
+            "check_same_thread": False,
+        },
+    }
+    if not sqlite_is_memory(DATABASE_URL):
+        opts.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    return opts
+
+def sqlite_on_connect(dbapi_conn, _record=None):
+    """PRAGMA на каждое новое соединение (journal_mode=WAL сохраняется в самом файле)."""
+    cur = dbapi_conn.cursor()
+    try:
+        if SQLITE_WAL:
+            cur.execute("PRAGMA journal_mode=WAL")
+        if SQLITE_SYNCHRONOUS in ("OFF", "NORMAL", "FULL", "EXTRA"):
+            cur.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cur.execute(f"PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT_MS)}")
+        cur.execute(f"PRAGMA cache_size={-abs(int(SQLITE_CACHE_SIZE_KB))}")  # <0 — в KiB
+        cur.execute(f"PRAGMA mmap_size={int(SQLITE_MMAP_SIZE)}")
+        cur.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cur.close()
+
+def server_engine_options() -> dict:
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = sqlite_engine_options() if DB_IS_SQLITE else server_engine_options()
+
 db = SQLAlchemy()
 db.init_app(app)
 
+if DB_IS_SQLITE:
+    with app.app_context():
+        event.listen(db.engine, "connect", sqlite_on_connect)
+
+# свободный текст (профиль, резюме, названия): длиннее String(n) — обрезаем молча.
+# Ключи и идентификаторы (email, hh_id, role_key) так не помечаются: обрезка сломала бы
+# вход и уникальность, их длину проверяют формы/роуты.
+FREE_TEXT = {"truncate": True}
+EMAIL_MAX_LEN = 190
+HH_ID_MAX_LEN = 30
+
+@event.listens_for(Session, "before_flush")
+def _truncate_string_columns(db_session, _flush_context, _instances):
+    """
+    Обрезает колонки FREE_TEXT по длине String(n) перед записью: SQLite длину не проверяет,
+    PostgreSQL отклоняет весь INSERT/UPDATE — поведение одинаковое на обеих СУБД.
+    """
+    for obj in list(db_session.new) + list(db_session.dirty):
+        table = getattr(obj, "__table__", None)
+        if table is None:
+            continue
+        for col in table.columns:
+            length = getattr(col.type, "length", None)
+            if not length or not col.info.get("truncate"):
+                continue
+            val = getattr(obj, col.key, None)
+            if isinstance(val, str) and len(val) > length:
+                setattr(obj, col.key, val[:length])
+
 # =============================
 # AUTH (Flask-Login) + CSRF
 # =============================
@@ -65,10 +192,18 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "").strip()
 OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://openrouter.ai/api/v1").rstrip("/")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "openai/gpt-4o-mini")
 
+# Матчинг навыков: exact — только точные совпадения, fuzzy — взвешенный по n-граммам (нужен numpy)
+MATCH_MODE = os.getenv("MATCH_MODE", "exact").lower().strip()
+FUZZY_MATCH_THRESHOLD = float(os.getenv("FUZZY_MATCH_THRESHOLD", "0.6"))
+FUZZY_INDEX_TTL = int(os.getenv("FUZZY_INDEX_TTL", "3600"))
+FUZZY_VOCAB_MAX = int(os.getenv("FUZZY_VOCAB_MAX", "5000"))
+
 HH_BASE = "https://api.hh.ru"
 HH_AREA_KZ = 40  # Казахстан
 _INCL_CACHE = {}  # hh_id -> (ts, data)
 _INCL_CACHE_TTL = 24 * 3600  # 24 часа
+INCL_DEGRADED_TTL = int(os.getenv("INCL_DEGRADED_TTL", "300"))  # оценка только по сниппету (hh.ru не отдал вакансию)
+INCL_CLASSIFIER_VERSION = "heur-1"  # поменяй при изменении heuristic_inclusivity — индекс пересчитается
 
 # =============================
 # MODELS
@@ -76,7 +211,7 @@ _INCL_CACHE_TTL = 24 * 3600  # 24 часа
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
     role = db.Column(db.String(20), nullable=False)  # student / employer / admin
-    email = db.Column(db.String(190), unique=True, nullable=False)
+    email = db.Column(db.String(EMAIL_MAX_LEN), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -88,40 +223,45 @@ class Student(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), unique=True, nullable=False, index=True)
 
-    full_name = db.Column(db.String(120), default="")
-    city = db.Column(db.String(120), default="")
-    college = db.Column(db.String(200), default="")
-    speciality = db.Column(db.String(200), default="")
-    start_year = db.Column(db.String(20), default="")
+    full_name = db.Column(db.String(120), default="", info=FREE_TEXT)
+    city = db.Column(db.String(120), default="", info=FREE_TEXT)
+    college = db.Column(db.String(200), default="", info=FREE_TEXT)
+    speciality = db.Column(db.String(200), default="", info=FREE_TEXT)
+    start_year = db.Column(db.String(20), default="", info=FREE_TEXT)
     job_intent = db.Column(db.String(40), default="maybe")
-    region = db.Column(db.String(120), default="Алматы")
+    region = db.Column(db.String(120), default="Алматы", info=FREE_TEXT)
     remote = db.Column(db.Boolean, default=False)
     notify = db.Column(db.Boolean, default=False)
 
-    roles_csv = db.Column(db.String(500), default="")  # "роль1, роль2"
+    roles_csv = db.Column(db.String(500), default="", info=FREE_TEXT)  # "роль1, роль2"
 
     # ===== RESUME / PORTFOLIO =====
-    resume_title = db.Column(db.String(200), default="")
+    resume_title = db.Column(db.String(200), default="", info=FREE_TEXT)
     resume_summary = db.Column(db.Text, default="")
-    resume_contacts = db.Column(db.String(300), default="")  # телефон/telegram/email
+    resume_contacts = db.Column(db.String(300), default="", info=FREE_TEXT)  # телефон/telegram/email
 
-    github_url = db.Column(db.String(300), default="")
-    linkedin_url = db.Column(db.String(300), default="")
-    portfolio_url = db.Column(db.String(300), default="")
+    github_url = db.Column(db.String(300), default="", info=FREE_TEXT)
+    linkedin_url = db.Column(db.String(300), default="", info=FREE_TEXT)
+    portfolio_url = db.Column(db.String(300), default="", info=FREE_TEXT)
 
     projects_json = db.Column(db.Text, default="[]")  # [{name,url,desc}]
 
     # ===== EDUCATION (где учится/учился) =====
-    education_place = db.Column(db.String(200), default="")     # Колледж/ВУЗ/школа
-    education_program = db.Column(db.String(200), default="")   # Направление/программа
-    education_status = db.Column(db.String(80), default="")     # Учусь/Выпускник/и т.д.
-    education_year = db.Column(db.String(40), default="")       # Курс/период
+    education_place = db.Column(db.String(200), default="", info=FREE_TEXT)     # Колледж/ВУЗ/школа
+    education_program = db.Column(db.String(200), default="", info=FREE_TEXT)   # Направление/программа
+    education_status = db.Column(db.String(80), default="", info=FREE_TEXT)     # Учусь/Выпускник/и т.д.
+    education_year = db.Column(db.String(40), default="", info=FREE_TEXT)       # Курс/период
 
     # ===== JOB READINESS =====
     readiness_json = db.Column(db.Text, default="{}")  # {"resume_done":true,...}
+    readiness_score = db.Column(db.Integer, default=0, nullable=False)  # 0..100, см. update_readiness_for_student
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index("ix_student_readiness_score_id", "readiness_score", "id"),
+    )
+
 
 
 class StudentMessage(db.Model):
@@ -132,13 +272,23 @@ class StudentMessage(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 
+def _norm_name_default(ctx) -> str:
+    # считается и для ORM, и для пакетных db.insert(StudentSkill) — по каждой строке
+    return norm_skill(ctx.get_current_parameters().get("name") or "")[:120]
+
 class StudentSkill(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey("student.id"), nullable=False, index=True)
     kind = db.Column(db.String(10), nullable=False)      # soft/hard
-    name = db.Column(db.String(120), nullable=False)
+    name = db.Column(db.String(120), nullable=False, info=FREE_TEXT)
+    norm_name = db.Column(db.String(120), default=_norm_name_default)  # norm_skill(name), для GROUP BY
     score = db.Column(db.Integer, default=0)
 
+    __table_args__ = (
+        db.Index("ix_student_skill_student_kind_score", "student_id", "kind", "score"),
+        db.Index("ix_student_skill_kind_norm_student", "kind", "norm_name", "student_id"),
+    )
+
 
 class StudentAnalysis(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -152,6 +302,10 @@ class StudentAnalysis(db.Model):
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index("ix_student_analysis_student_id_id", "student_id", "id"),
+    )
+
 class SkillSnapshot(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey("student.id"), nullable=False, index=True)
@@ -159,27 +313,35 @@ class SkillSnapshot(db.Model):
 
     personality_type = db.Column(db.String(10), default="")
     skills_json = db.Column(db.Text, default="[]")   # list[{name,score,kind}]
-    note = db.Column(db.String(120), default="после анализа")
+    note = db.Column(db.String(120), default="после анализа", info=FREE_TEXT)
+
+    __table_args__ = (
+        db.Index("ix_skill_snapshot_student_created", "student_id", "created_at"),
+    )
 
 class MarketFitSnapshot(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey("student.id"), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    role = db.Column(db.String(120), default="")
+    role = db.Column(db.String(120), default="", info=FREE_TEXT)
     market_fit_percent = db.Column(db.Integer, default=0)  # 0-100
     missing_json = db.Column(db.Text, default="[]")        # list[str]
     have_json = db.Column(db.Text, default="[]")           # list[str]
     top_market_json = db.Column(db.Text, default="[]")     # list[str]
-    note = db.Column(db.String(120), default="после анализа")
+    note = db.Column(db.String(120), default="после анализа", info=FREE_TEXT)
+
+    __table_args__ = (
+        db.Index("ix_market_fit_snapshot_student_created", "student_id", "created_at"),
+    )
 
 class Employer(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), unique=True, nullable=False, index=True)
 
-    company = db.Column(db.String(200), default="")
-    full_name = db.Column(db.String(120), default="")
-    city = db.Column(db.String(120), default="Алматы")
+    company = db.Column(db.String(200), default="", info=FREE_TEXT)
+    full_name = db.Column(db.String(120), default="", info=FREE_TEXT)
+    city = db.Column(db.String(120), default="Алматы", info=FREE_TEXT)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 
@@ -187,11 +349,15 @@ class EmployerVacancyAnalysis(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     employer_id = db.Column(db.Integer, db.ForeignKey("employer.id"), nullable=False, index=True)
 
-    title = db.Column(db.String(250), default="")
+    title = db.Column(db.String(250), default="", info=FREE_TEXT)
     hh_id = db.Column(db.String(30), default="")
     skills_json = db.Column(db.Text, default="[]")  # list[str]
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index("ix_employer_vacancy_analysis_hh_id_id", "hh_id", "id"),
+    )
+
 
 class CandidateStatus(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -218,14 +384,15 @@ class VacancyApplication(db.Model):
     hh_id = db.Column(db.String(30), nullable=False)   # id вакансии на HH
     hh_url = db.Column(db.Text, nullable=False)
 
-    vacancy_name = db.Column(db.String(255), default="")
-    employer_name = db.Column(db.String(255), default="")
+    vacancy_name = db.Column(db.String(255), default="", info=FREE_TEXT)
+    employer_name = db.Column(db.String(255), default="", info=FREE_TEXT)
 
     status = db.Column(db.String(30), default="sent")  # sent/viewed/interview/rejected/hired
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     __table_args__ = (
         db.UniqueConstraint("student_id", "hh_id", name="uq_student_hh_vacancy"),
+        db.Index("ix_vacancy_application_hh_id", "hh_id"),
     )
 
 
@@ -241,11 +408,103 @@ class VacancySkillSet(db.Model):
 
 
 
+class RoleMarketStats(db.Model):
+    """
+    Материализованная статистика рынка по роли: частоты key_skills с hh.ru.
+    Обновляется фоном; запросы читают одну строку по role_key вместо похода в hh.ru.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    role_key = db.Column(db.String(200), unique=True, nullable=False, index=True)  # нормализованный запрос
+    role = db.Column(db.String(200), default="", info=FREE_TEXT)
+    skills_json = db.Column(db.Text, default="[]")  # [[skill, count], ...] по убыванию
+    vacancies_used = db.Column(db.Integer, default=0)
+    found = db.Column(db.Integer, default=0)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+class MarketDemandPoint(db.Model):
+    """
+    Временной ряд спроса по роли (found + топ навыков).
+    resolution: raw -> hour -> day -> week; старые точки сворачиваются в более грубые бакеты.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    role_key = db.Column(db.String(200), nullable=False)
+    role = db.Column(db.String(200), default="", info=FREE_TEXT)
+    resolution = db.Column(db.String(8), nullable=False, default="raw")
+    ts = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # для бакетов — начало бакета
+    found = db.Column(db.Integer, default=0)  # для бакетов — среднее
+    samples = db.Column(db.Integer, default=1)
+    top_skills_json = db.Column(db.Text, default="[]")  # list[str]
+
+    __table_args__ = (
+        db.Index("ix_market_demand_role_res_ts", "role_key", "resolution", "ts"),
+    )
+
+
+class VacancyInclusivity(db.Model):
+    """
+    Индекс инклюзивности вакансии: результат heuristic_inclusivity по полному тексту.
+    Считается один раз при первом появлении hh_id и обновляется по TTL (24ч) или при смене версии классификатора.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    hh_id = db.Column(db.String(30), unique=True, nullable=False, index=True)
+    categories_json = db.Column(db.Text, default="{}")  # {cat: bool}
+    tags_json = db.Column(db.Text, default="[]")
+    risk_flags_json = db.Column(db.Text, default="[]")
+    note = db.Column(db.Text, default="")
+    classifier_version = db.Column(db.String(20), default="")
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class VacancySignature(db.Model):
+    """
+    MinHash-подпись вакансии (название + работодатель + сниппет) для схлопывания почти-дубликатов.
+    Пересчитывается только если изменился исходный текст (text_hash) или параметры MinHash.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    hh_id = db.Column(db.String(30), unique=True, nullable=False, index=True)
+    text_hash = db.Column(db.String(16), default="")
+    minhash_json = db.Column(db.Text, default="[]")  # [int] * MINHASH_PERM
+    version = db.Column(db.String(20), default="")
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class CohortCell(db.Model):
+    """
+    Ячейка аналитического куба по студентам: город x специальность x колледж x навык.
+    "*" в измерении — все значения (свёртка). Пересчитывается фоном целиком (refresh_cohort_cube).
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    city = db.Column(db.String(120), nullable=False, default="*")
+    speciality = db.Column(db.String(200), nullable=False, default="*")
+    college = db.Column(db.String(200), nullable=False, default="*")
+    skill = db.Column(db.String(120), nullable=False, default="*")  # norm_name hard-навыка
+
+    students = db.Column(db.Integer, default=0)
+    readiness_avg = db.Column(db.Float, default=0.0)
+    readiness_p25 = db.Column(db.Integer, default=0)
+    readiness_p50 = db.Column(db.Integer, default=0)
+    readiness_p75 = db.Column(db.Integer, default=0)
+    readiness_p90 = db.Column(db.Integer, default=0)
+    fit_students = db.Column(db.Integer, default=0)  # у кого есть снапшот соответствия рынку
+    fit_avg = db.Column(db.Float, default=0.0)
+    fit_p50 = db.Column(db.Integer, default=0)
+    fit_p90 = db.Column(db.Integer, default=0)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint("city", "speciality", "college", "skill", name="uq_cohort_cell"),
+        db.Index("ix_cohort_cell_skill_dims", "skill", "speciality", "college", "city"),
+    )
+
 
 @login_manager.user_loader
 def load_user(user_id):
+    # профиль студента/работодателя — тем же запросом (LEFT JOIN), без отдельных SELECT в роутах
     try:
-        return User.query.get(int(user_id))
+        return db.session.get(
+            User, int(user_id),
+            options=[joinedload(User.student), joinedload(User.employer)],
+        )
     except Exception:
         return None
 
@@ -277,6 +536,69 @@ def require_any_role(*roles: str):
         abort(403)
     return None
 
+# =============================
+# REQUEST CONTEXT: текущий студент / работодатель (один раз за запрос)
+# =============================
+_CTX_MISSING = object()
+
+def _ctx_memo(name: str, load):
+    """Значение из flask.g; load() вызывается не больше одного раза за запрос."""
+    val = g.get(name, _CTX_MISSING)
+    if val is _CTX_MISSING:
+        val = load()
+        setattr(g, name, val)
+    return val
+
+def _user_profile(attr: str):
+    if not has_request_context() or not current_user.is_authenticated:
+        return None
+    return getattr(current_user, attr, None)
+
+def current_student():
+    """Student текущего пользователя (подгружен в load_user) или None."""
+    return _ctx_memo("ctx_student", lambda: _user_profile("student"))
+
+def current_employer():
+    """Employer текущего пользователя (подгружен в load_user) или None."""
+    return _ctx_memo("ctx_employer", lambda: _user_profile("employer"))
+
+def current_analysis():
+    """Последний StudentAnalysis текущего студента или None."""
+    def load():
+        st = current_student()
+        if not st:
+            return None
+        return (StudentAnalysis.query
+                .filter_by(student_id=st.id)
+                .order_by(StudentAnalysis.id.desc())
+                .first())
+    return _ctx_memo("ctx_analysis", load)
+
+def current_skills(kind: str | None = None) -> list:
+    """Навыки текущего студента по убыванию score (все — одним запросом), опционально по kind."""
+    def load():
+        st = current_student()
+        if not st:
+            return []
+        return (StudentSkill.query
+                .filter_by(student_id=st.id)
+                .order_by(StudentSkill.score.desc())
+                .all())
+    skills = _ctx_memo("ctx_skills", load)
+    return [s for s in skills if s.kind == kind] if kind else skills
+
+def current_skill_names() -> set:
+    """Нормализованные названия навыков текущего студента."""
+    def load():
+        names = {norm_skill(s.name) for s in current_skills() if s.name}
+        return {x for x in names if x}
+    return _ctx_memo("ctx_skill_names", load)
+
+def reset_student_context():
+    """Сбрасывает кэш запроса после записи профиля/навыков/анализа."""
+    for name in ("ctx_student", "ctx_analysis", "ctx_skills", "ctx_skill_names"):
+        g.pop(name, None)
+
 # =============================
 # TEXT HELPERS: RU guards
 # =============================
@@ -370,13 +692,124 @@ _SKILL_ALIASES = {
     "k8s": "kubernetes",
 }
 
+# =============================
+# SKILL NORMALIZATION (таксономия + trie + мемо-кэш)
+# =============================
+SKILL_TAXONOMY_PATH = os.getenv("SKILL_TAXONOMY_PATH", os.path.join(BASE_DIR, "data", "skill_taxonomy.json"))
+SKILL_NORM_CACHE_SIZE = int(os.getenv("SKILL_NORM_CACHE_SIZE", "16384"))
+
+_NORM_ALLOWED = set("abcdefghijklmnopqrstuvwxyz0123456789абвгдежзийклмнопрстуфхцчшщъыьэюя+#")
+
+class _NormTable(dict):
+    """
+    Таблица для str.translate: разрешённые символы остаются, "ё" -> "е", всё остальное -> пробел.
+    Заполняется лениво (по первому вхождению символа), дальше работает как обычный dict.
+    """
+    def __missing__(self, code):
+        ch = chr(code)
+        out = ch if ch in _NORM_ALLOWED else " "
+        self[code] = out
+        return out
+
+_NORM_TABLE = _NormTable({ord("ё"): "е"})
+
+_TRANSLIT_RU = str.maketrans({
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ж": "zh", "з": "z",
+    "и": "i", "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p",
+    "р": "r", "с": "s", "т": "t", "у": "u", "ф": "f", "х": "kh", "ц": "ts", "ч": "ch",
+    "ш": "sh", "щ": "sch", "ъ": "", "ы": "y", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+})
+
+def _clean_skill_text(s: str) -> str:
+    return " ".join((s or "").lower().translate(_NORM_TABLE).split())
+
+def translit_ru(s: str) -> str:
+    return (s or "").translate(_TRANSLIT_RU)
+
+
+class SkillTrie:
+    """
+    Trie по словам навыка: "postgres sql" -> ["postgres", "sql"] -> "postgres".
+    Кроме полного совпадения умеет находить самый длинный префикс —
+    так "python 3" / "vue 3" сводятся к канону без отдельного алиаса.
+    """
+    __slots__ = ("root", "size")
+
+    def __init__(self):
+        self.root = {}
+        self.size = 0
+
+    def insert(self, phrase: str, canonical: str):
+        node = self.root
+        for tok in phrase.split():
+            node = node.setdefault(tok, {})
+        if None not in node:
+            self.size += 1
+        node[None] = canonical  # None — маркер конца фразы
+
+    def match(self, tokens: list[str]):
+        """-> (canonical, сколько слов съели) для самого длинного префикса, либо (None, 0)."""
+        node = self.root
+        best, used = None, 0
+        for i, tok in enumerate(tokens):
+            node = node.get(tok)
+            if node is None:
+                break
+            if None in node:
+                best, used = node[None], i + 1
+        return best, used
+
+
+def _load_skill_taxonomy(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        skills = data.get("skills") or {}
+        return skills if isinstance(skills, dict) else {}
+    except FileNotFoundError:
+        logging.warning("skill taxonomy not found: %s (используем встроенные алиасы)", path)
+    except Exception:
+        logging.exception("failed to load skill taxonomy: %s", path)
+    return {}
+
+def build_skill_trie(taxonomy: dict) -> SkillTrie:
+    trie = SkillTrie()
+    pairs = list(_SKILL_ALIASES.items())
+    for canon, aliases in (taxonomy or {}).items():
+        pairs.append((canon, canon))
+        pairs.extend((a, canon) for a in (aliases or []) if isinstance(a, str))
+
+    for alias, canon in pairs:
+        a = _clean_skill_text(alias)
+        c = _clean_skill_text(canon)
+        if not a or not c:
+            continue
+        trie.insert(a, c)
+        # транслит кириллических синонимов: "джанго" -> "dzhango"
+        t = translit_ru(a)
+        if t != a:
+            trie.insert(t, c)
+        # слитное написание: "postgre sql" -> "postgresql"
+        if " " in a:
+            trie.insert(a.replace(" ", ""), c)
+    return trie
+
+_SKILL_TRIE = build_skill_trie(_load_skill_taxonomy(SKILL_TAXONOMY_PATH))
+
+
+@lru_cache(maxsize=SKILL_NORM_CACHE_SIZE)
 def norm_skill(s: str) -> str:
-    s = (s or "").lower().strip()
-    s = s.replace("ё", "е")
-    s = re.sub(r"[^a-z0-9а-я\+#\s]", " ", s)
-    s = re.sub(r"\s+", " ", s).strip()
-    if s in _SKILL_ALIASES:
-        return _SKILL_ALIASES[s]
+    s = _clean_skill_text(s)
+    if not s:
+        return s
+    tokens = s.split()
+    canon, used = _SKILL_TRIE.match(tokens)
+    if canon and (used == len(tokens) or all(t.isdigit() for t in tokens[used:])):
+        return canon
+    if len(tokens) > 1:
+        canon, _ = _SKILL_TRIE.match(["".join(tokens)])
+        if canon:
+            return canon
     return s
 
 def strip_html(text: str) -> str:
@@ -489,6 +922,48 @@ def _repair_to_ru_json(bad_text: str, schema_hint: str) -> str:
     return llm_chat(prompt).strip()
 
 
+# =============================
+# BACKGROUND JOBS (периодические задачи в фоне)
+# =============================
+BACKGROUND_JOBS = os.getenv("BACKGROUND_JOBS", "1") == "1"
+
+_BG_JOBS = []  # [{"name", "interval", "fn", "next"}]
+_BG_STARTED = False
+_BG_LOCK = threading.Lock()
+
+def background_job(name: str, interval_s: int):
+    """Регистрирует функцию как периодическую фоновую задачу (выполняется в app_context)."""
+    def deco(fn):
+        _BG_JOBS.append({"name": name, "interval": max(5, int(interval_s)), "fn": fn, "next": 0.0})
+        return fn
+    return deco
+
+def _bg_loop():
+    while True:
+        for job in _BG_JOBS:
+            if time.time() < job["next"]:
+                continue
+            job["next"] = time.time() + job["interval"]
+            try:
+                with app.app_context():
+                    job["fn"]()
+            except Exception:
+                logging.exception("background job failed: %s", job["name"])
+        time.sleep(5)
+
+@app.before_request
+def start_background_jobs():
+    # стартуем на первом запросе: так не запускаемся в процессе-наблюдателе debug-reloader'а
+    global _BG_STARTED
+    if _BG_STARTED or not BACKGROUND_JOBS:
+        return
+    with _BG_LOCK:
+        if _BG_STARTED:
+            return
+        _BG_STARTED = True
+        threading.Thread(target=_bg_loop, name="vector-bg", daemon=True).start()
+
+
 # =============================
 # SIMPLE RATE LIMIT (in-memory)
 # =============================
@@ -511,12 +986,12 @@ def rate_limit(key: str, limit: int = 20, window_s: int = 60) -> bool:
 _HH_CACHE = {}  # (url, frozen_params) -> (ts, json)
 _HH_TTL = 600  # было 30, подняли, чтобы не лагало и не било HH лишний раз
 
-def _hh_get(url: str, params: dict | None = None, timeout: int = 30):
+def _hh_get(url: str, params: dict | None = None, timeout: int = 30, ttl: int | None = None):
     key = (url, tuple(sorted((params or {}).items())))
     now = time.time()
     if key in _HH_CACHE:
         ts, data = _HH_CACHE[key]
-        if now - ts < _HH_TTL:
+        if now - ts < (_HH_TTL if ttl is None else ttl):
             return data
     r = requests.get(url, params=params, timeout=timeout)
     r.raise_for_status()
@@ -538,9 +1013,13 @@ def _safe_load_json(s, default):
     except Exception:
         return default
 
-def update_readiness_for_student(st: Student):
+def readiness_flags(st: Student) -> dict:
+    """Флаги готовности по текущим данным, без записи в студента (для GET-страниц)."""
     r = _safe_load_json(getattr(st, "readiness_json", "") or "{}", {})
-    r["analysis_done"] = bool(StudentAnalysis.query.filter_by(student_id=st.id).first())
+    if st is current_student():
+        r["analysis_done"] = current_analysis() is not None
+    else:
+        r["analysis_done"] = bool(StudentAnalysis.query.filter_by(student_id=st.id).first())
 
     r["resume_done"] = bool(
         (st.resume_title or "").strip()
@@ -553,8 +1032,14 @@ def update_readiness_for_student(st: Student):
 
     apps_count = VacancyApplication.query.filter_by(student_id=st.id).count()
     r["applications_done"] = apps_count >= 5
+    return r
 
+def update_readiness_for_student(st: Student):
+    """Пересчитывает readiness_json и readiness_score (коммит — у вызывающего)."""
+    r = readiness_flags(st)
     st.readiness_json = json.dumps(r, ensure_ascii=False)
+    # хранимый балл: по нему сортируют/фильтруют в SQL (ix_student_readiness_score_id)
+    st.readiness_score = readiness_score(st)
     return r
 
 def readiness_score(st: Student) -> int:
@@ -575,84 +1060,399 @@ def readiness_score(st: Student) -> int:
           .order_by(MarketFitSnapshot.id.desc())
           .first())
     if mf:
-        score += int(round(max(0, min(int(mf.market_fit_percent or 0), 100)) * 0.15))  # 0..15
+        score += (max(0, min(int(mf.market_fit_percent or 0), 100)) * 15 + 50) // 100  # 0..15
 
     return max(0, min(score, 100))
 
+def latest_market_fit_subquery():
+    """(student_id, pct, rn): join с условием rn == 1 даёт последний снапшот соответствия рынку."""
+    return (db.session.query(
+                MarketFitSnapshot.student_id,
+                MarketFitSnapshot.market_fit_percent.label("pct"),
+                db.func.row_number().over(partition_by=MarketFitSnapshot.student_id,
+                                          order_by=MarketFitSnapshot.id.desc()).label("rn"))
+            .subquery())
 
-def save_skill_snapshot(student_id: int, personality_type: str, note: str = "после анализа"):
+def readiness_scores_subquery():
     """
-    Сохраняет историю навыков после каждого анализа.
+    То же, что update_readiness_for_student + readiness_score, но для всех студентов одним SELECT'ом:
+    (id, full_name, city, score). Ничего не пишет.
     """
-    rows = StudentSkill.query.filter_by(student_id=student_id).all()
-    pack = []
-    for s in rows:
-        pack.append({
-            "name": (s.name or ""),
-            "score": int(s.score or 0),
-            "kind": (s.kind or "")
-        })
+    def filled(col):
+        return db.func.trim(db.func.coalesce(col, "")) != ""
+
+    apps = (db.session.query(VacancyApplication.student_id, db.func.count(VacancyApplication.id).label("n"))
+            .group_by(VacancyApplication.student_id)
+            .subquery())
+    mf = latest_market_fit_subquery()
+    pct = db.func.coalesce(mf.c.pct, 0)
+    pct = db.case((pct > 100, 100), (pct < 0, 0), else_=pct)
+
+    score = (
+        db.case((db.and_(filled(Student.resume_title), filled(Student.resume_summary),
+                         filled(Student.resume_contacts)), 25), else_=0)
+        + db.case((db.exists().where(StudentAnalysis.student_id == Student.id), 20), else_=0)
+        # projects_json пишется только с непустыми name (student_resume)
+        + db.case((Student.projects_json.like('%"name": "_%'), 20), else_=0)
+        + db.case((db.func.coalesce(apps.c.n, 0) >= 5, 20), else_=0)
+        + (pct * 15 + 50) // 100
+    )
+    return (db.session.query(Student.id, Student.full_name, Student.city, score.label("score"),
+                             Student.readiness_score.label("stored_score"))
+            .outerjoin(apps, apps.c.student_id == Student.id)
+            .outerjoin(mf, db.and_(mf.c.student_id == Student.id, mf.c.rn == 1))
+            .subquery())
+
+def backfill_readiness_scores(student_ids=None, batch: int = 1000) -> int:
+    """
+    Пересчитывает Student.readiness_score одним агрегатным запросом и обновляет
+    только изменившиеся строки (пачками по batch). Возвращает число обновлённых.
+    """
+    scores = readiness_scores_subquery()
+    q = db.session.query(scores.c.id, scores.c.score, scores.c.stored_score)
+    if student_ids is not None:
+        q = q.filter(scores.c.id.in_(list(student_ids)))
+    changed = [{"id": sid, "readiness_score": int(score or 0)}
+               for sid, score, stored in q.all() if int(score or 0) != int(stored or 0)]
+    for i in range(0, len(changed), batch):
+        db.session.execute(db.update(Student), changed[i:i + batch])
+        db.session.commit()
+    return len(changed)
+
+
+def save_skill_snapshot(student_id: int, personality_type: str, skills: list[dict] | None = None,
+                        note: str = "после анализа") -> SkillSnapshot:
+    """
+    Добавляет в сессию снапшот истории навыков (коммит — у вызывающего).
+    skills — [{name, score, kind}]; если не переданы, берутся из StudentSkill.
+    """
+    if skills is None:
+        skills = [{"name": (s.name or ""), "score": int(s.score or 0), "kind": (s.kind or "")}
+                  for s in StudentSkill.query.filter_by(student_id=student_id).all()]
 
     snap = SkillSnapshot(
         student_id=student_id,
         personality_type=(personality_type or ""),
-        skills_json=json.dumps(pack, ensure_ascii=False),
+        skills_json=json.dumps(skills, ensure_ascii=False),
         note=(note or "после анализа")[:120],
     )
     db.session.add(snap)
-    db.session.commit()
+    return snap
 
 
-def save_market_fit_snapshot(student_id: int, role_query: str):
+def save_market_fit_snapshot(student_id: int, role_query: str, gap: dict | None = None,
+                             note: str = "после анализа") -> MarketFitSnapshot:
     """
-    Сохраняет динамику соответствия рынку труда по роли.
+    Добавляет в сессию снапшот соответствия рынку по роли (коммит — у вызывающего).
+    gap — результат market_gap_for_role; если не передан, считается по навыкам из БД.
     """
-    # навыки студента
-    sskills = StudentSkill.query.filter_by(student_id=student_id).all()
-    student_skill_names = {norm_skill(s.name) for s in sskills if s.name}
-    student_skill_names = {x for x in student_skill_names if x}
-
-    # рынок vs студент
-    gap = market_gap_for_role(role_query, student_skill_names, max_vac=20)
-    top_market = gap.get("top_market") or []
-    missing = gap.get("missing") or []
-    have = gap.get("have") or []
-
-    percent = 0
-    if top_market:
-        percent = int(round(len(have) / len(top_market) * 100))
-    percent = max(0, min(percent, 100))
+    if gap is None:
+        sskills = StudentSkill.query.filter_by(student_id=student_id).all()
+        student_skill_names = {norm_skill(s.name) for s in sskills if s.name}
+        gap = market_gap_for_role(role_query, {x for x in student_skill_names if x}, max_vac=20)
 
     row = MarketFitSnapshot(
         student_id=student_id,
         role=(role_query or "")[:120],
-        market_fit_percent=percent,
-        market_missing_json=json.dumps(missing, ensure_ascii=False),
+        market_fit_percent=max(0, min(market_fit_percent_from_gap(gap), 100)),
+        missing_json=json.dumps(gap.get("missing") or [], ensure_ascii=False),
+        have_json=json.dumps(gap.get("have") or [], ensure_ascii=False),
+        top_market_json=json.dumps(gap.get("top_market") or [], ensure_ascii=False),
+        note=(note or "после анализа")[:120],
     )
     db.session.add(row)
-    db.session.commit()
+    return row
+
+# =============================
+# Общий пул для сетевого fan-out (hh.ru)
+# =============================
+# Один ограниченный пул на процесс: запросы не создают свои потоки,
+# а каждый вызов держит в полёте не больше своей квоты задач.
+HH_POOL_WORKERS = int(os.getenv("HH_POOL_WORKERS", "32"))
 
-    return {"percent": percent, "missing": missing, "have": have}
+_HH_POOL = ThreadPoolExecutor(max_workers=HH_POOL_WORKERS, thread_name_prefix="hh-pool")
 
-def market_gap_for_role(role_query: str, student_skill_names: set[str], max_vac: int = 20):
-    hh = hh_search_vacancies(role_query, area=HH_AREA_KZ, per_page=min(20, max_vac), page=0)
-    items = hh.get("items", []) or []
+def _on_hh_pool() -> bool:
+    return threading.current_thread().name.startswith("hh-pool")
+
+def iter_bounded(fn, items, limit: int, deadline_s: float | None = None, pool=None):
+    """
+    Генератор (item, result) по мере готовности; в полёте не больше limit задач.
+    После дедлайна не начатые задачи не запускаются. Исключения -> None.
+    Закрытие генератора отменяет ещё не стартовавшие задачи.
+    Внутри воркера пула выполняет fn последовательно (иначе вложенный fan-out
+    может занять все потоки и ждать сам себя).
+    """
+    pool = pool or _HH_POOL
+    deadline = (time.time() + deadline_s) if deadline_s else None
+    queue = list(items)
+
+    if pool is _HH_POOL and _on_hh_pool():
+        for item in queue:
+            if deadline is not None and time.time() >= deadline:
+                break
+            try:
+                res = fn(item)
+            except Exception:
+                logging.exception("fanout task failed for %r", item)
+                res = None
+            yield item, res
+        return
+
+    running = {}
+    try:
+        while queue or running:
+            while queue and len(running) < max(1, limit):
+                item = queue.pop(0)
+                running[pool.submit(fn, item)] = item
+
+            timeout = None if deadline is None else max(0.0, deadline - time.time())
+            done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                break  # дедлайн
+
+            for fut in done:
+                item = running.pop(fut)
+                try:
+                    res = fut.result()
+                except Exception:
+                    logging.exception("fanout task failed for %r", item)
+                    res = None
+                yield item, res
+    finally:
+        for fut in running:
+            fut.cancel()
+
+# =============================
+# MARKET: агрегат навыков по роли (кэш отдельно от диффа студента)
+# =============================
+MARKET_ROLE_TTL = int(os.getenv("MARKET_ROLE_TTL", "1800"))
+HH_FETCH_WORKERS = int(os.getenv("HH_FETCH_WORKERS", "8"))  # квота одного подсчёта роли
+ROLE_STATS_TTL = int(os.getenv("ROLE_STATS_TTL", str(6 * 3600)))  # после этого строку обновит фон
+ROLE_STATS_REFRESH_INTERVAL = int(os.getenv("ROLE_STATS_REFRESH_INTERVAL", "300"))
+ROLE_STATS_REFRESH_BATCH = int(os.getenv("ROLE_STATS_REFRESH_BATCH", "10"))
+
+# роли в памяти (кэш и блокировки): ключи приходят из пользовательского текста, держим LRU
+MARKET_ROLE_KEYS_MAX = int(os.getenv("MARKET_ROLE_KEYS_MAX", "512"))
+KNOWN_ROLES_TTL = int(os.getenv("KNOWN_ROLES_TTL", "600"))
+
+_MARKET_ROLE_CACHE = OrderedDict()  # role_key -> (ts, Counter, used)
+_MARKET_ROLE_LOCKS = OrderedDict()  # role_key -> Lock (одна загрузка холодной роли на всех)
+_MARKET_ROLE_LOCKS_GUARD = threading.Lock()
+_KNOWN_ROLES = {"ts": 0.0, "keys": frozenset()}
+
+def bounded_fanout(fn, items: list, limit: int, deadline_s: float | None = None, pool=None) -> dict:
+    """
+    Запускает fn(item) на пуле, держа в полёте не больше limit задач.
+    Возвращает {item: result} для того, что успело до дедлайна. Уже запущенные задачи
+    после дедлайна досчитываются в фоне, не начатые — не запускаются. Исключения -> None.
+    """
+    return dict(iter_bounded(fn, items, limit, deadline_s=deadline_s, pool=pool))
+
+def role_key(role_query: str) -> str:
+    return " ".join((role_query or "").lower().replace("ё", "е").split())[:200]
+
+def _vacancy_key_skills(hh_id: str) -> list[str]:
+    try:
+        v = hh_get_vacancy(hh_id)
+    except Exception:
+        return []
+    out = []
+    for x in (v.get("key_skills") or []):
+        if isinstance(x, dict) and x.get("name"):
+            out.append(norm_skill(x["name"]))
+    return out
+
+def _market_role_cached(key: str):
+    hit = _MARKET_ROLE_CACHE.get(key)
+    if hit and time.time() - hit[0] < MARKET_ROLE_TTL:
+        return hit[1], hit[2]
+    return None
+
+def _market_role_put(key: str, counter: Counter, used: int):
+    with _MARKET_ROLE_LOCKS_GUARD:
+        _MARKET_ROLE_CACHE[key] = (time.time(), counter, used)
+        _MARKET_ROLE_CACHE.move_to_end(key)
+        while len(_MARKET_ROLE_CACHE) > MARKET_ROLE_KEYS_MAX:
+            _MARKET_ROLE_CACHE.popitem(last=False)
+
+def _market_role_lock(key: str) -> threading.Lock:
+    with _MARKET_ROLE_LOCKS_GUARD:
+        lock = _MARKET_ROLE_LOCKS.get(key)
+        if lock is None:
+            lock = _MARKET_ROLE_LOCKS[key] = threading.Lock()
+        _MARKET_ROLE_LOCKS.move_to_end(key)
+        # вытесняем самые старые свободные; занятые остаются, пока их держат
+        for old in list(_MARKET_ROLE_LOCKS)[:max(0, len(_MARKET_ROLE_LOCKS) - MARKET_ROLE_KEYS_MAX)]:
+            if not _MARKET_ROLE_LOCKS[old].locked():
+                del _MARKET_ROLE_LOCKS[old]
+        return lock
+
+def known_role_keys() -> frozenset:
+    """
+    Роли, которые сохраняем в RoleMarketStats и обновляем фоном: дефолтные, отслеживаемые
+    (DEMAND_TRACK_ROLES) и выбранные студентами. Произвольный текст (diploma-analysis и т.п.)
+    считается, но живёт только в памяти.
+    """
+    if time.time() - _KNOWN_ROLES["ts"] < KNOWN_ROLES_TTL:
+        return _KNOWN_ROLES["keys"]
+    keys = {role_key(r) for r in MARKET_DEFAULT_ROLES + DEMAND_TRACK_ROLES + ["Junior Developer"]}
+    try:
+        with db.session.no_autoflush:
+            rows = db.session.query(Student.roles_csv).distinct().all()
+        for (csv_roles,) in rows:
+            keys.update(role_key(r) for r in (csv_roles or "").split(",") if r.strip())
+    except Exception:
+        logging.exception("known roles: DB read failed")
+    _KNOWN_ROLES.update(ts=time.time(), keys=frozenset(keys))
+    return _KNOWN_ROLES["keys"]
+
+def _fetch_role_market(role_query: str, sample: int = 20) -> tuple[Counter, int, int]:
+    """Живой подсчёт по hh.ru: поиск + параллельная загрузка вакансий -> (counter, used, found)."""
+    hh = hh_search_vacancies(role_query, area=HH_AREA_KZ, per_page=min(20, sample), page=0)
+    ids = [str(it.get("id") or "") for it in (hh.get("items", []) or [])]
+    ids = [x for x in ids if x]
 
     counter = Counter()
-    used = 0
-    for it in items:
-        hh_id = str(it.get("id") or "")
-        if not hh_id:
-            continue
-        used += 1
+    for _, skills in iter_bounded(_vacancy_key_skills, ids, HH_FETCH_WORKERS):
+        counter.update(skills or [])
+    return counter, len(ids), int(hh.get("found", 0) or 0)
+
+def _save_role_stats(role_query: str, counter: Counter, used: int, found: int):
+    """
+    Пишет строку RoleMarketStats в отдельной сессии: вызывается с путей чтения,
+    и коммит/откат не должен задевать незавершённые изменения запроса.
+    """
+    key = role_key(role_query)
+    if key not in known_role_keys():
+        return
+    with Session(db.engine) as s:
+        row = s.query(RoleMarketStats).filter_by(role_key=key).first()
+        if not row:
+            row = RoleMarketStats(role_key=key)
+            s.add(row)
+        row.role = (role_query or "")[:200]
+        row.skills_json = json.dumps(counter.most_common(), ensure_ascii=False)
+        row.vacancies_used = int(used)
+        row.found = int(found)
+        row.computed_at = datetime.utcnow()
         try:
-            v = hh_get_vacancy(hh_id)
-            ks = v.get("key_skills") or []
-            for x in ks:
-                if isinstance(x, dict) and x.get("name"):
-                    counter[norm_skill(x["name"])] += 1
+            s.commit()
         except Exception:
-            pass
+            # параллельный воркер успел вставить ту же роль — не критично, данные одинаковые
+            s.rollback()
+            logging.exception("failed to save role market stats for %s", key)
+
+def _counter_from_row(row: RoleMarketStats) -> Counter:
+    pairs = _safe_load_json(row.skills_json or "[]", [])
+    return Counter({k: int(c) for k, c in pairs if k})
+
+def refresh_role_market_stats(role_query: str) -> tuple[Counter, int]:
+    counter, used, found = _fetch_role_market(role_query, sample=20)
+    _save_role_stats(role_query, counter, used, found)
+    _market_role_put(role_key(role_query), counter, used)
+    return counter, used
+
+def _load_role_market(role_query: str, key: str, max_vac: int) -> tuple[Counter, int]:
+    """Загрузка роли под её блокировкой: память -> RoleMarketStats -> hh.ru."""
+    cached = _market_role_cached(key)
+    if cached:
+        return cached
+
+    # без autoflush: незавершённые изменения запроса не должны захватить запись на время загрузки
+    with db.session.no_autoflush:
+        row = RoleMarketStats.query.filter_by(role_key=key).first()
+    if row:
+        counter, used = _counter_from_row(row), int(row.vacancies_used or 0)
+        _market_role_put(key, counter, used)
+        return counter, used
+
+    counter, used, found = _fetch_role_market(role_query, sample=max_vac)
+    _save_role_stats(role_query, counter, used, found)
+    _market_role_put(key, counter, used)
+    return counter, used
+
+def market_role_counter(role_query: str, max_vac: int = 20) -> tuple[Counter, int]:
+    """
+    Частоты key_skills по роли — общий для всех студентов агрегат.
+    Порядок: память (TTL) -> строка RoleMarketStats (один запрос по индексу) -> hh.ru.
+    Устаревшие строки отдаются как есть, их обновляет фоновая задача.
+    Одновременные запросы холодной роли ждут одну загрузку.
+    """
+    key = role_key(role_query)
+
+    cached = _market_role_cached(key)
+    if cached:
+        return cached
+
+    with _market_role_lock(key):
+        return _load_role_market(role_query, key, max_vac)
+
+@background_job("role_market_stats", ROLE_STATS_REFRESH_INTERVAL)
+def refresh_stale_role_market_stats():
+    border = datetime.utcfromtimestamp(time.time() - ROLE_STATS_TTL)
+    rows = (RoleMarketStats.query
+            .filter(RoleMarketStats.computed_at < border,
+                    RoleMarketStats.role_key.in_(known_role_keys()))
+            .order_by(RoleMarketStats.computed_at.asc())
+            .limit(ROLE_STATS_REFRESH_BATCH)
+            .all())
+    for row in rows:
+        try:
+            refresh_role_market_stats(row.role or row.role_key)
+        except Exception:
+            logging.exception("role market refresh failed: %s", row.role_key)
+
+_MARKET_ROLE_WARMING = set()  # role_key, для которых прогрев уже в очереди/в работе
+
+def _warm_role_market(role_query: str):
+    key = role_key(role_query)
+    lock = _market_role_lock(key)
+    # роль уже грузит запрос — он и заполнит кэш; ждать блокировку в потоке пула нельзя:
+    # держатель блокировки сам ждёт свободные потоки пула в iter_bounded
+    if not lock.acquire(blocking=False):
+        _MARKET_ROLE_WARMING.discard(key)
+        return
+    try:
+        with app.app_context():
+            _load_role_market(role_query, key, 20)
+    except Exception:
+        logging.exception("role market warm-up failed: %s", role_query)
+    finally:
+        lock.release()
+        _MARKET_ROLE_WARMING.discard(key)
+
+def cached_role_counter(role_query: str) -> tuple[Counter | None, str]:
+    """
+    Частоты по роли только из кэша: память -> RoleMarketStats. В hh.ru не ходит:
+    холодная роль догружается в общем пуле, ответ — (None, "pending").
+    """
+    key = role_key(role_query)
+    cached = _market_role_cached(key)
+    if cached:
+        return cached[0], "ok"
+
+    with db.session.no_autoflush:
+        row = RoleMarketStats.query.filter_by(role_key=key).first()
+    if row:
+        counter = _counter_from_row(row)
+        _market_role_put(key, counter, int(row.vacancies_used or 0))
+        stale = row.computed_at and (datetime.utcnow() - row.computed_at).total_seconds() >= ROLE_STATS_TTL
+        return counter, ("stale" if stale else "ok")
+
+    with _MARKET_ROLE_LOCKS_GUARD:
+        if key in _MARKET_ROLE_WARMING:
+            return None, "pending"
+        _MARKET_ROLE_WARMING.add(key)
+    try:
+        _HH_POOL.submit(_warm_role_market, role_query)
+    except Exception:
+        _MARKET_ROLE_WARMING.discard(key)
+        raise
+    return None, "pending"
+
+def market_gap_for_role(role_query: str, student_skill_names: set[str], max_vac: int = 20):
+    counter, used = market_role_counter(role_query, max_vac=max_vac)
 
     top_market = [k for k, _ in counter.most_common(20) if k]
     missing = [k for k in top_market if k not in student_skill_names][:12]
@@ -718,6 +1518,10 @@ def register_student_post():
         flash("Введите корректный email и пароль (>=6 символов)", "error")
         return redirect(url_for("register_student"))
 
+    if len(email) > EMAIL_MAX_LEN:
+        flash(f"Email длиннее {EMAIL_MAX_LEN} символов", "error")
+        return redirect(url_for("register_student"))
+
     if User.query.filter_by(email=email).first():
         flash("Этот email уже зарегистрирован", "error")
         return redirect(url_for("register_student"))
@@ -747,6 +1551,10 @@ def register_employer_post():
         flash("Введите корректный email и пароль (>=6 символов)", "error")
         return redirect(url_for("register_employer"))
 
+    if len(email) > EMAIL_MAX_LEN:
+        flash(f"Email длиннее {EMAIL_MAX_LEN} символов", "error")
+        return redirect(url_for("register_employer"))
+
     if User.query.filter_by(email=email).first():
         flash("Этот email уже зарегистрирован", "error")
         return redirect(url_for("register_employer"))
@@ -772,8 +1580,8 @@ def student_dashboard():
     if guard:
         return guard
 
-    st = Student.query.filter_by(user_id=current_user.id).first()
-    sa = StudentAnalysis.query.filter_by(student_id=st.id).order_by(StudentAnalysis.id.desc()).first()
+    st = current_student()
+    sa = current_analysis()
     return render_template("student/student.html", student=st, analysis=sa)
 
 @app.route("/student/onboarding", methods=["GET", "POST"])
@@ -782,11 +1590,12 @@ def student_onboarding():
     if guard:
         return guard
 
-    st = Student.query.filter_by(user_id=current_user.id).first()
+    st = current_student()
     if not st:
         st = Student(user_id=current_user.id)
         db.session.add(st)
         db.session.commit()
+        g.ctx_student = st
 
     if request.method == "POST":
         roles = [x.strip() for x in (request.form.get("roles", "")).split(",") if x.strip()][:5]
@@ -807,7 +1616,10 @@ def student_onboarding():
         StudentMessage.query.filter_by(student_id=st.id).delete()
         StudentSkill.query.filter_by(student_id=st.id).delete()
         StudentAnalysis.query.filter_by(student_id=st.id).delete()
+        reset_student_context()
+        update_readiness_for_student(st)
         db.session.commit()
+        invalidate_skill_frequencies()
 
         return redirect(url_for("student_interview"))
 
@@ -831,7 +1643,7 @@ def student_interview():
     if guard:
         return guard
 
-    st = Student.query.filter_by(user_id=current_user.id).first()
+    st = current_student()
     if not st:
         return redirect(url_for("student_onboarding"))
 
@@ -881,7 +1693,7 @@ def student_api_interview_state():
     if guard:
         return guard
 
-    st = Student.query.filter_by(user_id=current_user.id).first()
+    st = current_student()
     msgs = StudentMessage.query.filter_by(student_id=st.id).order_by(StudentMessage.id.asc()).all()
 
     q_count = 0
@@ -901,7 +1713,7 @@ def student_api_resume_generate():
     if guard:
         return guard
 
-    st = Student.query.filter_by(user_id=current_user.id).first()
+    st = current_student()
     if not st:
         return jsonify({"ok": False, "error": "no_student"}), 400
 
@@ -910,10 +1722,10 @@ def student_api_resume_generate():
         return jsonify({"ok": False, "error": "too_many_requests"}), 429
 
     # данные студента
-    sa = StudentAnalysis.query.filter_by(student_id=st.id).order_by(StudentAnalysis.id.desc()).first()
+    sa = current_analysis()
 
-    hard = StudentSkill.query.filter_by(student_id=st.id, kind="hard").order_by(StudentSkill.score.desc()).all()
-    soft = StudentSkill.query.filter_by(student_id=st.id, kind="soft").order_by(StudentSkill.score.desc()).all()
+    hard = current_skills("hard")
+    soft = current_skills("soft")
 
     profile = {
         "full_name": st.full_name,
@@ -1001,7 +1813,7 @@ def student_resume():
     if guard:
         return guard
 
-    st = Student.query.filter_by(user_id=current_user.id).first()
+    st = current_student()
     if not st:
         return redirect(url_for("student_onboarding"))
 
@@ -1048,7 +1860,7 @@ def student_applications():
     if guard:
         return guard
 
-    st = Student.query.filter_by(user_id=current_user.id).first()
+    st = current_student()
     rows = VacancyApplication.query.filter_by(student_id=st.id).order_by(VacancyApplication.id.desc()).all()
 
     stats = {"sent": 0, "viewed": 0, "interview": 0, "rejected": 0, "hired": 0}
@@ -1065,13 +1877,11 @@ def student_market_bridge():
     if guard:
         return guard
 
-    st = Student.query.filter_by(user_id=current_user.id).first()
+    st = current_student()
     roles = [x.strip() for x in (st.roles_csv or "").split(",") if x.strip()] or ["Junior Developer"]
     q = (request.args.get("q") or roles[0]).strip()
 
-    sskills = StudentSkill.query.filter_by(student_id=st.id).all()
-    student_skill_names = {norm_skill(s.name) for s in sskills if s.name}
-    student_skill_names = {x for x in student_skill_names if x}
+    student_skill_names = current_skill_names()
 
     gap = market_gap_for_role(q, student_skill_names, max_vac=20)
     return render_template("student/market_bridge.html", roles=roles, q=q, gap=gap)
@@ -1079,45 +1889,107 @@ def student_market_bridge():
 
 @app.get("/student/profile")
 def student_profile():
+    """
+    Быстрая "оболочка" профиля: только локальные данные студента.
+    Воронка откликов, рынок и история подгружаются фрагментами (/student/api/profile/*).
+    """
     guard = require_role("student")
     if guard:
         return guard
 
-    st = Student.query.filter_by(user_id=current_user.id).first()
+    st = current_student()
     if not st:
         return redirect(url_for("student_onboarding"))
 
-    sa = (StudentAnalysis.query
-          .filter_by(student_id=st.id)
-          .order_by(StudentAnalysis.id.desc())
-          .first())
+    sa = current_analysis()
+    soft = current_skills("soft")
+    hard = current_skills("hard")
 
-    soft = (StudentSkill.query
-            .filter_by(student_id=st.id, kind="soft")
-            .order_by(StudentSkill.score.desc())
-            .all())
+    projects = _safe_load_json(st.projects_json or "[]", [])
+    # только чтение: хранимый балл обновляют пути записи (анализ, отклик, резюме, онбординг)
+    readiness = readiness_flags(st)
+
+    return render_template(
+        "student/profile.html",
+        student=st,
+        analysis=sa,
+        soft=soft,
+        hard=hard,
+        projects=projects,
+        readiness=readiness,
+    )
 
-    hard = (StudentSkill.query
-            .filter_by(student_id=st.id, kind="hard")
-            .order_by(StudentSkill.score.desc())
+
+# =============================
+# STUDENT PROFILE: JSON-фрагменты (грузятся параллельно, кэшируются по отдельности)
+# =============================
+def _fragment_response(payload: dict, max_age: int):
+    resp = jsonify(payload)
+    resp.headers["Cache-Control"] = f"private, max-age={int(max_age)}"
+    resp.add_etag()
+    return resp.make_conditional(request)
+
+def _fmt_dt(dt) -> str:
+    return dt.strftime("%d.%m.%Y %H:%M") if dt else ""
+
+@csrf.exempt
+@app.get("/student/api/profile/app-stats")
+def student_api_profile_app_stats():
+    guard = require_role("student")
+    if guard:
+        return guard
+
+    st = current_student()
+    if not st:
+        return jsonify({"ok": False, "error": "no_student"}), 400
+
+    rows = (db.session.query(VacancyApplication.status, db.func.count(VacancyApplication.id))
+            .filter(VacancyApplication.student_id == st.id)
+            .group_by(VacancyApplication.status)
             .all())
+    stats = {"sent": 0, "viewed": 0, "interview": 0, "rejected": 0, "hired": 0}
+    for status, cnt in rows:
+        if status in stats:
+            stats[status] = int(cnt)
 
-    projects = _safe_load_json(st.projects_json or "[]", [])
-    readiness = update_readiness_for_student(st)
+    return _fragment_response({"ok": True, "stats": stats}, max_age=30)
 
-    # applications stats
-    rows = VacancyApplication.query.filter_by(student_id=st.id).all()
-    app_stats = {"sent": 0, "viewed": 0, "interview": 0, "rejected": 0, "hired": 0}
-    for r in rows:
-        if r.status in app_stats:
-            app_stats[r.status] += 1
+@csrf.exempt
+@app.get("/student/api/profile/market-gap")
+def student_api_profile_market_gap():
+    guard = require_role("student")
+    if guard:
+        return guard
+
+    st = current_student()
+    if not st:
+        return jsonify({"ok": False, "error": "no_student"}), 400
 
-    # market gap preview by first role
     roles = [x.strip() for x in (st.roles_csv or "").split(",") if x.strip()] or ["Junior Developer"]
-    sskills = StudentSkill.query.filter_by(student_id=st.id).all()
-    student_skill_names = {norm_skill(s.name) for s in sskills if s.name}
-    student_skill_names = {x for x in student_skill_names if x}
-    gap_preview = market_gap_for_role(roles[0], student_skill_names, max_vac=15)
+    student_skill_names = current_skill_names()
+
+    try:
+        gap = market_gap_for_role(roles[0], student_skill_names, max_vac=15)
+    except Exception:
+        logging.exception("profile market gap failed for role=%s", roles[0])
+        return jsonify({"ok": False, "error": "market_unavailable"}), 200
+
+    return _fragment_response({
+        "ok": True,
+        "gap": gap,
+        "percent": market_fit_percent_from_gap(gap),
+    }, max_age=300)
+
+@csrf.exempt
+@app.get("/student/api/profile/history")
+def student_api_profile_history():
+    guard = require_role("student")
+    if guard:
+        return guard
+
+    st = current_student()
+    if not st:
+        return jsonify({"ok": False, "error": "no_student"}), 400
 
     # history snapshots (skills)
     history_rows = (SkillSnapshot.query
@@ -1127,11 +1999,10 @@ def student_profile():
 
     history = []
     for h in history_rows:
-        skills = _safe_load_json(h.skills_json or "[]", [])
         history.append({
-            "created_at": h.created_at,
+            "created_at": _fmt_dt(h.created_at),
             "personality_type": h.personality_type,
-            "skills": skills,
+            "skills": _safe_load_json(h.skills_json or "[]", []),
             "note": h.note
         })
 
@@ -1144,26 +2015,14 @@ def student_profile():
     market_history = []
     for r in market_rows:
         market_history.append({
-            "created_at": r.created_at,
+            "created_at": _fmt_dt(r.created_at),
             "role": r.role,
             "percent": r.market_fit_percent,
             "missing": _safe_load_json(r.missing_json or "[]", []),
             "have": _safe_load_json(r.have_json or "[]", []),
         })
 
-    return render_template(
-        "student/profile.html",
-        student=st,
-        analysis=sa,
-        soft=soft,
-        hard=hard,
-        projects=projects,
-        readiness=readiness,
-        app_stats=app_stats,
-        gap_preview=gap_preview,
-        history=history,
-        market_history=market_history
-    )
+    return _fragment_response({"ok": True, "history": history, "market_history": market_history}, max_age=60)
 
 
 
@@ -1174,7 +2033,7 @@ def student_api_interview():
     if guard:
         return guard
 
-    st = Student.query.filter_by(user_id=current_user.id).first()
+    st = current_student()
 
     msg = ((request.get_json(silent=True) or {}).get("message") or "").strip()
     if not msg:
@@ -1218,14 +2077,30 @@ def student_api_interview():
 
     return jsonify({"ok": True, "answer": answer, "q_count": q_count + 1, "done": False})
 
-@csrf.exempt
-@app.post("/student/api/analyze")
+def _analysis_skill_rows(analysis: dict) -> list[dict]:
+    """soft_skills + hard_skills из ответа LLM -> [{name, score, kind}] (обрезка и clamp 0..100)."""
+    out = []
+    for kind in ("soft", "hard"):
+        for x in (analysis.get(f"{kind}_skills") or []):
+            if not isinstance(x, dict):
+                continue
+            name = (x.get("name") or "").strip()[:120]
+            try:
+                score = int(x.get("score") or 0)
+            except Exception:
+                score = 0
+            if name:
+                out.append({"name": name, "score": max(0, min(score, 100)), "kind": kind})
+    return out
+
+@csrf.exempt
+@app.post("/student/api/analyze")
 def student_api_analyze():
     guard = require_role("student")
     if guard:
         return guard
 
-    st = Student.query.filter_by(user_id=current_user.id).first()
+    st = current_student()
     if not st:
         return jsonify({"ok": False, "error": "no_student"}), 400
 
@@ -1297,114 +2172,58 @@ def student_api_analyze():
     if not analysis.get("personality_type"):
         return jsonify({"ok": False, "error": "bad_analysis", "raw": raw}), 200
 
-    StudentSkill.query.filter_by(student_id=st.id).delete()
-    StudentAnalysis.query.filter_by(student_id=st.id).delete()
-    db.session.commit()
+    skill_rows = _analysis_skill_rows(analysis)
 
-    sa = StudentAnalysis(
-        student_id=st.id,
-        personality_type=analysis.get("personality_type", ""),
-        personality_short=analysis.get("personality_short", ""),
-        top_roles_json=json.dumps(analysis.get("top_roles", []), ensure_ascii=False),
-        learning_plan_json=json.dumps(analysis.get("learning_plan", []), ensure_ascii=False),
-    )
-    db.session.add(sa)
+    # =============================
+    # рынок по ролям — до транзакции: сетевые вызовы не держат блокировку записи
+    # =============================
+    student_skill_names = {norm_skill(x["name"]) for x in skill_rows}
+    student_skill_names = {x for x in student_skill_names if x}
 
-    for x in (analysis.get("soft_skills") or []):
-        name = (x.get("name") or "").strip()
-        try:
-            score = int(x.get("score") or 0)
-        except Exception:
-            score = 0
-        if name:
-            db.session.add(StudentSkill(student_id=st.id, kind="soft", name=name, score=max(0, min(score, 100))))
+    roles_for_market = [str(r).strip() for r in (analysis.get("top_roles") or []) if str(r).strip()][:3]
+    if not roles_for_market:
+        roles_for_market = [x.strip() for x in (st.roles_csv or "").split(",") if x.strip()][:3]
 
-    for x in (analysis.get("hard_skills") or []):
-        name = (x.get("name") or "").strip()
+    gaps = {}
+    for role in roles_for_market:
         try:
-            score = int(x.get("score") or 0)
+            gaps[role] = market_gap_for_role(role, student_skill_names, max_vac=20)
         except Exception:
-            score = 0
-        if name:
-            db.session.add(StudentSkill(student_id=st.id, kind="hard", name=name, score=max(0, min(score, 100))))
-
-    # --- сохраняем навыки/анализ ---
-    db.session.commit()
+            logging.exception("market gap failed for role=%s", role)
 
     # =============================
-    # ✅ HISTORY: SkillSnapshot (история навыков)
+    # один unit of work: анализ, навыки и история — одним коммитом
     # =============================
     try:
-        snap_skills = []
-        for x in (analysis.get("soft_skills") or []):
-            n = (x.get("name") or "").strip()
-            sc = int(x.get("score") or 0)
-            if n:
-                snap_skills.append({"name": n, "score": max(0, min(sc, 100)), "kind": "soft"})
-
-        for x in (analysis.get("hard_skills") or []):
-            n = (x.get("name") or "").strip()
-            sc = int(x.get("score") or 0)
-            if n:
-                snap_skills.append({"name": n, "score": max(0, min(sc, 100)), "kind": "hard"})
-
-        db.session.add(SkillSnapshot(
+        StudentSkill.query.filter_by(student_id=st.id).delete(synchronize_session=False)
+        StudentAnalysis.query.filter_by(student_id=st.id).delete(synchronize_session=False)
+
+        sa = StudentAnalysis(
             student_id=st.id,
             personality_type=analysis.get("personality_type", ""),
-            skills_json=json.dumps(snap_skills, ensure_ascii=False),
-            note="после анализа"
-        ))
-        db.session.commit()
-    except Exception:
-        db.session.rollback()
-
-    # =============================
-    # ✅ HISTORY: MarketFitSnapshot (динамика соответствия рынку)
-    # =============================
-    try:
-        # построим skill_set студента из анализа (быстро, без запросов к БД)
-        student_skill_names = set()
-        for it in (analysis.get("soft_skills") or []) + (analysis.get("hard_skills") or []):
-            n = (it.get("name") or "").strip()
-            if n:
-                student_skill_names.add(norm_skill(n))
-        student_skill_names = {x for x in student_skill_names if x}
+            personality_short=analysis.get("personality_short", ""),
+            top_roles_json=json.dumps(analysis.get("top_roles", []), ensure_ascii=False),
+            learning_plan_json=json.dumps(analysis.get("learning_plan", []), ensure_ascii=False),
+        )
+        db.session.add(sa)
 
-        roles_for_market = (analysis.get("top_roles") or [])[:3]
-        if not roles_for_market:
-            roles_for_market = [x.strip() for x in (st.roles_csv or "").split(",") if x.strip()][:3]
+        if skill_rows:
+            db.session.execute(db.insert(StudentSkill), [{"student_id": st.id, **x} for x in skill_rows])
 
-        for role in roles_for_market:
-            try:
-                gap = market_gap_for_role(role, student_skill_names, max_vac=20)
-                mf = market_fit_percent_from_gap(gap)
-
-                db.session.add(MarketFitSnapshot(
-                    student_id=st.id,
-                    role=role,
-                    market_fit_percent=max(0, min(int(mf), 100)),
-                    missing_json=json.dumps(gap.get("missing") or [], ensure_ascii=False),
-                    have_json=json.dumps(gap.get("have") or [], ensure_ascii=False),
-                    top_market_json=json.dumps(gap.get("top_market") or [], ensure_ascii=False),
-                    note="после анализа"
-                ))
-            except Exception:
-                continue
+        save_skill_snapshot(st.id, sa.personality_type, skills=skill_rows)
+        for role, gap in gaps.items():
+            save_market_fit_snapshot(st.id, role, gap=gap)
 
+        reset_student_context()
+        update_readiness_for_student(st)
         db.session.commit()
     except Exception:
         db.session.rollback()
-    # === NEW: сохраняем историю навыков + динамику соответствия рынку ===
-    try:
-        # 1) история навыков
-        save_skill_snapshot(st.id, sa.personality_type, note="после анализа")
+        logging.exception("analysis saving failed")
+        return jsonify({"ok": False, "error": "save_failed"}), 500
+    reset_student_context()
+    invalidate_skill_frequencies()
 
-        # 2) динамика рынка по первой роли
-        roles2 = analysis.get("top_roles") or [x.strip() for x in (st.roles_csv or "").split(",") if x.strip()]
-        role0 = (roles2[0] if roles2 else "Junior Developer")
-        save_market_fit_snapshot(st.id, role0)
-    except Exception:
-        logging.exception("snapshot saving failed")
     return jsonify({"ok": True, "analysis": analysis})
 
 @app.get("/student/result")
@@ -1413,8 +2232,8 @@ def student_result():
     if guard:
         return guard
 
-    st = Student.query.filter_by(user_id=current_user.id).first()
-    sa = StudentAnalysis.query.filter_by(student_id=st.id).order_by(StudentAnalysis.id.desc()).first()
+    st = current_student()
+    sa = current_analysis()
     if not sa:
         return redirect(url_for("student_interview"))
 
@@ -1423,8 +2242,8 @@ def student_result():
         "personality_short": sa.personality_short,
         "top_roles": json.loads(sa.top_roles_json or "[]"),
         "learning_plan": json.loads(sa.learning_plan_json or "[]"),
-        "soft_skills": [{"name": s.name, "score": s.score} for s in StudentSkill.query.filter_by(student_id=st.id, kind="soft").all()],
-        "hard_skills": [{"name": s.name, "score": s.score} for s in StudentSkill.query.filter_by(student_id=st.id, kind="hard").all()],
+        "soft_skills": [{"name": s.name, "score": s.score} for s in current_skills("soft")],
+        "hard_skills": [{"name": s.name, "score": s.score} for s in current_skills("hard")],
     }
 
     profile = {
@@ -1446,9 +2265,160 @@ def student_result():
 # =============================
 # MATCH HELPERS (единая формула + каноника навыков по hh_id)
 # =============================
-def compute_match_percent(vacancy_skills: set[str], student_skill_names: set[str]) -> int:
+class SkillVectorIndex:
+    """
+    Словарь навыков как TF-IDF векторы символьных n-грамм (разреженные строки, CSR).
+    Сходство считается на запрос: строка навыка вакансии x навыки студента, без матрицы terms x terms.
+    Кириллица транслитерируется, поэтому "постгрес" и "postgre sql" живут в одном пространстве.
+    """
+
+    def __init__(self, terms: Counter, n: int = 3):
+        """terms — {навык: частота}; в словарь попадают FUZZY_VOCAB_MAX самых частых."""
+        self.n = n
+        ranked = sorted((t for t in terms if t), key=lambda t: (-terms[t], t))
+        self.terms = ranked[:FUZZY_VOCAB_MAX]
+        # не вошедшие по частоте — не "новые": иначе каждый запрос снова запускал бы пересборку
+        self.excluded = set(ranked[FUZZY_VOCAB_MAX:])
+        self.pos = {t: i for i, t in enumerate(self.terms)}
+
+        gram_ids = {}
+        indptr, indices, counts = [0], [], []
+        for t in self.terms:
+            for gram, c in Counter(self._grams(t)).items():
+                indices.append(gram_ids.setdefault(gram, len(gram_ids)))
+                counts.append(c)
+            indptr.append(len(indices))
+
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        df = np.bincount(self.indices, minlength=len(gram_ids))
+        idf = np.log((1.0 + len(self.terms)) / (1.0 + df)) + 1.0
+        data = np.asarray(counts, dtype=np.float32) * idf[self.indices].astype(np.float32)
+        if len(data):
+            norms = np.sqrt(np.add.reduceat(data * data, self.indptr[:-1]))
+            data /= np.repeat(norms, np.diff(self.indptr)).astype(np.float32)
+        self.data = data
+
+        self.built_at = time.time()
+        self.unseen = set()
+
+    def _grams(self, term: str) -> list[str]:
+        t = " " + "".join(translit_ru(term).split()) + " "
+        if len(t) <= self.n:
+            return [t]
+        return [t[i:i + self.n] for i in range(len(t) - self.n + 1)]
+
+    def _row(self, i: int):
+        lo, hi = self.indptr[i], self.indptr[i + 1]
+        return self.indices[lo:hi], self.data[lo:hi]
+
+    def _note_unseen(self, term: str):
+        if term not in self.excluded:
+            self.unseen.add(term)
+
+    def best_scores(self, vacancy_skills: set[str], student_skill_names: set[str]) -> list[float]:
+        """Для каждого навыка вакансии — лучшее сходство с навыками студента (0..1)."""
+        stud_idx = [self.pos[s] for s in student_skill_names if s in self.pos]
+        for s in student_skill_names:
+            if s not in self.pos:
+                self._note_unseen(s)
+
+        # навыки студента — плотный блок по их же n-граммам (обычно десятки x сотни)
+        block = local = None
+        if stud_idx:
+            rows = [self._row(j) for j in stud_idx]
+            local = np.unique(np.concatenate([ix for ix, _ in rows]))
+            block = np.zeros((len(rows), len(local)), dtype=np.float32)
+            for r, (ix, w) in enumerate(rows):
+                block[r, np.searchsorted(local, ix)] = w
+
+        out = []
+        for v in vacancy_skills:
+            if v in student_skill_names:
+                out.append(1.0)
+                continue
+            i = self.pos.get(v)
+            if i is None:
+                self._note_unseen(v)
+                out.append(0.0)
+                continue
+            best = 0.0
+            if block is not None:
+                ix, w = self._row(i)
+                at = np.searchsorted(local, ix)
+                hit = (at < len(local)) & (local[np.minimum(at, len(local) - 1)] == ix)
+                if hit.any():
+                    best = float((block[:, at[hit]] @ w[hit]).max())
+            out.append(best if best >= FUZZY_MATCH_THRESHOLD else 0.0)
+        return out
+
+
+_FUZZY_INDEX = None
+_FUZZY_LOCK = threading.Lock()
+
+def _iter_trie_canonicals(node):
+    for key, child in node.items():
+        if key is None:
+            yield child
+        else:
+            yield from _iter_trie_canonicals(child)
+
+def _fuzzy_vocabulary() -> Counter:
+    """Навык -> частота (каноники вакансий + навыки студентов); таксономия всегда в словаре."""
+    terms = Counter()
+    try:
+        with app.app_context():
+            for (raw,) in db.session.query(VacancySkillSet.skills_json).all():
+                terms.update(build_skill_set(_safe_load_json(raw or "[]", [])))
+            rows = (db.session.query(StudentSkill.name, db.func.count(StudentSkill.id))
+                    .group_by(StudentSkill.name)
+                    .all())
+            for name, cnt in rows:
+                k = norm_skill(name)
+                if k:
+                    terms[k] += int(cnt)
+    except Exception:
+        logging.exception("fuzzy vocabulary: DB read failed, using taxonomy only")
+    top = max(terms.values(), default=0) + 1
+    for t in _iter_trie_canonicals(_SKILL_TRIE.root):
+        terms[t] += top
+    return terms
+
+def get_fuzzy_index():
+    """
+    Ленивая сборка индекса; пересобираем по TTL или когда накопилось много новых навыков.
+    Пока идёт пересборка, запросы пользуются старым индексом.
+    """
+    global _FUZZY_INDEX
+    if np is None:
+        return None
+    idx = _FUZZY_INDEX
+    stale = idx is None or (time.time() - idx.built_at > FUZZY_INDEX_TTL) or len(idx.unseen) >= 200
+    if not stale:
+        return idx
+    if not _FUZZY_LOCK.acquire(blocking=idx is None):
+        return idx
+    try:
+        if _FUZZY_INDEX is idx:
+            _FUZZY_INDEX = SkillVectorIndex(_fuzzy_vocabulary() + Counter(idx.unseen if idx else ()))
+        return _FUZZY_INDEX
+    except Exception:
+        logging.exception("failed to build fuzzy skill index")
+        return idx
+    finally:
+        _FUZZY_LOCK.release()
+
+
+def compute_match_percent(vacancy_skills: set[str], student_skill_names: set[str], mode: str | None = None) -> int:
     if not vacancy_skills:
         return 0
+
+    if (mode or MATCH_MODE) == "fuzzy":
+        idx = get_fuzzy_index()
+        if idx is not None:
+            scores = idx.best_scores(vacancy_skills, student_skill_names)
+            return int(round((sum(scores) / len(vacancy_skills)) * 100))
+
     match_count = len(vacancy_skills & student_skill_names)
     return int(round((match_count / len(vacancy_skills)) * 100))
 
@@ -1591,8 +2561,8 @@ def student_vacancies():
     if guard:
         return guard
 
-    st = Student.query.filter_by(user_id=current_user.id).first()
-    sa = StudentAnalysis.query.filter_by(student_id=st.id).order_by(StudentAnalysis.id.desc()).first()
+    st = current_student()
+    sa = current_analysis()
 
     roles = []
     if sa:
@@ -1612,9 +2582,7 @@ def student_vacancies():
     except Exception:
         items, found, pages = [], 0, 0
 
-    sskills = StudentSkill.query.filter_by(student_id=st.id).all()
-    student_skill_names = set(norm_skill(s.name) for s in sskills if s.name)
-    student_skill_names = {x for x in student_skill_names if x}
+    student_skill_names = current_skill_names()
 
     match_map = {}
     for v in items:
@@ -1637,7 +2605,10 @@ def student_apply_vacancy(hh_id):
     if guard:
         return guard
 
-    st = Student.query.filter_by(user_id=current_user.id).first()
+    if len(hh_id) > HH_ID_MAX_LEN:
+        abort(404)
+
+    st = current_student()
     if not st:
         return redirect(url_for("student_onboarding"))
 
@@ -1665,6 +2636,7 @@ def student_apply_vacancy(hh_id):
             status="sent",
         )
         db.session.add(row)
+        update_readiness_for_student(st)
         db.session.commit()
 
     return redirect(hh_url)
@@ -1678,8 +2650,8 @@ def student_vacancy_detail(hh_id):
 
     vac = hh_get_vacancy(hh_id)
 
-    st = Student.query.filter_by(user_id=current_user.id).first()
-    sa = StudentAnalysis.query.filter_by(student_id=st.id).order_by(StudentAnalysis.id.desc()).first()
+    st = current_student()
+    sa = current_analysis()
 
     analysis = {}
     if sa:
@@ -1689,9 +2661,7 @@ def student_vacancy_detail(hh_id):
             "top_roles": json.loads(sa.top_roles_json or "[]"),
         }
 
-    skills = StudentSkill.query.filter_by(student_id=st.id).all()
-    student_skill_names = set(norm_skill(s.name) for s in skills if s.name)
-    student_skill_names = {x for x in student_skill_names if x}
+    student_skill_names = current_skill_names()
 
     vacancy_skills = canonical_skill_set(hh_id)
     match_source = "canonical"
@@ -1709,7 +2679,7 @@ def student_vacancy_detail(hh_id):
         "Только буллеты."
     )
 
-    skill_pack = [{"name": s.name, "score": s.score, "kind": s.kind} for s in skills]
+    skill_pack = [{"name": s.name, "score": s.score, "kind": s.kind} for s in current_skills()]
 
     user_payload = {
         "student_profile": {
@@ -1757,6 +2727,110 @@ def student_vacancy_detail(hh_id):
     )
 
 
+def _trie_regex(words) -> str:
+    """Regex-альтернатива в форме trie: общие префиксы вынесены ("без (?:опыта|звонков)")."""
+    root = {}
+    for w in words:
+        node = root
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def emit(node) -> str:
+        branches = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        if len(branches) == 1 and "" not in node:
+            return branches[0]
+        body = "(?:" + "|".join(branches) + ")"
+        return body + "?" if "" in node else body  # "?" — жадно, берём самое длинное слово
+
+    return emit(root)
+
+
+class KeywordMatcher:
+    """
+    Поиск всех ключевых слов всех групп за один проход по тексту
+    (вместо отдельного any(k in t ...) на каждую категорию), с позициями вхождений.
+
+    Если установлен pyahocorasick — автомат Aho-Corasick на C (находит и перекрывающиеся слова).
+    Иначе — trie-regex: после каждого вхождения поиск продолжается со следующего символа
+    (а не с конца слова), поэтому перекрывающиеся слова ("junioremote") тоже находятся.
+    На позиции берётся самое длинное слово, а ему заранее приписаны группы всех слов-префиксов —
+    набор групп совпадает с Aho-Corasick.
+    """
+
+    def __init__(self, groups: dict[str, list[str]]):
+        self.groups = {}
+        for group, keywords in groups.items():
+            for k in keywords:
+                self.groups.setdefault(k.lower(), set()).add(group)
+        self.groups = {k: frozenset(g) for k, g in self.groups.items()}
+
+        if ahocorasick is not None:
+            self.engine = "aho-corasick"
+            self._ac = ahocorasick.Automaton()
+            for k in self.groups:
+                self._ac.add_word(k, k)
+            self._ac.make_automaton()
+        else:
+            self.engine = "regex"
+            self._closure = {
+                k: frozenset().union(*(grp for sub, grp in self.groups.items() if k.startswith(sub)))
+                for k in self.groups
+            }
+            self._rx = re.compile(_trie_regex(self.groups))
+
+    def finditer(self, text_lower: str):
+        """-> (позиция, слово, группы) по каждому вхождению."""
+        if self.engine == "aho-corasick":
+            for end, kw in self._ac.iter(text_lower):
+                yield end - len(kw) + 1, kw, self.groups[kw]
+        else:
+            m = self._rx.search(text_lower)
+            while m:
+                kw = m.group(0)
+                yield m.start(), kw, self._closure[kw]
+                m = self._rx.search(text_lower, m.start() + 1)
+
+    def scan(self, text: str) -> dict[str, list[tuple[int, str]]]:
+        """{группа: [(позиция, слово), ...]}."""
+        out = {}
+        for pos, kw, groups in self.finditer((text or "").lower()):
+            for grp in groups:
+                out.setdefault(grp, []).append((pos, kw))
+        return out
+
+
+# категория -> (тег, маркеры в тексте)
+_INCL_RULES = {
+    # Junior / no experience
+    "junior_friendly": ("novice_friendly", ["без опыта", "стажировка", "обучение", "готовность обучать", "open to juniors", "junior"]),
+    # Remote
+    "remote_possible": ("remote", ["удал", "remote", "work from home", "telecommute"]),
+    # Flexible schedule / part-time
+    "flexible_schedule": ("flexible_hours", ["гибкий график", "частичная занятость", "flexible", "part-time", "частичная"]),
+    # Mobility / accessibility mentions
+    "mobility_access": ("accessibility", ["доступн", "адапт", "пандус", "wheelchair", "безбарьер", "безбарьерная"]),
+    # Visual / bigger font, screen reader hints
+    "visually_impaired": ("visually_friendly", ["шрифт", "контраст", "screen reader", "скринридер", "размер шрифта", "тактильн"]),
+    # Hearing: subtitles, silent tasks, нет звонков
+    "hearing_impaired": ("hearing_friendly", ["субтитры", "без звонков", "без телефонных", "caption", "subtitles", "видео с субтитрами"]),
+    # Neurodiversity (explicit or words like predictable, structured)
+    "neurodiversity_friendly": ("neurodiversity", ["нейро", "нейродивер", "структур", "предсказуем", "clear instructions", "mentorship"]),
+}
+
+# Negative/discriminatory flags
+_INCL_RISKS = {
+    "possible_discrimination": ["только для мужчин", "только для женщин", "без инвалидов", "age limit", "требования: возраст", "максимальный возраст"],
+}
+
+INCL_MATCHER = KeywordMatcher({
+    **{cat: kws for cat, (_, kws) in _INCL_RULES.items()},
+    **_INCL_RISKS,
+})
+
+
 # --- обновлённая эвристика, возвращает категории + теги + note (фолбэк для LLM) ---
 def heuristic_inclusivity(text: str) -> dict:
     """
@@ -1773,60 +2847,15 @@ def heuristic_inclusivity(text: str) -> dict:
       },
       "tags": [...],
       "note": "короткое объяснение",
+      "risk_flags": [...],
     }
+    Текст сканируется один раз (INCL_MATCHER).
     """
-    t = (text or "").lower()
-    cats = {
-        "visually_impaired": False,
-        "hearing_impaired": False,
-        "mobility_access": False,
-        "neurodiversity_friendly": False,
-        "junior_friendly": False,
-        "remote_possible": False,
-        "flexible_schedule": False,
-    }
-    tags = set()
-
-    # Junior / no experience
-    if any(k in t for k in ["без опыта", "стажировка", "обучение", "готовность обучать", "open to juniors", "junior"]):
-        cats["junior_friendly"] = True
-        tags.add("novice_friendly")
-
-    # Remote
-    if any(k in t for k in ["удал", "remote", "work from home", "telecommute"]):
-        cats["remote_possible"] = True
-        tags.add("remote")
-
-    # Flexible schedule / part-time
-    if any(k in t for k in ["гибкий график", "частичная занятость", "flexible", "part-time", "частичная"]):
-        cats["flexible_schedule"] = True
-        tags.add("flexible_hours")
+    found = INCL_MATCHER.scan(text)
 
-    # Mobility / accessibility mentions
-    if any(k in t for k in ["доступн", "адапт", "пандус", "wheelchair", "безбарьер", "безбарьерная"]):
-        cats["mobility_access"] = True
-        tags.add("accessibility")
-
-    # Visual / bigger font, screen reader hints
-    if any(k in t for k in ["шрифт", "контраст", "screen reader", "скринридер", "размер шрифта", "тактильн"]):
-        cats["visually_impaired"] = True
-        tags.add("visually_friendly")
-
-    # Hearing: subtitles, silent tasks, нет звонков
-    if any(k in t for k in ["субтитры", "без звонков", "без телефонных", "без звонков", "caption", "subtitles", "видео с субтитрами"]):
-        cats["hearing_impaired"] = True
-        tags.add("hearing_friendly")
-
-    # Neurodiversity (explicit or words like predictable, structured)
-    if any(k in t for k in ["нейро", "нейродивер", "структур", "предсказуем", "clear instructions", "mentorship"]):
-        cats["neurodiversity_friendly"] = True
-        tags.add("neurodiversity")
-
-    # Negative/discriminatory flags
-    risk_flags = []
-    NEGATIVE_KEYWORDS = ["только для мужчин", "только для женщин", "без инвалидов", "age limit", "требования: возраст", "максимальный возраст"]
-    if any(k in t for k in NEGATIVE_KEYWORDS):
-        risk_flags.append("possible_discrimination")
+    cats = {cat: cat in found for cat in _INCL_RULES}
+    tags = {tag for cat, (tag, _) in _INCL_RULES.items() if cats[cat]}
+    risk_flags = [flag for flag in _INCL_RISKS if flag in found]
 
     note_parts = []
     if cats["remote_possible"]:
@@ -1849,6 +2878,93 @@ def heuristic_inclusivity(text: str) -> dict:
     return {"categories": cats, "tags": sorted(tags), "note": note, "risk_flags": risk_flags}
 
 
+def _inclusivity_text(vac: dict, search_item: dict | None = None) -> str:
+    """Всё, что есть о вакансии: название, работодатель, навыки, график, сниппет и полное описание."""
+    parts = [
+        str(vac.get("name") or ""),
+        str((vac.get("employer") or {}).get("name") or ""),
+        str((vac.get("schedule") or {}).get("name") or ""),
+        str((vac.get("employment") or {}).get("name") or ""),
+    ]
+    for k in (vac.get("key_skills") or []):
+        parts.append(str(k.get("name") or "") if isinstance(k, dict) else str(k))
+    for src in (search_item or {}, vac):
+        snippet = src.get("snippet") or {}
+        if isinstance(snippet, dict):
+            parts.append(str(snippet.get("requirement") or ""))
+            parts.append(str(snippet.get("responsibility") or ""))
+    parts.append(strip_html(vac.get("description") or ""))
+    return " ".join(p for p in parts if p)
+
+def _inclusivity_from_row(row: "VacancyInclusivity") -> dict:
+    return {
+        "categories": _safe_load_json(row.categories_json or "{}", {}),
+        "tags": _safe_load_json(row.tags_json or "[]", []),
+        "risk_flags": _safe_load_json(row.risk_flags_json or "[]", []),
+        "note": row.note or "",
+    }
+
+def _incl_border() -> datetime:
+    return datetime.utcnow() - timedelta(seconds=_INCL_CACHE_TTL)
+
+def load_inclusivity_index(hh_ids) -> dict:
+    """Свежие записи индекса для пачки hh_id одним запросом: {hh_id: data}."""
+    now = time.time()
+    out = {}
+    missing = []
+    for hh_id in hh_ids:
+        hit = _INCL_CACHE.get(hh_id)
+        if hit and now - hit[0] < _INCL_CACHE_TTL:
+            out[hh_id] = hit[1]
+        else:
+            missing.append(hh_id)
+
+    if missing:
+        rows = (VacancyInclusivity.query
+                .filter(VacancyInclusivity.hh_id.in_(missing),
+                        VacancyInclusivity.classifier_version == INCL_CLASSIFIER_VERSION,
+                        VacancyInclusivity.computed_at >= _incl_border())
+                .all())
+        for row in rows:
+            data = _inclusivity_from_row(row)
+            _INCL_CACHE[row.hh_id] = (row.computed_at.timestamp(), data)
+            out[row.hh_id] = data
+    return out
+
+def classify_vacancy_inclusivity(hh_id: str, vac: dict, search_item: dict | None = None,
+                                 degraded: bool = False) -> dict:
+    """
+    Считает инклюзивность по полному тексту вакансии и сохраняет в индекс.
+    degraded=True — полный текст не загрузился (считали по сниппету поиска): в БД не пишем,
+    в памяти держим INCL_DEGRADED_TTL, чтобы после восстановления hh.ru пересчитать.
+    """
+    data = heuristic_inclusivity(_inclusivity_text(vac, search_item))
+    if degraded:
+        data["degraded"] = True
+        # ts сдвинут назад: запись в _INCL_CACHE истечёт через INCL_DEGRADED_TTL, а не через сутки
+        _INCL_CACHE[hh_id] = (time.time() - _INCL_CACHE_TTL + INCL_DEGRADED_TTL, data)
+        return data
+
+    row = VacancyInclusivity.query.filter_by(hh_id=hh_id).first()
+    if not row:
+        row = VacancyInclusivity(hh_id=hh_id)
+        db.session.add(row)
+    row.categories_json = json.dumps(data["categories"], ensure_ascii=False)
+    row.tags_json = json.dumps(data["tags"], ensure_ascii=False)
+    row.risk_flags_json = json.dumps(data["risk_flags"], ensure_ascii=False)
+    row.note = data["note"]
+    row.classifier_version = INCL_CLASSIFIER_VERSION
+    row.computed_at = datetime.utcnow()
+    try:
+        db.session.commit()
+    except Exception:
+        # ту же вакансию параллельно посчитал другой запрос
+        db.session.rollback()
+
+    _INCL_CACHE[hh_id] = (time.time(), data)
+    return data
+
+
 # =============================
 # EMPLOYER AREA
 # =============================
@@ -1858,235 +2974,531 @@ def employer_dashboard():
     if guard:
         return guard
 
-    emp = Employer.query.filter_by(user_id=current_user.id).first()
+    emp = current_employer()
     analyses = EmployerVacancyAnalysis.query.filter_by(employer_id=emp.id).order_by(EmployerVacancyAnalysis.id.desc()).all()
     return render_template("employer/index.html", employer=emp, analyses=analyses)
 
-@csrf.exempt
-@app.post("/student/api/inclusive/search")
-def student_inclusive_search():
-    try:
-        # require_role: если возвращает ненулевое значение — это ответ (redirect / jsonify / abort)
-        guard = require_role("student")
-        if guard is not None:
-            return guard
-
-        data = request.get_json(silent=True) or {}
-
-        # входные параметры с защитой типов
-        query = (data.get("query") or "").strip()
-        all_roles = bool(data.get("all_roles", False))
+# =============================
+# Почти-дубликаты вакансий (MinHash / LSH)
+# =============================
+# Один работодатель часто публикует одну и ту же вакансию под разными hh_id.
+# Подпись считается по тексту из выдачи поиска (без запроса деталей), хранится в БД,
+# и кластеры схлопываются до дорогого обогащения.
+MINHASH_PERM = 64
+MINHASH_BANDS = 16  # 16 полос x 4 строки: кандидаты от ~0.5 Жаккара
+MINHASH_VERSION = f"mh-{MINHASH_PERM}-c4"
+INCL_DEDUP_THRESHOLD = float(os.getenv("INCL_DEDUP_THRESHOLD", "0.8"))
+
+_MINHASH_PRIME = (1 << 31) - 1  # a*x+b < 2^63 — без переполнения и в uint64 (numpy)
+_mh_rnd = random.Random(20240601)  # фиксированные коэффициенты: подписи сравнимы между процессами
+_MINHASH_A = [_mh_rnd.randrange(1, _MINHASH_PRIME) for _ in range(MINHASH_PERM)]
+_MINHASH_B = [_mh_rnd.randrange(0, _MINHASH_PRIME) for _ in range(MINHASH_PERM)]
+del _mh_rnd
+
+_SIG_CACHE = {}  # hh_id -> (text_hash, [int])
+
+def _dedup_text(v: dict) -> str:
+    snippet = v.get("snippet") or {}
+    parts = [
+        v.get("name") or "",
+        (v.get("employer") or {}).get("name") or "",
+        snippet.get("requirement") or "",
+        snippet.get("responsibility") or "",
+    ]
+    t = re.sub(r"<[^>]+>", " ", " | ".join(parts)).lower().replace("ё", "е")
+    return " ".join(t.split())
+
+def minhash_signature(text: str) -> list[int]:
+    """MinHash по символьным 4-граммам: min((a*crc32(g) + b) mod p) на каждую перестановку."""
+    shingles = {zlib.crc32(text[i:i + 4].encode("utf-8")) for i in range(max(1, len(text) - 3))}
+    if np is not None:
+        x = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+        a = np.array(_MINHASH_A, dtype=np.uint64)[:, None]
+        b = np.array(_MINHASH_B, dtype=np.uint64)[:, None]
+        return [int(v) for v in ((a * x + b) % np.uint64(_MINHASH_PRIME)).min(axis=1)]
+    return [min((a * x + b) % _MINHASH_PRIME for x in shingles) for a, b in zip(_MINHASH_A, _MINHASH_B)]
+
+def minhash_similarity(s1: list[int], s2: list[int]) -> float:
+    """Оценка Жаккара: доля совпавших позиций подписи."""
+    if not s1 or len(s1) != len(s2):
+        return 0.0
+    return sum(1 for x, y in zip(s1, s2) if x == y) / len(s1)
+
+def load_vacancy_signatures(items: dict) -> dict:
+    """
+    {hh_id: подпись} для элементов поиска {hh_id: v}: память -> БД одной выборкой -> расчёт.
+    Новые и изменившиеся подписи сохраняются одним коммитом.
+    """
+    texts = {hh_id: _dedup_text(v) for hh_id, v in items.items()}
+    hashes = {hh_id: hashlib.sha1(t.encode("utf-8")).hexdigest()[:16] for hh_id, t in texts.items()}
+
+    out = {}
+    for hh_id, h in hashes.items():
+        hit = _SIG_CACHE.get(hh_id)
+        if hit and hit[0] == h:
+            out[hh_id] = hit[1]
+
+    missing = [hh_id for hh_id in hashes if hh_id not in out]
+    rows = {}
+    if missing:
+        rows = {r.hh_id: r for r in VacancySignature.query.filter(VacancySignature.hh_id.in_(missing)).all()}
+        for hh_id, row in rows.items():
+            if row.version == MINHASH_VERSION and row.text_hash == hashes[hh_id]:
+                sig = _safe_load_json(row.minhash_json, [])
+                _SIG_CACHE[hh_id] = (hashes[hh_id], sig)
+                out[hh_id] = sig
+
+    dirty = False
+    for hh_id in missing:
+        if hh_id in out:
+            continue
+        sig = minhash_signature(texts[hh_id])
+        _SIG_CACHE[hh_id] = (hashes[hh_id], sig)
+        out[hh_id] = sig
+
+        row = rows.get(hh_id)
+        if not row:
+            row = VacancySignature(hh_id=hh_id)
+            db.session.add(row)
+        row.text_hash = hashes[hh_id]
+        row.minhash_json = json.dumps(sig)
+        row.version = MINHASH_VERSION
+        row.computed_at = datetime.utcnow()
+        dirty = True
+
+    if dirty:
         try:
-            llm_depth = max(0, min(50, int(data.get("llm_depth", 10))))
+            db.session.commit()
         except Exception:
-            llm_depth = 10
-
-        # если пустой запрос — ищем по всем ролям
-        if not query:
-            all_roles = True
-
-        # ожидаемые категории (константа)
-        EXPECTED_CATS = {
-            "visually_impaired",
-            "hearing_impaired",
-            "mobility_access",
-            "neurodiversity_friendly",
-            "junior_friendly",
-            "remote_possible",
-            "flexible_schedule"
-        }
+            # те же hh_id параллельно сохранил другой запрос — подписи уже в памяти
+            db.session.rollback()
+    return out
 
-        # required_categories: ожидаем dict {cat: bool}
-        required_categories_in = data.get("required_categories") or {}
-        if isinstance(required_categories_in, dict):
-            required_categories = {
-                k: bool(v)
-                for k, v in required_categories_in.items()
-                if k in EXPECTED_CATS
-            }
+def collapse_near_duplicates(collected: dict, threshold: float | None = None) -> tuple[dict, dict]:
+    """
+    Схлопывает почти-дубликаты: LSH по полосам подписи даёт кандидатов,
+    пара склеивается при оценке Жаккара >= threshold.
+    Возвращает ({hh_id: v} представителей в исходном порядке, {hh_id представителя: сколько схлопнуто}).
+    """
+    threshold = INCL_DEDUP_THRESHOLD if threshold is None else threshold
+    if len(collected) < 2:
+        return collected, {}
+
+    sigs = load_vacancy_signatures(collected)
+    ids = list(collected.keys())
+    parent = {hh_id: hh_id for hh_id in ids}
+    order = {hh_id: i for i, hh_id in enumerate(ids)}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    rows = MINHASH_PERM // MINHASH_BANDS
+    buckets = {}
+    for hh_id in ids:
+        sig = sigs.get(hh_id) or []
+        if len(sig) != MINHASH_PERM:
+            continue
+        for band in range(MINHASH_BANDS):
+            buckets.setdefault((band, tuple(sig[band * rows:(band + 1) * rows])), []).append(hh_id)
+
+    checked = set()
+    for members in buckets.values():
+        for i in range(1, len(members)):
+            for j in range(i):
+                a, b = members[j], members[i]
+                if (a, b) in checked:
+                    continue
+                checked.add((a, b))
+                ra, rb = find(a), find(b)
+                if ra == rb or minhash_similarity(sigs[a], sigs[b]) < threshold:
+                    continue
+                # представитель кластера — первый по порядку выдачи
+                if order[ra] <= order[rb]:
+                    parent[rb] = ra
+                else:
+                    parent[ra] = rb
+
+    kept, collapsed = {}, {}
+    for hh_id in ids:
+        root = find(hh_id)
+        if root == hh_id:
+            kept[hh_id] = collected[hh_id]
         else:
-            required_categories = {}
+            collapsed[root] = collapsed.get(root, 0) + 1
+    return kept, collapsed
 
-        match_logic = (data.get("match_logic") or "and").lower()
-        if match_logic not in ("and", "or"):
-            match_logic = "and"
 
-        DEFAULT_ROLES = [
-            "Backend Developer","Frontend Developer","QA","DevOps",
-            "Маркетолог","Бухгалтер","HR","Менеджер по продажам",
-            "Инженер","Учитель","Водитель","Медицинская сестра"
-        ]
+# =============================
+# Inclusive search (общее ядро для JSON и потокового ответа)
+# =============================
+INCL_EXPECTED_CATS = (
+    "visually_impaired",
+    "hearing_impaired",
+    "mobility_access",
+    "neurodiversity_friendly",
+    "junior_friendly",
+    "remote_possible",
+    "flexible_schedule",
+)
 
-        search_roles = DEFAULT_ROLES if (all_roles or not query) else [query]
+INCL_DEFAULT_ROLES = [
+    "Backend Developer", "Frontend Developer", "QA", "DevOps",
+    "Маркетолог", "Бухгалтер", "HR", "Менеджер по продажам",
+    "Инженер", "Учитель", "Водитель", "Медицинская сестра",
+]
+
+# максимум вакансий на обогащение за один поиск (сетевые вызовы к hh.ru)
+INCL_MAX_PROCESS = 200
+# квоты одного запроса в общем пуле _HH_POOL
+INCL_ROLE_CONCURRENCY = int(os.getenv("INCL_ROLE_CONCURRENCY", "6"))
+INCL_ENRICH_CONCURRENCY = int(os.getenv("INCL_ENRICH_CONCURRENCY", "8"))
+# обогащённый нефильтрованный список на (запрос | все роли, навыки студента)
+INCL_RESULT_TTL = int(os.getenv("INCL_RESULT_TTL", "300"))
+INCL_RESULT_CACHE_MAX = 256
+INCL_PAGE_SIZE = int(os.getenv("INCL_PAGE_SIZE", "20"))
+INCL_PAGE_SIZE_MAX = 100
+
+_INCL_RESULT_CACHE = {}  # key -> (ts, {"searched_roles", "items", "fallback", "collapsed_total"})
+_INCL_RESULT_LOCK = threading.Lock()
+
+
+def _inclusive_params(data: dict) -> dict:
+    """Разбор тела запроса inclusive search с защитой типов."""
+    query = (data.get("query") or "").strip()
+    all_roles = bool(data.get("all_roles", False))
+
+    # если пустой запрос — ищем по всем ролям
+    if not query:
+        all_roles = True
+
+    # required_categories: ожидаем dict {cat: bool}
+    required_categories_in = data.get("required_categories") or {}
+    if isinstance(required_categories_in, dict):
+        required_categories = {
+            k: bool(v)
+            for k, v in required_categories_in.items()
+            if k in INCL_EXPECTED_CATS
+        }
+    else:
+        required_categories = {}
 
-        # ===== СБОР ВАКАНСИЙ (по ролям) =====
-        collected = {}
-        for role in search_roles:
-            try:
-                hh = hh_search_vacancies(role, area=HH_AREA_KZ, per_page=20, page=0)
-            except Exception:
-                logging.exception("hh_search_vacancies failed for role=%s", role)
-                continue
+    match_logic = (data.get("match_logic") or "and").lower()
+    if match_logic not in ("and", "or"):
+        match_logic = "and"
+
+    try:
+        limit = max(1, min(INCL_PAGE_SIZE_MAX, int(data.get("limit") or INCL_PAGE_SIZE)))
+    except Exception:
+        limit = INCL_PAGE_SIZE
+
+    return {
+        "query": query,
+        "all_roles": all_roles,
+        "search_roles": INCL_DEFAULT_ROLES if all_roles else [query],
+        "required_categories": required_categories,
+        "match_logic": match_logic,
+        "cursor": str(data.get("cursor") or ""),
+        "limit": limit,
+    }
 
-            for v in (hh.get("items") or []):
-                hh_id = str(v.get("id") or "")
-                if hh_id:
-                    # держим последний встретившийся объект (можно изменить по логике)
-                    collected.setdefault(hh_id, v)
 
-        if not collected:
-            return jsonify({
-                "ok": True,
-                "searched_roles": search_roles,
-                "items": []
-            })
+def _inclusive_search_role(role: str):
+    try:
+        return hh_search_vacancies(role, area=HH_AREA_KZ, per_page=20, page=0)
+    except Exception:
+        logging.exception("hh_search_vacancies failed for role=%s", role)
+        return None
+
+
+def _inclusive_collect(search_roles: list[str]) -> dict:
+    """Сбор вакансий по ролям (параллельно, в квоте общего пула): {hh_id: элемент поиска}."""
+    found = bounded_fanout(_inclusive_search_role, search_roles, INCL_ROLE_CONCURRENCY)
 
-        # ===== НАВЫКИ СТУДЕНТА =====
+    # порядок — как у ролей, независимо от того, кто ответил первым
+    collected = {}
+    for role in search_roles:
+        for v in ((found.get(role) or {}).get("items") or []):
+            hh_id = str(v.get("id") or "")
+            if hh_id:
+                # первый встретившийся объект
+                collected.setdefault(hh_id, v)
+    return collected
+
+
+def _inclusive_collect_iter(search_roles: list[str]):
+    """Как _inclusive_collect, но по мере ответов hh.ru: {hh_id: элемент} новых вакансий каждой роли."""
+    seen = set()
+    for _, found in iter_bounded(_inclusive_search_role, search_roles, INCL_ROLE_CONCURRENCY):
+        batch = {}
+        for v in ((found or {}).get("items") or []):
+            hh_id = str(v.get("id") or "")
+            if hh_id and hh_id not in seen:
+                seen.add(hh_id)
+                batch[hh_id] = v
+        if batch:
+            yield batch
+
+
+def _inclusive_gather(params: dict) -> tuple[dict, dict]:
+    """Сбор вакансий; для all_roles — схлопывание почти-дубликатов до обогащения."""
+    collected = _inclusive_collect(params["search_roles"])
+    collapsed = {}
+    if params["all_roles"] and collected:
         try:
-            st = Student.query.filter_by(user_id=current_user.id).first()
-            sskills = StudentSkill.query.filter_by(student_id=st.id).all() if st else []
+            collected, collapsed = collapse_near_duplicates(collected)
         except Exception:
-            logging.exception("failed to load student skills")
-            sskills = []
+            logging.exception("near-duplicate collapsing failed")
+    return collected, collapsed
 
-        student_skill_names = set(
-            norm_skill(s.name)
-            for s in sskills
-            if getattr(s, "name", None)
-        )
 
-        enriched = []
+def _inclusive_student_skills() -> set:
+    try:
+        return current_skill_names()
+    except Exception:
+        logging.exception("failed to load student skills")
+        return set()
+
+
+def _inclusive_passes(item: dict, required_categories: dict, match_logic: str) -> bool:
+    requested = [k for k, v in (required_categories or {}).items() if v]
+    if not requested:
+        return True
+    categories = item.get("categories") or {}
+    if match_logic == "and":
+        return all(categories.get(k) for k in requested)
+    return any(categories.get(k) for k in requested)
+
+
+def _inclusive_fallback(collected: dict, collapsed: dict | None = None, limit: int = 20) -> list[dict]:
+    # если фильтр всё удалил или ничего не обогатилось — отдаём сырые вакансии
+    return [{
+        "id": hh_id,
+        "name": str(v.get("name") or ""),
+        "employer": str((v.get("employer") or {}).get("name") or ""),
+        "url": v.get("alternate_url"),
+        "percent": 0,
+        "categories": {},
+        "category_true_count": 0,
+        "collapsed": (collapsed or {}).get(hh_id, 0),
+    } for hh_id, v in list(collected.items())[:limit]]
+
+
+def _inclusive_sort_key(x: dict):
+    return (x.get("category_true_count", 0), x.get("percent", 0))
+
+
+def _inclusive_cache_key(params: dict, student_skill_names: set) -> str:
+    scope = "all" if params["all_roles"] else "q:" + role_key(params["query"])
+    fingerprint = hashlib.sha1("\n".join(sorted(student_skill_names)).encode("utf-8")).hexdigest()[:16]
+    return f"{scope}|{fingerprint}"
 
-        # ===== КЭШ ДЛЯ canonical_skill_set в пределах запроса =====
-        @lru_cache(maxsize=1024)
-        def _cached_canonical_skill_set(hh_id):
-            try:
-                return canonical_skill_set(hh_id)
-            except Exception:
-                logging.exception("canonical_skill_set failed for %s", hh_id)
-                return None
 
-        # помогаем получать полные данные вакансии + вычислить процент сопадения
-        def process_vacancy_pair(hh_id, v):
-            # v — минимальные данные из поиска; попробуем получить полную вакансию,
-            # но не критично если fails (fallback использует v)
+def _incl_results_get(key: str) -> dict | None:
+    hit = _INCL_RESULT_CACHE.get(key)
+    if hit and time.time() - hit[0] < INCL_RESULT_TTL:
+        return hit[1]
+    return None
+
+
+def _incl_results_put(key: str, searched_roles: list[str], items: list[dict], fallback: list[dict],
+                      collapsed_total: int = 0) -> dict:
+    # стабильный порядок (tie-break по id), чтобы страницы курсора не «плыли»
+    items = sorted(items, key=lambda x: x["id"])
+    items.sort(key=_inclusive_sort_key, reverse=True)
+    entry = {"searched_roles": searched_roles, "items": items, "fallback": fallback,
+             "collapsed_total": collapsed_total}
+
+    with _INCL_RESULT_LOCK:
+        _INCL_RESULT_CACHE[key] = (time.time(), entry)
+        if len(_INCL_RESULT_CACHE) > INCL_RESULT_CACHE_MAX:
+            oldest = sorted(_INCL_RESULT_CACHE.items(), key=lambda kv: kv[1][0])
+            for k, _ in oldest[:len(_INCL_RESULT_CACHE) - INCL_RESULT_CACHE_MAX]:
+                _INCL_RESULT_CACHE.pop(k, None)
+    return entry
+
+
+def _inclusive_candidates(params: dict, student_skill_names: set) -> tuple[dict | None, bool]:
+    """Обогащённый нефильтрованный список из кэша или новым fan-out -> (entry, from_cache)."""
+    key = _inclusive_cache_key(params, student_skill_names)
+    entry = _incl_results_get(key)
+    if entry is not None:
+        return entry, True
+
+    collected, collapsed = _inclusive_gather(params)
+    if not collected:
+        # hh.ru ничего не вернул (или недоступен) — пустой результат не кэшируем
+        return None, False
+
+    items = list(iter_inclusive_items(collected, student_skill_names, collapsed))
+    return _incl_results_put(key, params["search_roles"], items, _inclusive_fallback(collected, collapsed),
+                             collapsed_total=sum(collapsed.values())), False
+
+
+def _inclusive_filter_sig(params: dict, key: str) -> str:
+    requested = sorted(k for k, v in params["required_categories"].items() if v)
+    raw = json.dumps([key, requested, params["match_logic"]], ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+
+def _encode_cursor(sig: str, offset: int) -> str:
+    raw = json.dumps({"s": sig, "o": offset}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str, sig: str) -> int | None:
+    """Смещение из курсора; None — курсор битый или от другого запроса/фильтра."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        if data.get("s") != sig:
+            return None
+        return max(0, int(data.get("o") or 0))
+    except Exception:
+        return None
+
+
+def iter_inclusive_items(collected: dict, student_skill_names: set, collapsed: dict | None = None):
+    """
+    Обогащает вакансии (инклюзивность + % совпадения) и отдаёт их
+    по мере готовности, без фильтра по категориям.
+    collapsed — {hh_id: число схлопнутых почти-дубликатов} для поля "collapsed".
+    """
+    collapsed = collapsed or {}
+
+    # кэш canonical_skill_set в пределах запроса
+    @lru_cache(maxsize=1024)
+    def _cached_canonical_skill_set(hh_id):
+        try:
+            return canonical_skill_set(hh_id)
+        except Exception:
+            logging.exception("canonical_skill_set failed for %s", hh_id)
+            return None
+
+    # индекс инклюзивности: свежие записи одной выборкой, остальные посчитаем по полному тексту
+    try:
+        incl_index = load_inclusivity_index(list(collected.keys()))
+    except Exception:
+        logging.exception("failed to load inclusivity index")
+        incl_index = {}
+
+    # отдаём соединение запроса в пул SQLAlchemy: на время fan-out оно нужно воркерам
+    db.session.close()
+
+    def process_vacancy_pair(hh_id, v):
+        # воркер пула: своя app_context (БД-сессия) на задачу
+        with app.app_context():
+            return _process_vacancy_pair(hh_id, v)
+
+    def _process_vacancy_pair(hh_id, v):
+        # v — минимальные данные из поиска; полную вакансию тянем только если
+        # её ещё нет в индексе инклюзивности (fallback использует v)
+        vac = v
+        inc = incl_index.get(hh_id)
+        if inc is None:
+            degraded = False
             try:
                 vac = hh_get_vacancy(hh_id)
             except Exception:
-                vac = v
-
-            title = str(vac.get("name") or "")
-            employer = str((vac.get("employer") or {}).get("name") or "")
-
-            # snippet safe
-            snippet = v.get("snippet") or {}
-            if isinstance(snippet, dict):
-                snippet_text = (
-                    str(snippet.get("requirement") or "") + " " +
-                    str(snippet.get("responsibility") or "")
-                )
-            else:
-                snippet_text = str(snippet)
-
-            # key skills
-            keyskills_raw = v.get("key_skills") or []
-            keyskills = []
-            for k in keyskills_raw:
-                if isinstance(k, dict):
-                    keyskills.append(str(k.get("name") or ""))
-                else:
-                    keyskills.append(str(k))
-
-            text_for_soft = " ".join([
-                title,
-                " ".join(keyskills),
-                snippet_text,
-                employer
-            ]).lower()
-
-            # inclusive heuristics (простая и быстрая)
-            categories = {
-                "visually_impaired": "доступн" in text_for_soft,
-                "hearing_impaired": "субтитр" in text_for_soft,
-                "mobility_access": "пандус" in text_for_soft,
-                "neurodiversity_friendly": "нейро" in text_for_soft,
-                "junior_friendly": "без опыта" in text_for_soft,
-                "remote_possible": "удален" in text_for_soft or "remote" in text_for_soft,
-                "flexible_schedule": "гибк" in text_for_soft
-            }
+                vac, degraded = v, True
+            inc = classify_vacancy_inclusivity(hh_id, vac, search_item=v, degraded=degraded)
 
-            # compute percent (через кэш)
-            try:
-                vacancy_skills = _cached_canonical_skill_set(hh_id)
-                percent = compute_match_percent(vacancy_skills, student_skill_names) if vacancy_skills else 0
-            except Exception:
-                logging.exception("compute_match_percent failed for %s", hh_id)
-                percent = 0
-
-            # фильтр required_categories
-            if required_categories:
-                requested = [k for k, v in required_categories.items() if v]
-                if requested:
-                    if match_logic == "and":
-                        if not all(categories.get(k) for k in requested):
-                            return None
-                    else:
-                        if not any(categories.get(k) for k in requested):
-                            return None
-
-            true_count = sum(1 for val in categories.values() if val)
-
-            return {
-                "id": hh_id,
-                "name": title,
-                "employer": employer,
-                "url": vac.get("alternate_url"),
-                "percent": int(percent),
-                "categories": categories,
-                "category_true_count": true_count
-            }
+        title = str(vac.get("name") or v.get("name") or "")
+        employer = str((vac.get("employer") or v.get("employer") or {}).get("name") or "")
+        categories = {k: bool((inc.get("categories") or {}).get(k)) for k in INCL_EXPECTED_CATS}
 
-        # ===== Параллельная обработка (ограничение по размеру) =====
-        # Берём максимум N элементов для обработки, чтобы не сделать сотни сетевых вызовов.
-        MAX_PROCESS = max(50, min(200, len(collected)))  # гибко: 50..200
-        items_to_process = list(collected.items())[:MAX_PROCESS]
+        try:
+            vacancy_skills = _cached_canonical_skill_set(hh_id)
+            percent = compute_match_percent(vacancy_skills, student_skill_names) if vacancy_skills else 0
+        except Exception:
+            logging.exception("compute_match_percent failed for %s", hh_id)
+            percent = 0
+
+        return {
+            "id": hh_id,
+            "name": title,
+            "employer": employer,
+            "url": vac.get("alternate_url") or v.get("alternate_url"),
+            "percent": int(percent),
+            "categories": categories,
+            "category_true_count": sum(1 for val in categories.values() if val),
+            "tags": inc.get("tags") or [],
+            "risk_flags": inc.get("risk_flags") or [],
+            "collapsed": collapsed.get(hh_id, 0),
+            "degraded": bool(inc.get("degraded")),
+        }
 
-        with ThreadPoolExecutor(max_workers=min(12, len(items_to_process) or 1)) as ex:
-            futures = {
-                ex.submit(process_vacancy_pair, hh_id, v): hh_id
-                for hh_id, v in items_to_process
-            }
-            for fut in as_completed(futures):
-                try:
-                    res = fut.result()
-                    if res:
-                        enriched.append(res)
-                except Exception:
-                    logging.exception("error processing vacancy %s", futures.get(fut))
-
-        # ===== FALLBACK: если фильтр всё удалил или не было enriched =====
-        if not enriched:
-            for hh_id, v in list(collected.items())[:20]:
-                enriched.append({
-                    "id": hh_id,
-                    "name": str(v.get("name") or ""),
-                    "employer": str((v.get("employer") or {}).get("name") or ""),
-                    "url": v.get("alternate_url"),
-                    "percent": 0,
-                    "categories": {},
-                    "category_true_count": 0
-                })
-
-        # ===== СОРТИРОВКА =====
-        enriched.sort(
-            key=lambda x: (x.get("category_true_count", 0), x.get("percent", 0)),
-            reverse=True
-        )
+    # Берём максимум N элементов, чтобы не сделать сотни сетевых вызовов.
+    ids_to_process = list(collected.keys())[:INCL_MAX_PROCESS]
+
+    # закрытие генератора (клиент ушёл из потока) отменяет не начатые задачи
+    for _, res in iter_bounded(
+        lambda hh_id: process_vacancy_pair(hh_id, collected[hh_id]),
+        ids_to_process,
+        INCL_ENRICH_CONCURRENCY,
+    ):
+        if res:
+            yield res
+
+
+@csrf.exempt
+@app.post("/student/api/inclusive/search")
+def student_inclusive_search():
+    try:
+        # require_role: если возвращает ненулевое значение — это ответ (redirect / jsonify / abort)
+        guard = require_role("student")
+        if guard is not None:
+            return guard
+
+        params = _inclusive_params(request.get_json(silent=True) or {})
+        search_roles = params["search_roles"]
+
+        student_skill_names = _inclusive_student_skills()
+        key = _inclusive_cache_key(params, student_skill_names)
+        sig = _inclusive_filter_sig(params, key)
+
+        offset = 0
+        if params["cursor"]:
+            offset = _decode_cursor(params["cursor"], sig)
+            if offset is None:
+                return jsonify({"ok": False, "error": "invalid_cursor"}), 400
+
+        entry, from_cache = _inclusive_candidates(params, student_skill_names)
+        if entry is None:
+            return jsonify({
+                "ok": True,
+                "searched_roles": search_roles,
+                "items": [],
+                "total": 0,
+                "collapsed_total": 0,
+                "next_cursor": None,
+                "cached": False,
+            })
+
+        # фильтр категорий и match_logic — по кэшированному списку, без нового fan-out
+        matched = [
+            item for item in entry["items"]
+            if _inclusive_passes(item, params["required_categories"], params["match_logic"])
+        ]
+
+        fallback = not matched
+        if fallback:
+            matched = entry["fallback"]
+
+        page = matched[offset:offset + params["limit"]]
+        end = offset + len(page)
 
         return jsonify({
             "ok": True,
-            "searched_roles": search_roles,
-            "items": enriched
+            "searched_roles": entry["searched_roles"],
+            "items": page,
+            "total": len(matched),
+            "fallback": fallback,
+            "collapsed_total": entry["collapsed_total"],
+            "next_cursor": _encode_cursor(sig, end) if end < len(matched) else None,
+            "cached": from_cache,
         })
 
     except Exception as e:
@@ -2097,6 +3509,132 @@ def student_inclusive_search():
             "details": str(e)
         }), 200
 
+
+def _stream_record(record: dict, sse: bool) -> str:
+    line = json.dumps(record, ensure_ascii=False)
+    if sse:
+        return f"event: {record.get('type', 'message')}\ndata: {line}\n\n"
+    return line + "\n"
+
+
+@csrf.exempt
+@app.post("/student/api/inclusive/search/stream")
+def student_inclusive_search_stream():
+    """
+    Потоковый inclusive search: NDJSON (по умолчанию) или SSE
+    (?format=sse / Accept: text/event-stream).
+    Записи: meta (сразу) → item (по мере ответа ролей и обогащения) → summary с итоговым
+    порядком и числами. Если обогащённый список уже в кэше, элементы отдаются сразу из него.
+    """
+    guard = require_role("student")
+    if guard is not None:
+        return guard
+
+    sse = (request.args.get("format") == "sse"
+           or request.accept_mimetypes.best == "text/event-stream")
+    params = _inclusive_params(request.get_json(silent=True) or {})
+    student_skill_names = _inclusive_student_skills()
+
+    def _stream_enrich(collected: dict, collapsed: dict):
+        """
+        Роли обогащаются по мере ответа hh.ru, не дожидаясь самой медленной.
+        collected/collapsed заполняются по ходу: для all_roles каждая новая пачка
+        схлопывается с уже собранными (представитель — первый по порядку появления).
+        """
+        gathered = {}  # все пришедшие вакансии, включая схлопнутые: кластеры считаются по ним
+        for batch in _inclusive_collect_iter(params["search_roles"]):
+            gathered.update(batch)
+            if params["all_roles"]:
+                try:
+                    kept, merged = collapse_near_duplicates(gathered)
+                    batch = {hh_id: v for hh_id, v in batch.items() if hh_id in kept}
+                    for hh_id in [x for x in collected if x not in kept]:
+                        del collected[hh_id]
+                    collapsed.clear()
+                    collapsed.update(merged)
+                except Exception:
+                    logging.exception("near-duplicate collapsing failed")
+            batch = dict(list(batch.items())[:max(0, INCL_MAX_PROCESS - len(collected))])
+            if not batch:
+                continue
+            collected.update(batch)
+            yield from iter_inclusive_items(batch, student_skill_names, collapsed)
+
+    def generate():
+        t0 = time.time()
+        search_roles = params["search_roles"]
+        try:
+            key = _inclusive_cache_key(params, student_skill_names)
+            entry = _incl_results_get(key)
+            from_cache = entry is not None
+
+            # meta — сразу, до первого запроса к hh.ru; итоговые числа придут в summary
+            yield _stream_record({
+                "type": "meta",
+                "searched_roles": entry["searched_roles"] if from_cache else search_roles,
+                "total": len(entry["items"]) if from_cache else None,
+                "collapsed_total": entry["collapsed_total"] if from_cache else None,
+                "cached": from_cache,
+            }, sse)
+
+            collected, collapsed = {}, {}
+            if from_cache:
+                # свежий список уже есть — только фильтр
+                search_roles = entry["searched_roles"]
+                source = iter(entry["items"])
+            else:
+                source = _stream_enrich(collected, collapsed)
+
+            enriched, sent = [], []
+            for item in source:
+                enriched.append(item)
+                if not _inclusive_passes(item, params["required_categories"], params["match_logic"]):
+                    continue
+                sent.append(item)
+                yield _stream_record({"type": "item", "item": item}, sse)
+
+            if entry is None and collected:
+                # поток дочитан до конца — следующий фильтр/страница возьмут список из кэша;
+                # счётчики схлопнутых — итоговые (карточки ушли с промежуточными)
+                for item in enriched:
+                    item["collapsed"] = collapsed.get(item["id"], 0)
+                entry = _incl_results_put(key, search_roles, [x for x in enriched if x["id"] in collected],
+                                          _inclusive_fallback(collected, collapsed),
+                                          collapsed_total=sum(collapsed.values()))
+
+            fallback = False
+            if not sent and entry is not None:
+                fallback = True
+                for item in entry["fallback"]:
+                    sent.append(item)
+                    yield _stream_record({"type": "item", "item": item}, sse)
+
+            sent.sort(key=_inclusive_sort_key, reverse=True)
+            yield _stream_record({
+                "type": "summary",
+                "ok": True,
+                "searched_roles": search_roles,
+                "processed": len(enriched),
+                "total": len(entry["items"]) if entry is not None else 0,
+                "collapsed_total": entry["collapsed_total"] if entry is not None else 0,
+                "count": len(sent),
+                "fallback": fallback,
+                "cached": from_cache,
+                "order": [x["id"] for x in sent],
+                "elapsed_ms": int((time.time() - t0) * 1000),
+            }, sse)
+        except Exception:
+            logging.exception("internal error in inclusive search stream")
+            yield _stream_record({"type": "error", "ok": False, "error": "internal_error"}, sse)
+
+    resp = Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream" if sse else "application/x-ndjson",
+    )
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"  # nginx: не буферизовать поток
+    return resp
+
 @app.get("/student/inclusive")
 def student_inclusive():
     guard = require_role("student")
@@ -2122,7 +3660,7 @@ def employer_analyze():
     if guard:
         return guard
 
-    emp = Employer.query.filter_by(user_id=current_user.id).first()
+    emp = current_employer()
 
     data = request.get_json() or {}
     hh_url = (data.get("hh_url") or "").strip()
@@ -2189,7 +3727,7 @@ def employer_vacancy_page(analysis_id: int):
     if guard:
         return guard
 
-    emp = Employer.query.filter_by(user_id=current_user.id).first()
+    emp = current_employer()
     eva = EmployerVacancyAnalysis.query.get(analysis_id)
     if not eva or eva.employer_id != emp.id:
         abort(404)
@@ -2205,7 +3743,7 @@ def employer_match_students():
     if guard:
         return guard
 
-    emp = Employer.query.filter_by(user_id=current_user.id).first()
+    emp = current_employer()
 
     analysis_id = request.args.get("analysis_id", type=int)
     if not analysis_id:
@@ -2294,7 +3832,7 @@ def employer_candidate_favorite():
     if not analysis_id or not student_id:
         return jsonify({"ok": False, "error": "bad_args"}), 400
 
-    emp = Employer.query.filter_by(user_id=current_user.id).first()
+    emp = current_employer()
     eva = EmployerVacancyAnalysis.query.get(analysis_id)
     if not eva or eva.employer_id != emp.id:
         return jsonify({"ok": False, "error": "not_found"}), 404
@@ -2330,7 +3868,7 @@ def employer_candidate_status():
     if not analysis_id or not student_id:
         return jsonify({"ok": False, "error": "bad_args"}), 400
 
-    emp = Employer.query.filter_by(user_id=current_user.id).first()
+    emp = current_employer()
     eva = EmployerVacancyAnalysis.query.get(analysis_id)
     if not eva or eva.employer_id != emp.id:
         return jsonify({"ok": False, "error": "not_found"}), 404
@@ -2363,7 +3901,7 @@ def employer_candidate_note():
     if not analysis_id or not student_id:
         return jsonify({"ok": False, "error": "bad_args"}), 400
 
-    emp = Employer.query.filter_by(user_id=current_user.id).first()
+    emp = current_employer()
     eva = EmployerVacancyAnalysis.query.get(analysis_id)
     if not eva or eva.employer_id != emp.id:
         return jsonify({"ok": False, "error": "not_found"}), 404
@@ -2396,7 +3934,7 @@ def employer_candidate_details():
             return jsonify({"ok": False, "error": "bad_args"}), 400
 
         # Проверяем работодателя
-        emp = Employer.query.filter_by(user_id=current_user.id).first()
+        emp = current_employer()
         eva = EmployerVacancyAnalysis.query.get(analysis_id)
 
         if not emp or not eva or eva.employer_id != emp.id:
@@ -2487,24 +4025,16 @@ def diploma_analysis():
     profession = (data.get("profession") or "").strip() or "специалист"
 
     try:
-        hh = hh_search_vacancies(profession, area=HH_AREA_KZ, per_page=30, page=0)
-        vacancies = hh.get("items", [])
+        skill_counter, _ = market_role_counter(profession)
     except Exception:
-        vacancies = []
-
-    skill_counter = Counter()
-    for v in vacancies:
-        for skill in v.get("key_skills", []) or []:
-            name = (skill.get("name") or "").lower().strip()
-            if name:
-                skill_counter[name] += 1
+        skill_counter = Counter()
 
     if not skill_counter:
         skill_counter = Counter({
-            "коммуникация": 5,
-            "анализ данных": 4,
-            "работа в команде": 6,
-            "базовые технические навыки": 5
+            norm_skill("коммуникация"): 5,
+            norm_skill("анализ данных"): 4,
+            norm_skill("работа в команде"): 6,
+            norm_skill("базовые технические навыки"): 5
         })
 
     total_weight = sum(skill_counter.values())
@@ -2521,16 +4051,12 @@ def diploma_analysis():
         ]
         raw = llm_chat(program_prompt)
         parsed = safe_json_from_text(raw)
-        program_skills = set(
-            s.strip().lower()
-            for s in parsed.get("skills", [])
-            if isinstance(s, str)
-        )
+        program_skills = build_skill_set(parsed.get("skills", []))
     except Exception:
         program_skills = set()
 
     if not program_skills:
-        program_skills = {"коммуникация", "работа в команде", "базовые технические навыки"}
+        program_skills = build_skill_set(["коммуникация", "работа в команде", "базовые технические навыки"])
 
     matched_weight = sum(
         count for skill, count in skill_counter.items()
@@ -2559,6 +4085,37 @@ def diploma_analysis():
     return jsonify({"percent": percent, "explanation": explanation})
 
 
+MARKET_FOUND_TTL = int(os.getenv("MARKET_FOUND_TTL", "120"))
+MARKET_ANALYTICS_MAX_ROLES = int(os.getenv("MARKET_ANALYTICS_MAX_ROLES", "30"))
+MARKET_ANALYTICS_CONCURRENCY = int(os.getenv("MARKET_ANALYTICS_CONCURRENCY", "6"))
+MARKET_ANALYTICS_DEADLINE = float(os.getenv("MARKET_ANALYTICS_DEADLINE", "4"))
+
+MARKET_DEFAULT_ROLES = [
+    "Backend Developer",
+    "Frontend Developer",
+    "Медицинская сестра",
+    "Инженер строитель",
+    "Менеджер по продажам"
+]
+
+_FOUND_CACHE = {}  # role_key -> (ts, found)
+
+def _fetch_found(role: str) -> int:
+    params = {"text": role, "area": HH_AREA_KZ, "per_page": 1, "page": 0}
+    hh = _hh_get(f"{HH_BASE}/vacancies", params=params, timeout=10, ttl=MARKET_FOUND_TTL)
+    found = int(hh.get("found", 0) or 0)
+    _FOUND_CACHE[role_key(role)] = (time.time(), found)
+    return found
+
+def _heat(found: int) -> str:
+    if found >= 1000:
+        return "high"
+    if found >= 500:
+        return "medium"
+    if found > 0:
+        return "low"
+    return "none"
+
 @csrf.exempt
 @app.route("/api/market-analytics", methods=["GET", "POST"])
 def market_analytics():
@@ -2569,34 +4126,316 @@ def market_analytics():
     except Exception:
         payload = {}
 
-    roles = payload.get("roles") or [
-        "Backend Developer",
-        "Frontend Developer",
-        "Медицинская сестра",
-        "Инженер строитель",
-        "Менеджер по продажам"
-    ]
+    roles = payload.get("roles")
+    if not roles and request.args.get("roles"):
+        roles = request.args.get("roles").split(",")
+    if not isinstance(roles, list) or not roles:
+        roles = MARKET_DEFAULT_ROLES
+
+    # чистим, убираем дубли (по нормализованному ключу) и режем длинные списки
+    uniq = {}
+    for r in roles:
+        if isinstance(r, str) and r.strip():
+            uniq.setdefault(role_key(r), r.strip()[:120])
+    truncated = len(uniq) > MARKET_ANALYTICS_MAX_ROLES
+    uniq = dict(list(uniq.items())[:MARKET_ANALYTICS_MAX_ROLES])
+
+    now = time.time()
+    to_fetch = [r for k, r in uniq.items()
+                if not (k in _FOUND_CACHE and now - _FOUND_CACHE[k][0] < MARKET_FOUND_TTL)]
+    fetched = bounded_fanout(_fetch_found, to_fetch, MARKET_ANALYTICS_CONCURRENCY, MARKET_ANALYTICS_DEADLINE)
 
     results = []
+    partial = False
+    for k, role in uniq.items():
+        hit = _FOUND_CACHE.get(k)
+        if hit:
+            age = time.time() - hit[0]
+            found = int(hit[1])
+            stale = age >= MARKET_FOUND_TTL
+            status = "ok" if not stale else "stale"
+        else:
+            # не успели к дедлайну и в кэше ничего нет (или hh.ru ответил ошибкой)
+            age, found, stale = None, 0, True
+            status = "pending" if role not in fetched else "error"
+        if status in ("stale", "pending"):
+            partial = True
+
+        results.append({
+            "role": role,
+            "found": found,
+            "heat": _heat(found),
+            "status": status,
+            "stale": stale,
+            "age_s": (int(age) if age is not None else None),
+        })
+
+    return jsonify({"results": results, "partial": partial, "truncated": truncated})
+
+
+# =============================
+# MARKET DEMAND: временной ряд по ролям (сэмплинг + роллапы)
+# =============================
+DEMAND_SAMPLE_INTERVAL = int(os.getenv("DEMAND_SAMPLE_INTERVAL", "3600"))
+DEMAND_ROLLUP_INTERVAL = int(os.getenv("DEMAND_ROLLUP_INTERVAL", "3600"))
+DEMAND_TRACK_ROLES = [x.strip() for x in os.getenv("DEMAND_TRACK_ROLES", "").split(",") if x.strip()]
+
+# (откуда, куда, сколько храним в исходном разрешении)
+_DEMAND_ROLLUPS = [
+    ("raw", "hour", timedelta(hours=int(os.getenv("DEMAND_KEEP_RAW_HOURS", "48")))),
+    ("hour", "day", timedelta(days=int(os.getenv("DEMAND_KEEP_HOURLY_DAYS", "30")))),
+    ("day", "week", timedelta(days=int(os.getenv("DEMAND_KEEP_DAILY_DAYS", "180")))),
+]
+
+def _bucket_start(dt: datetime, resolution: str) -> datetime:
+    if resolution == "hour":
+        return dt.replace(minute=0, second=0, microsecond=0)
+    day = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    if resolution == "week":
+        return day - timedelta(days=day.weekday())
+    return day
+
+def _demand_roles() -> list[str]:
+    roles = {role_key(r): r for r in (DEMAND_TRACK_ROLES or MARKET_DEFAULT_ROLES)}
+    known = known_role_keys()
+    for key, role in db.session.query(RoleMarketStats.role_key, RoleMarketStats.role).all():
+        if key in known:
+            roles.setdefault(key, role or key)
+    return list(roles.values())
+
+@background_job("market_demand_sample", DEMAND_SAMPLE_INTERVAL)
+def sample_market_demand():
+    roles = _demand_roles()
+    found_map = bounded_fanout(_fetch_found, roles, MARKET_ANALYTICS_CONCURRENCY)
+
+    now = datetime.utcnow()
+    points = []
     for role in roles:
+        if found_map.get(role) is None:
+            continue
         try:
-            hh = hh_search_vacancies(role, area=HH_AREA_KZ, per_page=1, page=0)
-            found = hh.get("found", 0)
+            counter, _ = market_role_counter(role)
+            top = [k for k, _ in counter.most_common(10)]
         except Exception:
-            found = 0
-
-        if found >= 1000:
-            heat = "high"
-        elif found >= 500:
-            heat = "medium"
-        elif found > 0:
-            heat = "low"
+            top = []
+        points.append(MarketDemandPoint(
+            role_key=role_key(role),
+            role=role[:200],
+            resolution="raw",
+            ts=now,
+            found=int(found_map[role]),
+            samples=1,
+            top_skills_json=json.dumps(top, ensure_ascii=False),
+        ))
+    # добавляем в сессию только после сетевых вызовов: иначе autoflush внутри
+    # market_role_counter держит блокировку записи SQLite на время загрузки
+    db.session.add_all(points)
+    db.session.commit()
+
+@background_job("market_demand_rollup", DEMAND_ROLLUP_INTERVAL)
+def rollup_market_demand():
+    """Сворачивает старые точки: raw -> hour -> day -> week (среднее found, последний топ навыков)."""
+    now = datetime.utcnow()
+    for src, dst, keep in _DEMAND_ROLLUPS:
+        # не трогаем незакрытый бакет назначения, чтобы не сворачивать его по частям
+        border = _bucket_start(now - keep, dst)
+        rows = (MarketDemandPoint.query
+                .filter(MarketDemandPoint.resolution == src, MarketDemandPoint.ts < border)
+                .order_by(MarketDemandPoint.ts.asc())
+                .all())
+        if not rows:
+            continue
+
+        buckets = {}
+        for r in rows:
+            b = buckets.setdefault((r.role_key, _bucket_start(r.ts, dst)), {"role": r.role, "sum": 0, "n": 0, "top": "[]"})
+            n = int(r.samples or 1)
+            b["sum"] += int(r.found or 0) * n
+            b["n"] += n
+            b["top"] = r.top_skills_json or "[]"
+
+        for (key, ts), b in buckets.items():
+            row = MarketDemandPoint.query.filter_by(role_key=key, resolution=dst, ts=ts).first()
+            if row:
+                n = int(row.samples or 1)
+                total = int(row.found or 0) * n + b["sum"]
+                row.samples = n + b["n"]
+                row.found = int(round(total / row.samples))
+                row.top_skills_json = b["top"]
+            else:
+                db.session.add(MarketDemandPoint(
+                    role_key=key, role=b["role"], resolution=dst, ts=ts,
+                    found=int(round(b["sum"] / max(1, b["n"]))), samples=b["n"], top_skills_json=b["top"],
+                ))
+
+        for r in rows:
+            db.session.delete(r)
+        db.session.commit()
+
+# =============================
+# SNAPSHOT RETENTION: прореживание истории навыков и соответствия рынку
+# =============================
+SNAPSHOT_COMPACT_INTERVAL = int(os.getenv("SNAPSHOT_COMPACT_INTERVAL", "86400"))
+SNAPSHOT_MAX_AGE_DAYS = int(os.getenv("SNAPSHOT_MAX_AGE_DAYS", "0"))  # 0 — не удалять совсем
+SNAPSHOT_COMPACT_BATCH = int(os.getenv("SNAPSHOT_COMPACT_BATCH", "500"))
+# SQLite: incremental_vacuum после уборки, если свободные страницы занимают больше этой доли файла (0 — не сжимать)
+SNAPSHOT_VACUUM_FREE_RATIO = float(os.getenv("SNAPSHOT_VACUUM_FREE_RATIO", "0.25"))
+SNAPSHOT_VACUUM_PAGES = int(os.getenv("SNAPSHOT_VACUUM_PAGES", "2000"))  # за один запуск фона
+
+# (разрешение контрольных точек, сколько храним в более подробном виде)
+_SNAPSHOT_TIERS = [
+    ("day", timedelta(days=int(os.getenv("SNAPSHOT_KEEP_FULL_DAYS", "30")))),
+    ("week", timedelta(days=int(os.getenv("SNAPSHOT_KEEP_DAILY_DAYS", "180")))),
+]
+
+def _thin_snapshots(model, group_cols, resolution: str, border: datetime) -> list[int]:
+    """
+    id снапшотов старше border, которые не являются последними в своём бакете
+    (группа = студент [+ роль], бакет = день/неделя). Читаем только ключевые колонки.
+    """
+    rows = (db.session.query(model.id, model.created_at, *group_cols)
+            .filter(model.created_at < border)
+            .order_by(model.created_at.desc(), model.id.desc())
+            .all())
+    seen, drop = set(), []
+    for row in rows:
+        bucket = (tuple(row[2:]), _bucket_start(row.created_at, resolution))
+        if bucket in seen:
+            drop.append(row.id)
         else:
-            heat = "none"
+            seen.add(bucket)
+    return drop
+
+def _delete_ids(model, ids: list[int]) -> int:
+    # короткие транзакции пачками: не держим блокировку записи на всё время уборки
+    for i in range(0, len(ids), SNAPSHOT_COMPACT_BATCH):
+        chunk = ids[i:i + SNAPSHOT_COMPACT_BATCH]
+        model.query.filter(model.id.in_(chunk)).delete(synchronize_session=False)
+        db.session.commit()
+    return len(ids)
+
+def _sqlite_reclaim_space():
+    """
+    SQLite не уменьшает файл после DELETE: страницы уходят во freelist и переиспользуются.
+    Фон делает только PRAGMA incremental_vacuum (по SNAPSHOT_VACUUM_PAGES страниц, короткая запись)
+    и только если файл переведён в auto_vacuum=INCREMENTAL. Полный VACUUM блокирует всю БД —
+    он вручную: python db_migrate.py --vacuum.
+    """
+    if not DB_IS_SQLITE or SNAPSHOT_VACUUM_FREE_RATIO <= 0:
+        return
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        pages = conn.exec_driver_sql("PRAGMA page_count").scalar() or 0
+        free = conn.exec_driver_sql("PRAGMA freelist_count").scalar() or 0
+        if not pages or free / pages < SNAPSHOT_VACUUM_FREE_RATIO:
+            return
+        if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2:  # 2 — INCREMENTAL
+            logging.info("snapshot compaction: %d of %d pages free; run `python db_migrate.py --vacuum`",
+                         free, pages)
+            return
+        # executescript прогоняет PRAGMA до конца; execute() у sqlite3 делает один шаг — одну страницу
+        conn.connection.driver_connection.executescript(f"PRAGMA incremental_vacuum({int(SNAPSHOT_VACUUM_PAGES)});")
+        logging.info("snapshot compaction: incremental_vacuum, %d of %d pages were free", free, pages)
+
+def sqlite_vacuum() -> tuple[int, int]:
+    """
+    Полный VACUUM (эксклюзивная блокировка БД на всё время перезаписи файла) и перевод файла
+    в auto_vacuum=INCREMENTAL, чтобы дальше место возвращала фоновая уборка. -> (страниц до, после).
+    """
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        before = conn.exec_driver_sql("PRAGMA page_count").scalar() or 0
+        conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.exec_driver_sql("VACUUM")
+        after = conn.exec_driver_sql("PRAGMA page_count").scalar() or 0
+    return before, after
+
+@background_job("snapshot_compaction", SNAPSHOT_COMPACT_INTERVAL)
+def compact_snapshots(now: datetime | None = None) -> dict:
+    """
+    Свежие снапшоты храним целиком; старше SNAPSHOT_KEEP_FULL_DAYS — последний за день,
+    старше SNAPSHOT_KEEP_DAILY_DAYS — последний за неделю, старше SNAPSHOT_MAX_AGE_DAYS — удаляем.
+    Повторный запуск ничего не меняет.
+    """
+    now = now or datetime.utcnow()
+    targets = [
+        (SkillSnapshot, [SkillSnapshot.student_id]),
+        (MarketFitSnapshot, [MarketFitSnapshot.student_id, MarketFitSnapshot.role]),
+    ]
+    removed = {}
+    for model, group_cols in targets:
+        n = 0
+        for resolution, keep in _SNAPSHOT_TIERS:
+            n += _delete_ids(model, _thin_snapshots(model, group_cols, resolution, now - keep))
+        if SNAPSHOT_MAX_AGE_DAYS > 0:
+            border = now - timedelta(days=SNAPSHOT_MAX_AGE_DAYS)
+            rows = db.session.query(model.id, model.student_id).filter(model.created_at < border).all()
+            n += _delete_ids(model, [i for i, _ in rows])
+            if model is MarketFitSnapshot and rows:
+                # мог уйти последний снапшот студента — балл готовности зависит от него
+                backfill_readiness_scores({sid for _, sid in rows})
+        removed[model.__tablename__] = n
+    if any(removed.values()):
+        logging.info("snapshot compaction: %s", removed)
+        _sqlite_reclaim_space()
+    return removed
+
+def _parse_dt_arg(name: str, default: datetime) -> datetime:
+    raw = (request.args.get(name) or "").strip()
+    if not raw:
+        return default
+    try:
+        dt = datetime.fromisoformat(raw.replace("Z", "+00:00"))
+    except ValueError:
+        return default
+    # колонки ts — naive UTC: время с поясом приводим к UTC и снимаем tzinfo
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+DEMAND_SERIES_MAX_POINTS = 5000
 
-        results.append({"role": role, "found": int(found), "heat": heat})
+@csrf.exempt
+@app.get("/api/market-analytics/series")
+def market_demand_series():
+    role = (request.args.get("role") or "").strip()
+    if not role:
+        return jsonify({"ok": False, "error": "empty_role"}), 400
+
+    now = datetime.utcnow()
+    dt_to = _parse_dt_arg("to", now)
+    dt_from = _parse_dt_arg("from", dt_to - timedelta(days=30))
+    resolution = (request.args.get("resolution") or "auto").lower()
+    if resolution not in ("auto", "raw", "hour", "day", "week"):
+        resolution = "auto"
+
+    q = MarketDemandPoint.query.filter(
+        MarketDemandPoint.role_key == role_key(role),
+        MarketDemandPoint.ts >= dt_from,
+        MarketDemandPoint.ts <= dt_to,
+    )
+    if resolution != "auto":
+        # auto: свежие точки лежат в raw, старые — уже в роллапах; отдаём всё подряд по времени
+        q = q.filter(MarketDemandPoint.resolution == resolution)
+
+    # при обрезке по лимиту важнее свежие точки: берём последние по убыванию и разворачиваем
+    rows = q.order_by(MarketDemandPoint.ts.desc()).limit(DEMAND_SERIES_MAX_POINTS + 1).all()
+    truncated = len(rows) > DEMAND_SERIES_MAX_POINTS
+    points = [{
+        "ts": p.ts.isoformat(),
+        "found": int(p.found or 0),
+        "samples": int(p.samples or 1),
+        "resolution": p.resolution,
+        "top_skills": _safe_load_json(p.top_skills_json or "[]", []),
+    } for p in reversed(rows[:DEMAND_SERIES_MAX_POINTS])]
 
-    return jsonify({"results": results})
+    return jsonify({
+        "ok": True,
+        "role": role,
+        "from": dt_from.isoformat(),
+        "to": dt_to.isoformat(),
+        "resolution": resolution,
+        "points": points,
+        "truncated": truncated,
+    })
 
 
 @csrf.exempt
@@ -2667,34 +4506,122 @@ def risk_forecast():
 
     return jsonify(result)
 
+# =============================
+# ANALYTICS: частоты навыков студентов (GROUP BY по norm_name + кэш)
+# =============================
+SKILL_FREQ_TTL = int(os.getenv("SKILL_FREQ_TTL", "600"))
+
+_SKILL_FREQ_CACHE = {}  # kind -> (ts, Counter)
+_SKILL_FREQ_LOCK = threading.Lock()
+
+def student_skill_frequencies(kind: str = "hard") -> Counter:
+    """
+    {norm_name: сколько студентов с этим навыком} — один GROUP BY по индексу
+    ix_student_skill_kind_norm_student. Кэш на SKILL_FREQ_TTL, сбрасывается при записи навыков.
+    """
+    hit = _SKILL_FREQ_CACHE.get(kind)
+    if hit and time.time() - hit[0] < SKILL_FREQ_TTL:
+        return hit[1]
+    with _SKILL_FREQ_LOCK:
+        hit = _SKILL_FREQ_CACHE.get(kind)
+        if hit and time.time() - hit[0] < SKILL_FREQ_TTL:
+            return hit[1]
+        rows = (db.session.query(StudentSkill.norm_name, db.func.count(db.distinct(StudentSkill.student_id)))
+                .filter(StudentSkill.kind == kind, StudentSkill.norm_name != "")
+                .group_by(StudentSkill.norm_name)
+                .all())
+        counter = Counter({name: int(n) for name, n in rows if name})
+        _SKILL_FREQ_CACHE[kind] = (time.time(), counter)
+        return counter
+
+def invalidate_skill_frequencies():
+    _SKILL_FREQ_CACHE.clear()
+
+def backfill_skill_norm_names(only_missing: bool = True, batch: int = 1000) -> int:
+    """
+    Заполняет StudentSkill.norm_name = norm_skill(name). only_missing=False — пересчитать все
+    (после правок словаря синонимов). Возвращает число обновлённых строк.
+    """
+    q = db.session.query(StudentSkill.id, StudentSkill.name, StudentSkill.norm_name)
+    if only_missing:
+        q = q.filter(db.or_(StudentSkill.norm_name.is_(None), StudentSkill.norm_name == ""))
+    changed = []
+    for sid, name, current in q.all():
+        norm = norm_skill(name or "")[:120]
+        if norm != (current or ""):
+            changed.append({"id": sid, "norm_name": norm})
+    for i in range(0, len(changed), batch):
+        db.session.execute(db.update(StudentSkill), changed[i:i + batch])
+        db.session.commit()
+    invalidate_skill_frequencies()
+    return len(changed)
+
+def _readiness_item(r) -> dict:
+    return {
+        "id": r.id,
+        "name": r.full_name or f"Студент #{r.id}",
+        "city": r.city or "",
+        "score": int(r.readiness_score or 0),
+    }
+
 @csrf.exempt
-@app.get("/api/analytics/summary")
-def analytics_summary():
+@app.get("/api/analytics/students")
+def analytics_students():
+    """Студенты по баллу готовности (ix_student_readiness_score_id): ?order=asc|desc&min=&max=&city=&page=&per_page="""
     guard = require_any_role("admin", "hr")
     if guard:
         return guard
 
-    students = Student.query.all()
-    total = len(students) or 0
+    order = "desc" if (request.args.get("order") or "").lower() == "desc" else "asc"
+    min_score = request.args.get("min", type=int)
+    max_score = request.args.get("max", type=int)
+    city = (request.args.get("city") or "").strip()
+    page = max(0, request.args.get("page", default=0, type=int) or 0)
+    per_page = min(100, max(1, request.args.get("per_page", default=20, type=int) or 20))
+
+    q = db.session.query(Student.id, Student.full_name, Student.city, Student.readiness_score)
+    if min_score is not None:
+        q = q.filter(Student.readiness_score >= min_score)
+    if max_score is not None:
+        q = q.filter(Student.readiness_score <= max_score)
+    if city:
+        # точное совпадение: lower() в SQLite не понижает кириллицу
+        q = q.filter(Student.city == city)
+
+    total = q.count()
+    if order == "desc":
+        q = q.order_by(Student.readiness_score.desc(), Student.id.desc())
+    else:
+        q = q.order_by(Student.readiness_score.asc(), Student.id.asc())
+    rows = q.offset(page * per_page).limit(per_page).all()
 
-    scores = []
-    for st in students:
-        update_readiness_for_student(st)  # обновим флаги
-        scores.append(readiness_score(st))
-    db.session.commit()
+    return jsonify({
+        "ok": True,
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+        "pages": (total + per_page - 1) // per_page,
+        "order": order,
+        "items": [_readiness_item(r) for r in rows],
+    })
+
+@csrf.exempt
+@app.get("/api/analytics/summary")
+def analytics_summary():
+    guard = require_any_role("admin", "hr")
+    if guard:
+        return guard
 
-    avg_score = int(round(sum(scores) / (len(scores) or 1)))
+    # агрегаты по хранимому Student.readiness_score: два запроса, топ-10 — по индексу, GET ничего не пишет
+    total, avg = db.session.query(db.func.count(Student.id), db.func.avg(Student.readiness_score)).one()
+    total = int(total or 0)
+    avg_score = int(round(float(avg or 0)))
 
-    low = []
-    for st in students:
-        low.append({
-            "id": st.id,
-            "name": st.full_name or f"Студент #{st.id}",
-            "city": st.city or "",
-            "score": readiness_score(st),
-        })
-    low.sort(key=lambda x: x["score"])
-    low = low[:10]
+    rows = (db.session.query(Student.id, Student.full_name, Student.city, Student.readiness_score)
+            .order_by(Student.readiness_score.asc(), Student.id.asc())
+            .limit(10)
+            .all())
+    low = [_readiness_item(r) for r in rows]
 
     return jsonify({
         "ok": True,
@@ -2714,16 +4641,12 @@ def analytics_market_gap():
     role = (request.args.get("role") or "").strip() or "Junior Developer"
     rare_threshold = int(request.args.get("rare_threshold", 3) or 3)
 
-    # рынок (топ навыков)
-    market = market_gap_for_role(role, student_skill_names=set(), max_vac=20)
-    market_top = market.get("top_market") or []
+    # рынок (топ навыков) — только из кэша ролей; холодная роль догружается в фоне
+    market_counter, market_status = cached_role_counter(role)
+    market_top = [k for k, _ in (market_counter or Counter()).most_common(20) if k]
 
     # студенты (частота hard skills)
-    counter = Counter()
-    for s in StudentSkill.query.filter_by(kind="hard").all():
-        k = norm_skill(s.name)
-        if k:
-            counter[k] += 1
+    counter = student_skill_frequencies("hard")
     students_top = [k for k, _ in counter.most_common(30)]
 
     # gap: на рынке часто, у студентов редко
@@ -2745,15 +4668,411 @@ def analytics_market_gap():
         "market_top": market_top[:20],
         "students_top": students_top[:20],
         "gap_top": gap[:20],
-        "rare_threshold": rare_threshold
+        "rare_threshold": rare_threshold,
+        "market_status": market_status,
+    })
+
+
+# =============================
+# ANALYTICS: куб когорт (город x специальность x колледж x навык)
+# =============================
+COHORT_CUBE_INTERVAL = int(os.getenv("COHORT_CUBE_INTERVAL", "3600"))
+COHORT_MAX_VALUES = int(os.getenv("COHORT_MAX_VALUES", "50"))   # на измерение; остальное -> "другое"
+COHORT_MAX_SKILLS = int(os.getenv("COHORT_MAX_SKILLS", "200"))  # самые частые навыки; редкие не храним
+COHORT_MIN_STUDENTS = int(os.getenv("COHORT_MIN_STUDENTS", "3"))  # меньшие ячейки не храним
+
+COHORT_DIMS = ("city", "speciality", "college", "skill")
+COHORT_ALL = "*"
+COHORT_OTHER = "другое"
+
+def _percentile(hist: Counter, total: int, pct: int) -> int:
+    # hist: {значение 0..100: сколько студентов}; метод ближайшего ранга
+    if not total:
+        return 0
+    rank = max(1, -(-pct * total // 100))
+    seen = 0
+    for value in sorted(hist):
+        seen += hist[value]
+        if seen >= rank:
+            return int(value)
+    return int(max(hist))
+
+def _cohort_value(v, limit: int) -> str:
+    return " ".join(str(v or "").split())[:limit]
+
+def _cohort_top(rows, idx: int, limit: int) -> set:
+    counts = Counter()
+    for r in rows:
+        counts[r[idx]] += r[-1]
+    return {v for v, _ in counts.most_common(limit)}
+
+def _cohort_rows():
+    """
+    Мелкозернистые агрегаты из БД: (city, speciality, college, skill, readiness, fit_pct|None, students).
+    skill = "*" — строки по студентам, иначе — по hard-навыкам (norm_name).
+    """
+    mf = latest_market_fit_subquery()
+    dims = (Student.city, Student.speciality, Student.college, Student.readiness_score, mf.c.pct)
+    base = (db.session.query(*dims, db.func.count(Student.id))
+            .outerjoin(mf, db.and_(mf.c.student_id == Student.id, mf.c.rn == 1))
+            .group_by(*dims)
+            .all())
+    by_skill = (db.session.query(*dims, StudentSkill.norm_name, db.func.count(db.distinct(Student.id)))
+                .join(StudentSkill, StudentSkill.student_id == Student.id)
+                .outerjoin(mf, db.and_(mf.c.student_id == Student.id, mf.c.rn == 1))
+                .filter(StudentSkill.kind == "hard", StudentSkill.norm_name != "")
+                .group_by(*dims, StudentSkill.norm_name)
+                .all())
+
+    def clean(city, spec, college, readiness, pct, skill, n):
+        fit = None if pct is None else max(0, min(int(pct), 100))
+        return (_cohort_value(city, 120), _cohort_value(spec, 200), _cohort_value(college, 200),
+                skill, int(readiness or 0), fit, int(n))
+
+    rows = [clean(*r[:5], COHORT_ALL, r[5]) for r in base]
+    rows += [clean(*r[:5], _cohort_value(r[5], 120), r[6]) for r in by_skill]
+    return rows
+
+def _cohort_accumulate(rows) -> dict:
+    """Свёртка по всем 2^3 комбинациям город/специальность/колледж; навык — как есть."""
+    tops = [_cohort_top([r for r in rows if r[3] == COHORT_ALL], i, COHORT_MAX_VALUES) for i in range(3)]
+    tops.append(_cohort_top([r for r in rows if r[3] != COHORT_ALL], 3, COHORT_MAX_SKILLS))
+    masks = [(a, b, c) for a in (0, 1) for b in (0, 1) for c in (0, 1)]
+
+    cells = {}
+    for city, spec, college, skill, readiness, fit, n in rows:
+        vals = [v if v in top else COHORT_OTHER for v, top in zip((city, spec, college), tops)]
+        if skill != COHORT_ALL and skill not in tops[3]:
+            continue  # редкие навыки в куб не попадают
+        for mask in masks:
+            key = tuple(v if keep else COHORT_ALL for v, keep in zip(vals, mask)) + (skill,)
+            cell = cells.get(key)
+            if cell is None:
+                cell = cells[key] = [0, 0, Counter(), 0, 0, Counter()]
+            cell[0] += n
+            cell[1] += readiness * n
+            cell[2][readiness] += n
+            if fit is not None:
+                cell[3] += n
+                cell[4] += fit * n
+                cell[5][fit] += n
+    return cells
+
+@background_job("cohort_cube", COHORT_CUBE_INTERVAL)
+def refresh_cohort_cube() -> int:
+    """Пересчитывает куб целиком и заменяет таблицу одной транзакцией; возвращает число ячеек."""
+    now = datetime.utcnow()
+    cells = _cohort_accumulate(_cohort_rows())
+    db.session.rollback()  # не держим транзакцию чтения, пока считаем в Python
+
+    out = []
+    for (city, spec, college, skill), (n, r_sum, r_hist, f_n, f_sum, f_hist) in cells.items():
+        if n < COHORT_MIN_STUDENTS:
+            continue
+        out.append({
+            "city": city, "speciality": spec, "college": college, "skill": skill,
+            "students": n,
+            "readiness_avg": round(r_sum / n, 2),
+            "readiness_p25": _percentile(r_hist, n, 25),
+            "readiness_p50": _percentile(r_hist, n, 50),
+            "readiness_p75": _percentile(r_hist, n, 75),
+            "readiness_p90": _percentile(r_hist, n, 90),
+            "fit_students": f_n,
+            "fit_avg": round(f_sum / f_n, 2) if f_n else 0.0,
+            "fit_p50": _percentile(f_hist, f_n, 50),
+            "fit_p90": _percentile(f_hist, f_n, 90),
+            "computed_at": now,
+        })
+
+    try:
+        CohortCell.query.delete(synchronize_session=False)
+        for i in range(0, len(out), 5000):
+            db.session.execute(db.insert(CohortCell), out[i:i + 5000])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(out)
+
+def _cohort_item(c: CohortCell) -> dict:
+    return {
+        "city": c.city,
+        "speciality": c.speciality,
+        "college": c.college,
+        "skill": c.skill,
+        "students": c.students,
+        "readiness": {"avg": c.readiness_avg, "p25": c.readiness_p25, "p50": c.readiness_p50,
+                      "p75": c.readiness_p75, "p90": c.readiness_p90},
+        "market_fit": {"students": c.fit_students, "avg": c.fit_avg, "p50": c.fit_p50, "p90": c.fit_p90},
+    }
+
+_COHORT_SORTS = {
+    "students": CohortCell.students,
+    "readiness": CohortCell.readiness_avg,
+    "market_fit": CohortCell.fit_avg,
+}
+
+@csrf.exempt
+@app.get("/api/analytics/cohorts")
+def analytics_cohorts():
+    """
+    Срез/разрез куба: ?city=&speciality=&college=&skill= фиксируют измерения (по умолчанию "*" — все),
+    by=<измерение> раскладывает по его значениям; sort=students|readiness|market_fit, order, limit.
+    """
+    guard = require_any_role("admin", "hr")
+    if guard:
+        return guard
+
+    by = (request.args.get("by") or "").strip()
+    if by and by not in COHORT_DIMS:
+        return jsonify({"ok": False, "error": "bad_dimension", "dims": list(COHORT_DIMS)}), 400
+    sort = request.args.get("sort") or "students"
+    if sort not in _COHORT_SORTS:
+        return jsonify({"ok": False, "error": "bad_sort", "sorts": list(_COHORT_SORTS)}), 400
+    limit = min(500, max(1, request.args.get("limit", default=50, type=int) or 50))
+
+    filters = {}
+    q = CohortCell.query
+    for dim in COHORT_DIMS:
+        col = getattr(CohortCell, dim)
+        if dim == by:
+            q = q.filter(col != COHORT_ALL)
+            continue
+        value = (request.args.get(dim) or COHORT_ALL).strip()
+        if dim == "skill" and value != COHORT_ALL:
+            value = norm_skill(value)
+        filters[dim] = value
+        q = q.filter(col == value)
+
+    col = _COHORT_SORTS[sort]
+    q = q.order_by(col.asc() if request.args.get("order") == "asc" else col.desc(), CohortCell.id.asc())
+    cells = q.limit(limit).all() if by else q.limit(1).all()
+
+    # куб пересчитывается целиком: у всех ячеек одно время
+    computed_at = db.session.query(CohortCell.computed_at).limit(1).scalar()
+    return jsonify({
+        "ok": True,
+        "computed_at": computed_at.isoformat() + "Z" if computed_at else None,
+        "refresh_interval_s": COHORT_CUBE_INTERVAL,
+        "filters": filters,
+        "by": by or None,
+        "items": [_cohort_item(c) for c in cells],
     })
 
 
+# =============================
+# EXPORT: потоковая выгрузка CSV / Parquet
+# =============================
+# Строки читаются из БД пачками (yield_per — на PostgreSQL серверный курсор) и сразу уходят клиенту:
+# память не растёт с числом строк, заголовок отдаётся до первого запроса к БД.
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "2000"))
+EXPORT_FORMATS = ("csv", "parquet")
+
+_EXPORT_ARROW_TYPES = {"int": "int64", "float": "float64", "str": "string", "bool": "bool_", "ts": "timestamp"}
+
+def _export_cell(value):
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ", timespec="seconds")
+    if isinstance(value, bool):
+        return int(value)
+    return "" if value is None else value
+
+# Excel/LibreOffice исполняют ячейку как формулу, если она начинается с этих символов
+_CSV_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+def _csv_cell(value):
+    """Ячейка CSV: текст от пользователя (ФИО, заметки, навыки) с "=", "@"... экранируется апострофом."""
+    value = _export_cell(value)
+    if isinstance(value, str) and value.startswith(_CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+def _csv_chunks(columns: list, rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow([name for name, _ in columns])
+    yield "\ufeff" + buf.getvalue()  # BOM: Excel открывает UTF-8 с кириллицей
+    buf.seek(0)
+    buf.truncate()
+    n = 0
+    for row in rows:
+        writer.writerow([_csv_cell(v) for v in row])
+        n += 1
+        if n % EXPORT_CHUNK_ROWS == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+class _ExportSink(io.RawIOBase):
+    """Файл только на запись для ParquetWriter: отдаёт накопленные байты и помнит смещение (tell)."""
+    def __init__(self):
+        super().__init__()
+        self._parts = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._parts.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+def _parquet_schema(columns: list):
+    fields = []
+    for name, kind in columns:
+        t = _EXPORT_ARROW_TYPES[kind]
+        fields.append(pa.field(name, pa.timestamp("us") if t == "timestamp" else getattr(pa, t)()))
+    return pa.schema(fields)
+
+def _parquet_chunks(columns: list, rows):
+    # каждая пачка строк — отдельная row group; футер пишется при close()
+    schema = _parquet_schema(columns)
+    sink = _ExportSink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    batch = []
+
+    def flush():
+        data = {name: [r[i] for r in batch] for i, (name, _) in enumerate(columns)}
+        writer.write_table(pa.Table.from_pydict(data, schema=schema))
+        batch.clear()
+        return sink.drain()
+
+    yield sink.drain()  # магия "PAR1" — первые байты сразу
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= EXPORT_CHUNK_ROWS:
+            yield flush()
+    if batch:
+        yield flush()
+    writer.close()
+    yield sink.drain()
+
+def export_response(name: str, fmt: str, columns: list, query):
+    """columns — [(имя, int|float|str|bool|ts)] в порядке колонок query."""
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"ok": False, "error": "bad_format", "formats": list(EXPORT_FORMATS)}), 400
+    if fmt == "parquet" and pa is None:
+        return jsonify({"ok": False, "error": "parquet_unavailable"}), 501
+
+    rows = query.yield_per(EXPORT_CHUNK_ROWS)
+    filename = f"{name}_{datetime.utcnow():%Y%m%d_%H%M}.{fmt}"
+    if fmt == "csv":
+        body, mimetype = _csv_chunks(columns, rows), "text/csv"
+    else:
+        body, mimetype = _parquet_chunks(columns, rows), "application/vnd.apache.parquet"
+
+    resp = Response(stream_with_context(body), mimetype=mimetype)
+    resp.headers["Content-Disposition"] = f"attachment; filename={filename}"
+    resp.headers["Cache-Control"] = "no-store"
+    resp.headers["X-Accel-Buffering"] = "no"  # nginx: не буферизовать поток
+    return resp
+
+@csrf.exempt
+@app.get("/api/export/students.<fmt>")
+def export_students(fmt):
+    guard = require_any_role("admin", "hr")
+    if guard:
+        return guard
+
+    # последний процент соответствия рынку — коррелированным подзапросом: строки идут потоком
+    fit = (db.session.query(MarketFitSnapshot.market_fit_percent)
+           .filter(MarketFitSnapshot.student_id == Student.id)
+           .order_by(MarketFitSnapshot.id.desc())
+           .limit(1)
+           .correlate(Student)
+           .scalar_subquery())
+    analyzed = db.exists().where(StudentAnalysis.student_id == Student.id)
+    query = (db.session.query(
+                 Student.id, User.email, Student.full_name, Student.city, Student.region,
+                 Student.college, Student.speciality, Student.start_year, Student.job_intent,
+                 Student.remote, Student.roles_csv, Student.readiness_score, fit, analyzed, Student.created_at)
+             .join(User, User.id == Student.user_id)
+             .order_by(Student.id.asc()))
+    columns = [
+        ("student_id", "int"), ("email", "str"), ("full_name", "str"), ("city", "str"), ("region", "str"),
+        ("college", "str"), ("speciality", "str"), ("start_year", "str"), ("job_intent", "str"),
+        ("remote", "bool"), ("roles", "str"), ("readiness_score", "int"), ("market_fit_percent", "int"),
+        ("analysis_done", "bool"), ("created_at", "ts"),
+    ]
+    return export_response("students", fmt, columns, query)
+
+@csrf.exempt
+@app.get("/api/export/skills.<fmt>")
+def export_skills(fmt):
+    guard = require_any_role("admin", "hr")
+    if guard:
+        return guard
+
+    query = (db.session.query(StudentSkill.student_id, StudentSkill.kind, StudentSkill.name,
+                              StudentSkill.norm_name, StudentSkill.score)
+             .order_by(StudentSkill.student_id.asc(), StudentSkill.id.asc()))
+    kind = (request.args.get("kind") or "").strip()
+    if kind in ("hard", "soft"):
+        query = query.filter(StudentSkill.kind == kind)
+    columns = [("student_id", "int"), ("kind", "str"), ("name", "str"), ("norm_name", "str"), ("score", "int")]
+    return export_response("skills", fmt, columns, query)
+
+@csrf.exempt
+@app.get("/api/export/candidates.<fmt>")
+def export_candidates(fmt):
+    """Статусы кандидатов по анализам вакансий: работодатель — только свой ?analysis_id=, admin/hr — любые."""
+    guard = require_any_role("employer", "admin", "hr")
+    if guard:
+        return guard
+
+    analysis_id = request.args.get("analysis_id", type=int)
+    if current_user.role == "employer":
+        emp = current_employer()
+        eva = db.session.get(EmployerVacancyAnalysis, analysis_id) if analysis_id else None
+        if not emp or not eva or eva.employer_id != emp.id:
+            return jsonify({"ok": False, "error": "not_found"}), 404
+
+    query = (db.session.query(
+                 CandidateStatus.vacancy_analysis_id, EmployerVacancyAnalysis.title, EmployerVacancyAnalysis.hh_id,
+                 CandidateStatus.student_id, Student.full_name, Student.city, Student.readiness_score,
+                 CandidateStatus.percent, CandidateStatus.status, CandidateStatus.favorite,
+                 CandidateStatus.note, CandidateStatus.updated_at)
+             .join(EmployerVacancyAnalysis, EmployerVacancyAnalysis.id == CandidateStatus.vacancy_analysis_id)
+             .join(Student, Student.id == CandidateStatus.student_id)
+             .order_by(CandidateStatus.vacancy_analysis_id.asc(), CandidateStatus.percent.desc(),
+                       CandidateStatus.id.asc()))
+    if analysis_id:
+        query = query.filter(CandidateStatus.vacancy_analysis_id == analysis_id)
+    columns = [
+        ("analysis_id", "int"), ("vacancy_title", "str"), ("hh_id", "str"), ("student_id", "int"),
+        ("full_name", "str"), ("city", "str"), ("readiness_score", "int"), ("percent", "int"),
+        ("status", "str"), ("favorite", "bool"), ("note", "str"), ("updated_at", "ts"),
+    ]
+    return export_response(f"candidates_{analysis_id}" if analysis_id else "candidates", fmt, columns, query)
+
+
 # =============================
 # DB INIT
 # =============================
+# новые таблицы — create_all, изменения существующих — версионированные миграции (db_migrate.py)
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "1") != "0"
+
 with app.app_context():
     db.create_all()
+    if AUTO_MIGRATE:
+        from db_migrate import run_migrations, READINESS_SCORE_VERSION, SKILL_NORM_VERSION
+        applied = run_migrations(db.engine)
+        # колонки только что появились — заполняем по текущим данным
+        if SKILL_NORM_VERSION in applied:
+            logging.info("student_skill.norm_name backfill: %d rows", backfill_skill_norm_names())
+        if READINESS_SCORE_VERSION in applied:
+            logging.info("readiness_score backfill: %d students", backfill_readiness_scores())
 
 # =============================
 # RUN
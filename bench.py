@@ -0,0 +1,684 @@
+"""
+Микро-бенчмарки горячих мест VECTOR AI.
+
+Запуск:
+  python bench.py norm            # norm_skill: до / после
+  python bench.py incl            # heuristic_inclusivity: N проходов any() vs один проход
+  python bench.py db              # SQLite: чтение/запись при параллельных писателях, default vs WAL+PRAGMA
+  python bench.py plan            # EXPLAIN QUERY PLAN горячих запросов до / после миграций индексов
+  python bench.py analyze         # коммиты и SQL-запросы одного /student/api/analyze (LLM и рынок подменены)
+  python bench.py queries         # SQL-запросов на GET-роуты студента (hh.ru и рынок подменены)
+  python bench.py compact         # прореживание истории снапшотов: строки, место, время чтения истории
+
+analyze, queries и compact пишут во временного пользователя текущей БД и удаляет его; для чистоты запускайте
+с DATABASE_URL=sqlite:////tmp/bench.db.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event, select, text
+from sqlalchemy.orm import Session
+
+import db_migrate
+
+import app as vector_app
+
+
+def _rate(fn, items, rounds: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        for x in items:
+            fn(x)
+    dt = time.perf_counter() - t0
+    return (len(items) * rounds) / dt if dt else 0.0
+
+
+# =============================
+# norm_skill
+# =============================
+def _legacy_norm_skill(s: str) -> str:
+    # реализация до перехода на таксономию (3 regex-прохода + маленький dict)
+    s = (s or "").lower().strip()
+    s = s.replace("ё", "е")
+    s = re.sub(r"[^a-z0-9а-я\+#\s]", " ", s)
+    s = re.sub(r"\s+", " ", s).strip()
+    if s in vector_app._SKILL_ALIASES:
+        return vector_app._SKILL_ALIASES[s]
+    return s
+
+
+def _skill_corpus(n: int, seed: int) -> list[str]:
+    rnd = random.Random(seed)
+    taxonomy = vector_app._load_skill_taxonomy(vector_app.SKILL_TAXONOMY_PATH)
+    pool = []
+    for canon, aliases in taxonomy.items():
+        pool.append(canon)
+        pool.extend(aliases)
+    pool += ["Опыт работы с клиентами", "Коммерческий опыт от 1 года", "Уверенный пользователь 1С:Бухгалтерия 8.3"]
+
+    out = []
+    for _ in range(n):
+        x = rnd.choice(pool)
+        r = rnd.random()
+        if r < 0.3:
+            x = x.upper()
+        elif r < 0.5:
+            x = x.title() + rnd.choice(["", ".", " ", " (продвинутый)", ", "])
+        out.append(x)
+    return out
+
+
+def bench_norm(args):
+    items = _skill_corpus(args.n, args.seed)
+    # в реальных циклах (employer_match_students, market_gap_for_role) строки повторяются
+    print(f"corpus: {len(items)} строк, уникальных {len(set(items))}")
+
+    legacy = _rate(_legacy_norm_skill, items, args.rounds)
+
+    vector_app.norm_skill.cache_clear()
+    cold = _rate(vector_app.norm_skill.__wrapped__, items, args.rounds)
+
+    vector_app.norm_skill.cache_clear()
+    warm = _rate(vector_app.norm_skill, items, args.rounds)
+
+    print(f"before (regex):        {legacy:>12,.0f} calls/s")
+    print(f"after  (no memo):      {cold:>12,.0f} calls/s  x{cold / legacy:.1f}")
+    print(f"after  (memo cache):   {warm:>12,.0f} calls/s  x{warm / legacy:.1f}")
+    print(f"cache: {vector_app.norm_skill.cache_info()}")
+    print(f"trie:  {vector_app._SKILL_TRIE.size} фраз")
+
+
+# =============================
+# heuristic_inclusivity
+# =============================
+def _legacy_inclusivity_categories(text: str) -> tuple[dict, list]:
+    # старая схема: отдельный any(k in t ...) на каждую категорию
+    t = (text or "").lower()
+    cats = {}
+    for cat, (_, kws) in vector_app._INCL_RULES.items():
+        cats[cat] = any(k in t for k in kws)
+    risks = [flag for flag, kws in vector_app._INCL_RISKS.items() if any(k in t for k in kws)]
+    return cats, risks
+
+
+_SENTENCES = [
+    "Мы ищем ответственного специалиста в растущую команду.",
+    "Обязанности: сопровождение клиентов, ведение документации, подготовка отчётов.",
+    "Требования: высшее или среднее специальное образование, знание ПК, грамотная речь.",
+    "Условия: официальное трудоустройство по ТК РК, оплачиваемый отпуск, белая зарплата.",
+    "Дружный коллектив, современный офис в центре города, корпоративные мероприятия.",
+    "Опыт работы в аналогичной должности от 1 года будет преимуществом.",
+    "Знание 1С, Excel, умение работать с большим объёмом информации.",
+    "We are looking for a motivated engineer to join our product team.",
+    "Responsibilities include code review, writing tests and supporting CI pipelines.",
+    "Компания предоставляет ДМС, компенсацию питания и обучение за счёт работодателя.",
+    "График работы 5/2 с 9:00 до 18:00, обед 1 час.",
+    "Возможна удалённая работа после испытательного срока.",
+    "Рассматриваем кандидатов без опыта, проводим стажировку.",
+    "Офис оборудован пандусом, есть лифт, рабочее место адаптируем под сотрудника.",
+    "Чёткие задачи, структурированный процесс, наставник на первые месяцы.",
+    "Коммуникация в основном в мессенджерах, без звонков.",
+]
+
+
+# перекрывающиеся ключевые слова: regex без lookahead их терял, Aho-Corasick находит
+_OVERLAP_CASES = [
+    "junioremote",
+    "пандустажировка",
+    "доступнейро",
+    "удалённая работа без опыта, гибкий графикпредсказуемо",
+    "безбарьерная среда, нейродивергентным кандидатам — структурированные задачи",
+]
+
+
+def _description_corpus(n: int, seed: int) -> list[str]:
+    rnd = random.Random(seed)
+    docs = []
+    for _ in range(n):
+        target = rnd.randint(5000, 10000)
+        parts, size = [], 0
+        while size < target:
+            x = rnd.choice(_SENTENCES[:11]) if rnd.random() < 0.93 else rnd.choice(_SENTENCES)
+            parts.append(x)
+            size += len(x) + 1
+        docs.append(" ".join(parts))
+    return docs
+
+
+def bench_incl(args):
+    docs = _description_corpus(args.n, args.seed)
+    total_kb = sum(len(d) for d in docs) / 1024
+    print(f"corpus: {len(docs)} описаний, {total_kb:,.0f} KB")
+
+    # корректность: одинаковые категории и флаги
+    for d in docs:
+        new = vector_app.heuristic_inclusivity(d)
+        old_cats, old_risks = _legacy_inclusivity_categories(d)
+        assert new["categories"] == old_cats and new["risk_flags"] == old_risks
+
+    t0 = time.perf_counter()
+    for _ in range(args.rounds):
+        for d in docs:
+            _legacy_inclusivity_categories(d)
+    legacy = time.perf_counter() - t0
+
+    per = len(docs) * args.rounds
+    label = f"before (any() x {len(vector_app._INCL_RULES) + len(vector_app._INCL_RISKS)}):"
+    print(f"{label:<32}{legacy / per * 1e6:>8.1f} us/doc  {total_kb * args.rounds / legacy:>10,.0f} KB/s")
+
+    groups = {**{c: k for c, (_, k) in vector_app._INCL_RULES.items()}, **vector_app._INCL_RISKS}
+    engines = ["regex"] + (["aho-corasick"] if vector_app.ahocorasick is not None else [])
+    saved = vector_app.ahocorasick
+    found_by = {}
+    for engine in engines:
+        vector_app.ahocorasick = saved if engine == "aho-corasick" else None
+        matcher = vector_app.KeywordMatcher(groups)
+        vector_app.ahocorasick = saved
+
+        for d in docs + _OVERLAP_CASES:
+            cats, risks = _legacy_inclusivity_categories(d)
+            assert set(matcher.scan(d)) == {c for c, v in cats.items() if v} | set(risks), (engine, d[:80])
+        found_by[engine] = [set(matcher.scan(d)) for d in _OVERLAP_CASES]
+
+        t0 = time.perf_counter()
+        for _ in range(args.rounds):
+            for d in docs:
+                matcher.scan(d)
+        dt = time.perf_counter() - t0
+        label = f"after  ({engine}, 1 pass):"
+        print(f"{label:<32}{dt / per * 1e6:>8.1f} us/doc  {total_kb * args.rounds / dt:>10,.0f} KB/s  x{legacy / dt:.2f}")
+
+    if len(found_by) > 1:
+        assert found_by["regex"] == found_by["aho-corasick"]
+        print(f"regex == aho-corasick на {len(_OVERLAP_CASES)} перекрывающихся примерах")
+    if vector_app.ahocorasick is None:
+        print("pyahocorasick не установлен — в приложении работает regex-движок")
+
+
+# =============================
+# SQLite: параллельные писатели и читатели
+# =============================
+def _db_engine(path: str, tuned: bool):
+    url = "sqlite:///" + path
+    if not tuned:
+        # как было в приложении: настройки SQLAlchemy по умолчанию
+        return create_engine(url)
+    engine = create_engine(url, **vector_app.sqlite_engine_options())
+    event.listen(engine, "connect", vector_app.sqlite_on_connect)
+    return engine
+
+
+def _db_run(tuned: bool, args) -> dict:
+    table = vector_app.VacancyInclusivity.__table__
+    fd, path = tempfile.mkstemp(suffix=".db", prefix="bench_")
+    os.close(fd)
+    engine = _db_engine(path, tuned)
+    table.create(engine)
+
+    stats = {"writes": 0, "reads": 0, "errors": 0, "read_lat": []}
+    lock = threading.Lock()
+    stop = time.perf_counter() + args.seconds
+    seq = iter(range(10 ** 9))
+
+    def writer():
+        n = err = 0
+        while time.perf_counter() < stop:
+            with lock:
+                i = next(seq)
+            try:
+                with engine.begin() as conn:
+                    conn.execute(table.insert().values(
+                        hh_id=f"w{i}", categories_json='{"remote_possible": true}',
+                        tags_json="[]", risk_flags_json="[]", note="", classifier_version="bench",
+                    ))
+                n += 1
+            except Exception:
+                err += 1
+        with lock:
+            stats["writes"] += n
+            stats["errors"] += err
+
+    def reader():
+        rnd = random.Random(threading.get_ident())
+        n = err = 0
+        lat = []
+        while time.perf_counter() < stop:
+            ids = [f"w{rnd.randrange(max(1, stats['writes'] + 1000))}" for _ in range(20)]
+            t0 = time.perf_counter()
+            try:
+                with engine.connect() as conn:
+                    conn.execute(select(table.c.hh_id, table.c.categories_json).where(table.c.hh_id.in_(ids))).all()
+                n += 1
+                lat.append(time.perf_counter() - t0)
+            except Exception:
+                err += 1
+        with lock:
+            stats["reads"] += n
+            stats["errors"] += err
+            stats["read_lat"] += lat
+
+    threads = [threading.Thread(target=writer) for _ in range(args.writers)]
+    threads += [threading.Thread(target=reader) for _ in range(args.readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    with engine.connect() as conn:
+        mode = conn.exec_driver_sql("PRAGMA journal_mode").scalar()
+    engine.dispose()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    lat = sorted(stats["read_lat"]) or [0.0]
+    stats["p99_ms"] = lat[int(len(lat) * 0.99) - 1 if len(lat) > 1 else 0] * 1000
+    stats["journal"] = mode
+    return stats
+
+
+def bench_db(args):
+    print(f"writers={args.writers} readers={args.readers} {args.seconds}s на режим")
+    base = None
+    for tuned in (False, True):
+        st = _db_run(tuned, args)
+        label = f"{'tuned' if tuned else 'default'} ({st['journal']}):"
+        w, r = st["writes"] / args.seconds, st["reads"] / args.seconds
+        line = f"{label:<20}{w:>9,.0f} writes/s {r:>10,.0f} reads/s  p99 read {st['p99_ms']:>7.1f} ms  errors {st['errors']}"
+        if base:
+            line += f"  x{w / base[0]:.1f} w, x{r / base[1]:.1f} r" if base[0] and base[1] else ""
+        else:
+            base = (w, r)
+        print(line)
+
+
+# =============================
+# EXPLAIN QUERY PLAN: индексы горячих запросов
+# =============================
+def _hot_queries():
+    m = vector_app
+    return [
+        ("ix_vacancy_application_hh_id",
+         select(m.VacancyApplication).where(m.VacancyApplication.hh_id == "h7")),
+        ("ix_employer_vacancy_analysis_hh_id_id",
+         select(m.EmployerVacancyAnalysis).where(m.EmployerVacancyAnalysis.hh_id == "h7")
+         .order_by(m.EmployerVacancyAnalysis.id.desc()).limit(1)),
+        ("ix_student_skill_student_kind_score",
+         select(m.StudentSkill).where(m.StudentSkill.student_id == 7, m.StudentSkill.kind == "hard")
+         .order_by(m.StudentSkill.score.desc())),
+        ("ix_market_fit_snapshot_student_created",
+         select(m.MarketFitSnapshot).where(m.MarketFitSnapshot.student_id == 7)
+         .order_by(m.MarketFitSnapshot.created_at.desc()).limit(10)),
+        ("ix_skill_snapshot_student_created",
+         select(m.SkillSnapshot).where(m.SkillSnapshot.student_id == 7)
+         .order_by(m.SkillSnapshot.created_at.desc()).limit(10)),
+        ("ix_student_analysis_student_id_id",
+         select(m.StudentAnalysis).where(m.StudentAnalysis.student_id == 7)
+         .order_by(m.StudentAnalysis.id.desc()).limit(1)),
+    ]
+
+
+def _seed_hot_tables(conn, n: int):
+    rnd = random.Random(1)
+    now = time.time()
+    ts = lambda: time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(now - rnd.randrange(10 ** 7)))
+    students = max(1, n // 20)
+    conn.execute(text("INSERT INTO vacancy_application (student_id, hh_id, hh_url, vacancy_name, employer_name, status, created_at) "
+                      "VALUES (:s, :h, '', '', '', 'sent', :t)"),
+                 [{"s": i % students, "h": f"h{i}", "t": ts()} for i in range(n)])
+    conn.execute(text("INSERT INTO employer_vacancy_analysis (employer_id, title, hh_id, skills_json, created_at) "
+                      "VALUES (:e, '', :h, '[]', :t)"),
+                 [{"e": i % 50, "h": f"h{i % (n // 4 or 1)}", "t": ts()} for i in range(n)])
+    conn.execute(text("INSERT INTO student_skill (student_id, kind, name, score) VALUES (:s, :k, :nm, :sc)"),
+                 [{"s": i % students, "k": "hard" if i % 3 else "soft", "nm": f"skill{i % 300}", "sc": rnd.randrange(100)}
+                  for i in range(n)])
+    for table in ("market_fit_snapshot", "skill_snapshot"):
+        conn.execute(text(f"INSERT INTO {table} (student_id, created_at) VALUES (:s, :t)"),
+                     [{"s": i % students, "t": ts()} for i in range(n)])
+    conn.execute(text("INSERT INTO student_analysis (student_id, created_at) VALUES (:s, :t)"),
+                 [{"s": i % students, "t": ts()} for i in range(n)])
+
+
+def _plan(conn, stmt) -> str:
+    compiled = stmt.compile(dialect=conn.dialect)
+    rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled), tuple(compiled.params.values())).all()
+    return "; ".join(r[-1] for r in rows)
+
+
+def _time_query(conn, stmt, rounds: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        conn.execute(stmt).all()
+    return (time.perf_counter() - t0) / rounds * 1e3
+
+
+def bench_plan(args):
+    fd, path = tempfile.mkstemp(suffix=".db", prefix="bench_plan_")
+    os.close(fd)
+    engine = create_engine("sqlite:///" + path)
+    try:
+        # схема как у старой БД: таблицы есть, индексов горячих запросов ещё нет
+        vector_app.db.metadata.create_all(engine)
+        with engine.begin() as conn:
+            for name, _, _ in db_migrate.HOT_PATH_INDEXES:
+                conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+            _seed_hot_tables(conn, args.n)
+            conn.exec_driver_sql("ANALYZE")
+
+        queries = _hot_queries()
+        with engine.connect() as conn:
+            before = [(_plan(conn, q), _time_query(conn, q, args.rounds)) for _, q in queries]
+
+        applied = db_migrate.run_migrations(engine)
+        print(f"applied migrations: {applied}, rows per table: {args.n}\n")
+
+        failed = 0
+        with engine.connect() as conn:
+            for (index, q), (plan0, ms0) in zip(queries, before):
+                plan1, ms1 = _plan(conn, q), _time_query(conn, q, args.rounds)
+                ok = index in plan1 and "TEMP B-TREE" not in plan1
+                failed += not ok
+                print(f"[{'ok' if ok else 'FAIL'}] {index}")
+                print(f"   before {ms0:>8.3f} ms  {plan0}")
+                print(f"   after  {ms1:>8.3f} ms  {plan1}")
+        if failed:
+            raise SystemExit(f"{failed} запрос(ов) без ожидаемого индекса")
+    finally:
+        engine.dispose()
+        os.remove(path)
+
+
+# =============================
+# /student/api/analyze: число коммитов и запросов
+# =============================
+_CANNED_ANALYSIS = {
+    "personality_type": "ИНТП",
+    "personality_short": "Аналитик, любит разбираться в системах.",
+    "soft_skills": [{"name": n, "score": 60 + i} for i, n in enumerate(["Коммуникация", "Работа в команде", "Самоорганизация"])],
+    "hard_skills": [{"name": n, "score": 50 + i} for i, n in enumerate(["Питон", "SQL", "Гит", "Докер", "Линукс", "Джанго"])],
+    "top_roles": ["Бэкенд разработчик", "Аналитик данных", "Тестировщик"],
+    "learning_plan": [{"skill": "Докер", "why": "часто в вакансиях", "next_step": "пройти курс"}],
+}
+
+
+class _SqlCounter:
+    def __init__(self):
+        self.commits = 0
+        self.statements = Counter()
+
+    def on_execute(self, conn, cursor, statement, params, context, executemany):
+        self.statements[statement.lstrip().split(None, 1)[0].upper()] += 1
+
+    def on_commit(self, session):
+        self.commits += 1
+
+
+def bench_analyze(args):
+    app, db = vector_app.app, vector_app.db
+    app.config["WTF_CSRF_ENABLED"] = False
+
+    # LLM и hh.ru не участвуют: меряем только работу с БД
+    vector_app.llm_chat = lambda *a, **k: json.dumps(_CANNED_ANALYSIS, ensure_ascii=False)
+    vector_app.market_gap_for_role = lambda role, skills, max_vac=20: {
+        "top_market": ["python", "sql", "docker", "git"], "have": ["python", "sql"], "missing": ["docker", "git"],
+    }
+
+    with app.app_context():
+        user = vector_app.User(role="student", email=f"bench-{time.time_ns()}@vector.local", password_hash="x")
+        db.session.add(user)
+        db.session.commit()
+        st = vector_app.Student(user_id=user.id, full_name="Bench", roles_csv="QA")
+        db.session.add(st)
+        db.session.commit()
+        user_id, student_id = user.id, st.id
+        engine = db.engine
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["_user_id"] = str(user_id)
+        sess["_fresh"] = True
+
+    counter = _SqlCounter()
+    event.listen(engine, "before_cursor_execute", counter.on_execute)
+    event.listen(Session, "after_commit", counter.on_commit)
+    try:
+        t0 = time.perf_counter()
+        for _ in range(args.rounds):
+            r = client.post("/student/api/analyze", json={})
+            assert r.get_json().get("ok"), r.get_json()
+        dt = (time.perf_counter() - t0) / args.rounds
+    finally:
+        event.remove(engine, "before_cursor_execute", counter.on_execute)
+        event.remove(Session, "after_commit", counter.on_commit)
+
+    per = lambda x: x / args.rounds
+    stmts = ", ".join(f"{k} {per(v):.0f}" for k, v in counter.statements.most_common())
+    print(f"per /student/api/analyze call ({args.rounds} rounds, {engine.dialect.name}):")
+    print(f"  commits:    {per(counter.commits):.0f}")
+    print(f"  statements: {per(sum(counter.statements.values())):.0f}  ({stmts})")
+    print(f"  time:       {dt * 1000:.1f} ms")
+
+    with app.app_context():
+        snaps = vector_app.SkillSnapshot.query.filter_by(student_id=student_id).count()
+        fits = vector_app.MarketFitSnapshot.query.filter_by(student_id=student_id).count()
+        print(f"  snapshots:  {snaps / args.rounds:.0f} skill, {fits / args.rounds:.0f} market fit")
+
+        for model in (vector_app.MarketFitSnapshot, vector_app.SkillSnapshot, vector_app.StudentSkill,
+                      vector_app.StudentAnalysis, vector_app.StudentMessage):
+            model.query.filter_by(student_id=student_id).delete()
+        db.session.delete(db.session.get(vector_app.User, user_id))
+        db.session.commit()
+
+
+_QUERY_ROUTES = [
+    "/student",
+    "/student/profile",
+    "/student/result",
+    "/student/resume",
+    "/student/market-bridge",
+    "/student/vacancies",
+    "/student/vacancy/1001",
+    "/student/api/profile/market-gap",
+    "/student/api/profile/app-stats",
+]
+
+def bench_queries(args):
+    app, db = vector_app.app, vector_app.db
+    app.config["WTF_CSRF_ENABLED"] = False
+
+    # сеть не участвует: меряем только обращения к БД
+    vacancy = {"id": "1001", "name": "QA", "employer": {"name": "ТОО"}, "alternate_url": "u",
+               "key_skills": [{"name": "Python"}], "description": ""}
+    vector_app.hh_search_vacancies = lambda *a, **k: {"items": [dict(vacancy)], "found": 1}
+    vector_app.hh_get_vacancy = lambda hh_id: dict(vacancy)
+    vector_app.canonical_skill_set = lambda hh_id: {"python", "sql"}
+    vector_app.market_gap_for_role = lambda role, skills, max_vac=20: {
+        "top_market": ["python", "sql"], "have": ["python"], "missing": ["sql"],
+    }
+
+    with app.app_context():
+        user = vector_app.User(role="student", email=f"bench-{time.time_ns()}@vector.local", password_hash="x")
+        db.session.add(user)
+        db.session.commit()
+        st = vector_app.Student(user_id=user.id, full_name="Bench", roles_csv="QA",
+                                resume_title="QA", resume_summary="x", resume_contacts="x")
+        db.session.add(st)
+        db.session.commit()
+        db.session.add(vector_app.StudentAnalysis(student_id=st.id, personality_type="Аналитик",
+                                                  top_roles_json='["QA"]', learning_plan_json="[]"))
+        db.session.add_all([
+            vector_app.StudentSkill(student_id=st.id, **row)
+            for row in vector_app._analysis_skill_rows(_CANNED_ANALYSIS)
+        ])
+        db.session.commit()
+        user_id, student_id = user.id, st.id
+        engine = db.engine
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["_user_id"] = str(user_id)
+        sess["_fresh"] = True
+
+    counter = _SqlCounter()
+    total = 0
+    print(f"SQL statements per request ({args.rounds} rounds, {engine.dialect.name}):")
+    try:
+        for route in _QUERY_ROUTES:
+            counter.statements.clear()
+            event.listen(engine, "before_cursor_execute", counter.on_execute)
+            try:
+                for _ in range(args.rounds):
+                    r = client.get(route)
+                    assert r.status_code == 200, (route, r.status_code)
+            finally:
+                event.remove(engine, "before_cursor_execute", counter.on_execute)
+            n = sum(counter.statements.values()) / args.rounds
+            total += n
+            print(f"  {route:<36} {n:>5.1f}")
+        print(f"  {'total':<36} {total:>5.1f}")
+    finally:
+        with app.app_context():
+            for model in (vector_app.StudentSkill, vector_app.StudentAnalysis, vector_app.StudentMessage):
+                model.query.filter_by(student_id=student_id).delete()
+            db.session.delete(db.session.get(vector_app.User, user_id))
+            db.session.commit()
+
+
+def _history_ms(student_ids: list[int], rounds: int = 50) -> float:
+    db = vector_app.db
+    t0 = time.perf_counter()
+    for i in range(rounds):
+        sid = student_ids[i % len(student_ids)]
+        for model in (vector_app.SkillSnapshot, vector_app.MarketFitSnapshot):
+            rows = (model.query.filter_by(student_id=sid)
+                    .order_by(model.created_at.desc()).limit(10).all())
+            [r.created_at for r in rows]
+        db.session.rollback()
+    return (time.perf_counter() - t0) / rounds * 1000
+
+
+def _sqlite_pages() -> str:
+    db = vector_app.db
+    if db.engine.dialect.name != "sqlite":
+        return "n/a"
+    size = db.session.execute(text("PRAGMA page_size")).scalar()
+    pages = db.session.execute(text("PRAGMA page_count")).scalar()
+    free = db.session.execute(text("PRAGMA freelist_count")).scalar()
+    return f"{pages * size / 2**20:.1f} MiB, free {free * size / 2**20:.1f} MiB"
+
+
+def bench_compact(args):
+    app, db = vector_app.app, vector_app.db
+    skills_json = json.dumps(vector_app._analysis_skill_rows(_CANNED_ANALYSIS), ensure_ascii=False)
+    gap_json = json.dumps(["python", "sql", "docker", "git", "linux", "kubernetes"], ensure_ascii=False)
+    roles = _CANNED_ANALYSIS["top_roles"]
+    now = datetime.utcnow()
+    rnd = random.Random(args.seed)
+
+    with app.app_context():
+        user_ids, student_ids = [], []
+        for i in range(args.students):
+            user = vector_app.User(role="student", email=f"bench-{time.time_ns()}-{i}@vector.local", password_hash="x")
+            db.session.add(user)
+            db.session.flush()
+            st = vector_app.Student(user_id=user.id, full_name="Bench")
+            db.session.add(st)
+            db.session.flush()
+            user_ids.append(user.id)
+            student_ids.append(st.id)
+        db.session.commit()
+
+        # история: несколько анализов в день за args.days дней, 3 роли на анализ
+        skill_rows, fit_rows = [], []
+        for sid in student_ids:
+            for day in range(args.days):
+                for _ in range(args.per_day):
+                    ts = now - timedelta(days=day, seconds=rnd.randrange(86400))
+                    skill_rows.append({"student_id": sid, "created_at": ts, "personality_type": "ИНТП",
+                                       "skills_json": skills_json, "note": "после анализа"})
+                    fit_rows += [{"student_id": sid, "created_at": ts, "role": role, "market_fit_percent": 50,
+                                  "missing_json": gap_json, "have_json": gap_json, "top_market_json": gap_json,
+                                  "note": "после анализа"} for role in roles]
+        db.session.execute(db.insert(vector_app.SkillSnapshot), skill_rows)
+        db.session.execute(db.insert(vector_app.MarketFitSnapshot), fit_rows)
+        db.session.commit()
+
+        def counts():
+            return tuple(model.query.filter(model.student_id.in_(student_ids)).count()
+                         for model in (vector_app.SkillSnapshot, vector_app.MarketFitSnapshot))
+
+        print(f"{args.students} students x {args.days} days x {args.per_day}/day ({db.engine.dialect.name})")
+        before, hist_before = counts(), _history_ms(student_ids)
+        print(f"  before:  skill {before[0]:>7,}  market fit {before[1]:>7,}  history {hist_before:.2f} ms  db {_sqlite_pages()}")
+
+        t0 = time.perf_counter()
+        vector_app.compact_snapshots(now=now)
+        dt = time.perf_counter() - t0
+        after, hist_after = counts(), _history_ms(student_ids)
+        print(f"  after:   skill {after[0]:>7,}  market fit {after[1]:>7,}  history {hist_after:.2f} ms  db {_sqlite_pages()}")
+        print(f"  compaction {dt:.2f} s; second run removes {sum(vector_app.compact_snapshots(now=now).values())} rows")
+
+        for model in (vector_app.SkillSnapshot, vector_app.MarketFitSnapshot):
+            model.query.filter(model.student_id.in_(student_ids)).delete(synchronize_session=False)
+        vector_app.Student.query.filter(vector_app.Student.id.in_(student_ids)).delete(synchronize_session=False)
+        vector_app.User.query.filter(vector_app.User.id.in_(user_ids)).delete(synchronize_session=False)
+        db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VECTOR AI micro-benchmarks")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("norm", help="norm_skill calls/sec")
+    p.add_argument("--n", type=int, default=20000)
+    p.add_argument("--rounds", type=int, default=5)
+    p.add_argument("--seed", type=int, default=42)
+    p.set_defaults(func=bench_norm)
+
+    p = sub.add_parser("incl", help="inclusivity keyword scan over vacancy descriptions")
+    p.add_argument("--n", type=int, default=300)
+    p.add_argument("--rounds", type=int, default=3)
+    p.add_argument("--seed", type=int, default=42)
+    p.set_defaults(func=bench_incl)
+
+    p = sub.add_parser("db", help="SQLite read/write throughput under concurrent writers")
+    p.add_argument("--writers", type=int, default=4)
+    p.add_argument("--readers", type=int, default=8)
+    p.add_argument("--seconds", type=float, default=5)
+    p.set_defaults(func=bench_db)
+
+    p = sub.add_parser("plan", help="EXPLAIN QUERY PLAN of hot queries before/after index migrations")
+    p.add_argument("--n", type=int, default=50000)
+    p.add_argument("--rounds", type=int, default=200)
+    p.set_defaults(func=bench_plan)
+
+    p = sub.add_parser("analyze", help="commits and SQL statements per /student/api/analyze call")
+    p.add_argument("--rounds", type=int, default=3)
+    p.set_defaults(func=bench_analyze)
+
+    p = sub.add_parser("queries", help="SQL statements per student GET route")
+    p.add_argument("--rounds", type=int, default=3)
+    p.set_defaults(func=bench_queries)
+
+    p = sub.add_parser("compact", help="snapshot history compaction: rows, space, history read time")
+    p.add_argument("--students", type=int, default=50)
+    p.add_argument("--days", type=int, default=365)
+    p.add_argument("--per-day", type=int, default=2)
+    p.add_argument("--seed", type=int, default=42)
+    p.set_defaults(func=bench_compact)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,183 @@
-import sqlite3
-import os
+"""
+Версионированные миграции схемы (SQLite и PostgreSQL).
 
-BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-DB_PATH = os.path.join(BASE_DIR, "vector_ai.db")
+Применённые версии хранятся в таблице schema_version, каждая миграция выполняется один раз.
+Новые таблицы по-прежнему создаёт db.create_all(); миграции досоздают колонки и индексы
+в уже существующих БД. Запускаются при старте app (AUTO_MIGRATE=1) или вручную:
 
-def cols(cur, table):
-    cur.execute(f"PRAGMA table_info({table});")
-    return {row[1] for row in cur.fetchall()}
+  python db_migrate.py            # применить недостающие
+  python db_migrate.py --status   # применённые / ожидающие версии
+  python db_migrate.py --backfill-readiness   # пересчитать student.readiness_score
+  python db_migrate.py --backfill-skill-norm  # пересчитать student_skill.norm_name (после правок синонимов)
+  python db_migrate.py --vacuum   # SQLite: полный VACUUM + auto_vacuum=INCREMENTAL (блокирует БД, в окно обслуживания)
+"""
+import sys
+from datetime import datetime
 
-def add_col(cur, table, name, sql_type, default_sql="''"):
-    if name in cols(cur, table):
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+
+SCHEMA_TABLE = "schema_version"
+
+MIGRATIONS = []  # [(version, name, fn(conn), online)]
+
+
+def migration(version: int, name: str, online: bool = False):
+    """
+    Регистрирует миграцию. online=True — выполняется вне транзакции (AUTOCOMMIT):
+    на PostgreSQL индексы строятся CONCURRENTLY, без блокировки записи.
+    Такие миграции должны быть идемпотентными.
+    """
+    def deco(fn):
+        MIGRATIONS.append((version, name, fn, online))
+        return fn
+    return deco
+
+
+# =============================
+# helpers
+# =============================
+def cols(conn, table):
+    return {c["name"] for c in inspect(conn).get_columns(table)}
+
+def add_col(conn, table, name, sql_type, default_sql="''"):
+    if name in cols(conn, table):
         print(f"OK: {table}.{name} exists")
         return
-    cur.execute(f"ALTER TABLE {table} ADD COLUMN {name} {sql_type} DEFAULT {default_sql};")
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {sql_type} DEFAULT {default_sql}"))
     print(f"ADDED: {table}.{name}")
 
-def main():
-    con = sqlite3.connect(DB_PATH)
-    cur = con.cursor()
+def create_index(conn, name, table, columns):
+    if name in {ix["name"] for ix in inspect(conn).get_indexes(table)}:
+        print(f"OK: index {name} exists")
+        return
+    concurrently = "CONCURRENTLY " if conn.dialect.name == "postgresql" else ""
+    conn.execute(text(f"CREATE INDEX {concurrently}IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"))
+    print(f"ADDED: index {name}")
+
 
-    # market_fit_snapshot new columns (если их ещё нет)
-    add_col(cur, "market_fit_snapshot", "missing_json", "TEXT", "'[]'")
-    add_col(cur, "market_fit_snapshot", "have_json", "TEXT", "'[]'")
-    add_col(cur, "market_fit_snapshot", "top_market_json", "TEXT", "'[]'")
-    add_col(cur, "market_fit_snapshot", "note", "VARCHAR(120)", "''")
+# =============================
+# migrations
+# =============================
+@migration(1, "market_fit_snapshot: missing/have/top_market json + note")
+def m001_market_fit_columns(conn):
+    add_col(conn, "market_fit_snapshot", "missing_json", "TEXT", "'[]'")
+    add_col(conn, "market_fit_snapshot", "have_json", "TEXT", "'[]'")
+    add_col(conn, "market_fit_snapshot", "top_market_json", "TEXT", "'[]'")
+    add_col(conn, "market_fit_snapshot", "note", "VARCHAR(120)", "''")
 
     # если осталась старая колонка market_missing_json — можно оставить (не мешает),
     # или позже сделаем перенос данных.
 
-    con.commit()
-    con.close()
+# индексы горячих запросов (совпадают с __table_args__ моделей в app.py)
+HOT_PATH_INDEXES = [
+    ("ix_vacancy_application_hh_id", "vacancy_application", ["hh_id"]),
+    ("ix_employer_vacancy_analysis_hh_id_id", "employer_vacancy_analysis", ["hh_id", "id"]),
+    ("ix_student_skill_student_kind_score", "student_skill", ["student_id", "kind", "score"]),
+    ("ix_market_fit_snapshot_student_created", "market_fit_snapshot", ["student_id", "created_at"]),
+    ("ix_skill_snapshot_student_created", "skill_snapshot", ["student_id", "created_at"]),
+    ("ix_student_analysis_student_id_id", "student_analysis", ["student_id", "id"]),
+]
+
+@migration(2, "hot-path composite indexes", online=True)
+def m002_hot_path_indexes(conn):
+    for name, table, columns in HOT_PATH_INDEXES:
+        create_index(conn, name, table, columns)
+
+# после применения app заполняет колонку (backfill_readiness_scores)
+READINESS_SCORE_VERSION = 3
+
+@migration(READINESS_SCORE_VERSION, "student.readiness_score")
+def m003_readiness_score(conn):
+    add_col(conn, "student", "readiness_score", "INTEGER NOT NULL", "0")
+
+@migration(4, "student readiness ranking index", online=True)
+def m004_readiness_index(conn):
+    create_index(conn, "ix_student_readiness_score_id", "student", ["readiness_score", "id"])
+
+# после применения app заполняет колонку (backfill_skill_norm_names)
+SKILL_NORM_VERSION = 5
+
+@migration(SKILL_NORM_VERSION, "student_skill.norm_name")
+def m005_skill_norm_name(conn):
+    add_col(conn, "student_skill", "norm_name", "VARCHAR(120)", "''")
+
+@migration(6, "student skill frequency index", online=True)
+def m006_skill_norm_index(conn):
+    create_index(conn, "ix_student_skill_kind_norm_student", "student_skill", ["kind", "norm_name", "student_id"])
+
+
+# =============================
+# runner
+# =============================
+def _ensure_version_table(engine):
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {SCHEMA_TABLE} ("
+            "version INTEGER PRIMARY KEY, name VARCHAR(200) NOT NULL, applied_at TIMESTAMP NOT NULL)"
+        ))
+
+def applied_versions(engine) -> set[int]:
+    _ensure_version_table(engine)
+    with engine.connect() as conn:
+        return {int(v) for (v,) in conn.execute(text(f"SELECT version FROM {SCHEMA_TABLE}"))}
+
+def _record(conn, version: int, name: str):
+    conn.execute(
+        text(f"INSERT INTO {SCHEMA_TABLE} (version, name, applied_at) VALUES (:v, :n, :t)"),
+        {"v": version, "n": name[:200], "t": datetime.utcnow()},
+    )
+
+def run_migrations(engine) -> list[int]:
+    """Применяет недостающие миграции по возрастанию версии; возвращает применённые."""
+    done = applied_versions(engine)
+    applied = []
+    for version, name, fn, online in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in done:
+            continue
+        print(f"migration {version}: {name}")
+        try:
+            if online:
+                with engine.connect() as conn:
+                    fn(conn.execution_options(isolation_level="AUTOCOMMIT"))
+                with engine.begin() as conn:
+                    _record(conn, version, name)
+            else:
+                # схема и запись версии — одной транзакцией
+                with engine.begin() as conn:
+                    fn(conn)
+                    _record(conn, version, name)
+        except IntegrityError:
+            # ту же версию параллельно применил другой процесс
+            print(f"migration {version}: already recorded")
+            continue
+        applied.append(version)
+    return applied
+
+def main():
+    from app import app, db, backfill_readiness_scores, backfill_skill_norm_names, sqlite_vacuum
+
+    with app.app_context():
+        if "--backfill-readiness" in sys.argv:
+            print(f"readiness_score updated: {backfill_readiness_scores()}")
+            return
+        if "--backfill-skill-norm" in sys.argv:
+            print(f"norm_name updated: {backfill_skill_norm_names(only_missing=False)}")
+            return
+        if "--vacuum" in sys.argv:
+            if db.engine.dialect.name != "sqlite":
+                print("VACUUM: only for SQLite")
+                return
+            before, after = sqlite_vacuum()
+            print(f"VACUUM: {before} -> {after} pages, auto_vacuum=INCREMENTAL")
+            return
+        if "--status" in sys.argv:
+            done = applied_versions(db.engine)
+            for version, name, _, _ in sorted(MIGRATIONS, key=lambda m: m[0]):
+                print(f"{version:>4} {'applied' if version in done else 'pending'}  {name}")
+            return
+        run_migrations(db.engine)
     print("DONE")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
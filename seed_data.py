@@ -0,0 +1,269 @@
+"""
+Синтетические данные для нагрузочных проверок: пользователи, студенты, навыки, анализы,
+снапшоты, отклики, работодатели и канонические наборы навыков вакансий.
+
+Пишет в БД из DATABASE_URL пачками (executemany), детерминированно по --seed.
+Все записи помечены почтой *@seed.vector.local (и hh_id seed-*), --drop удаляет их.
+
+  DATABASE_URL=sqlite:////tmp/scale.db python seed_data.py --students 100000
+  python seed_data.py --students 5000 --employers 50 --vacancies 2000 --seed 7
+  python seed_data.py --drop
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
+import app as vector_app
+
+db = vector_app.db
+
+SEED_DOMAIN = "seed.vector.local"
+
+# роль -> ключевые навыки (как в key_skills hh.ru)
+ROLE_SKILLS = {
+    "Backend Developer": ["Python", "SQL", "PostgreSQL", "Django", "REST API", "Docker", "Git", "Linux", "Redis", "FastAPI"],
+    "Frontend Developer": ["JavaScript", "TypeScript", "React", "HTML", "CSS", "Git", "Vue.js", "REST API", "Figma", "Webpack"],
+    "QA Engineer": ["Тестирование", "Postman", "SQL", "Selenium", "Jira", "Git", "API", "Python", "Linux", "Чек-листы"],
+    "Аналитик данных": ["SQL", "Python", "Excel", "Power BI", "pandas", "Tableau", "Статистика", "MS SQL", "Git", "ClickHouse"],
+    "DevOps": ["Linux", "Docker", "Kubernetes", "CI/CD", "Git", "Ansible", "Bash", "Nginx", "Terraform", "Prometheus"],
+    "1С программист": ["1С: Предприятие", "1С: Бухгалтерия", "SQL", "Бухгалтерский учет", "MS SQL", "Git", "Excel"],
+    "Медицинская сестра": ["Уход за больными", "Первая помощь", "Медицинская документация", "Инъекции", "Работа с пациентами", "Санитарные нормы"],
+    "Инженер строитель": ["AutoCAD", "Сметы", "Чтение чертежей", "Revit", "Технический надзор", "СНиП", "Excel"],
+    "Менеджер по продажам": ["Продажи", "CRM", "Переговоры", "Холодные звонки", "Excel", "B2B", "Работа с возражениями"],
+    "Графический дизайнер": ["Figma", "Adobe Photoshop", "Adobe Illustrator", "Дизайн", "UI/UX", "Типографика", "CorelDRAW"],
+}
+COMMON_HARD = ["Английский язык", "Казахский язык", "MS Office", "Excel", "Git", "Google Sheets", "Деловая переписка"]
+SOFT_SKILLS = ["Коммуникация", "Работа в команде", "Самоорганизация", "Обучаемость", "Ответственность",
+               "Стрессоустойчивость", "Критическое мышление", "Тайм-менеджмент", "Лидерство", "Креативность"]
+CITIES = [("Алматы", 40), ("Астана", 25), ("Шымкент", 10), ("Караганда", 7), ("Актобе", 5),
+          ("Павлодар", 4), ("Усть-Каменогорск", 4), ("Атырау", 3), ("Костанай", 2)]
+COLLEGES = ["Алматинский политехнический колледж", "Колледж экономики и бизнеса", "Медицинский колледж",
+            "Строительный колледж", "IT-колледж", "Высший колледж связи"]
+PERSONALITIES = ["ИНТП", "ИНТД", "ЭНФП", "ИСТД", "ЭСТП", "ИНФД", "ЭНТД", "ИСФП"]
+STATUSES = [("sent", 60), ("viewed", 20), ("interview", 10), ("rejected", 8), ("hired", 2)]
+FIRST_NAMES = ["Айдана", "Ерлан", "Алия", "Данияр", "Мадина", "Нурлан", "Асель", "Тимур", "Жанна", "Арман"]
+LAST_NAMES = ["Ахметова", "Серикулы", "Жумабаева", "Касымов", "Ибраимова", "Оспанов", "Нургалиева", "Садыков"]
+
+
+def _weighted(rnd: random.Random, pairs):
+    values, weights = zip(*pairs)
+    return rnd.choices(values, weights=weights, k=1)[0]
+
+
+def _student_hard_skills(rnd: random.Random, role: str) -> list[str]:
+    # большинство навыков — из профиля роли, остальные — общие
+    core = ROLE_SKILLS[role]
+    picked = rnd.sample(core, k=rnd.randint(2, min(len(core), 7)))
+    picked += rnd.sample(COMMON_HARD, k=rnd.randint(0, 3))
+    return list(dict.fromkeys(picked))
+
+
+def _insert(model, rows: list[dict]):
+    if rows:
+        db.session.execute(db.insert(model), rows)
+
+
+def _ids_by(model, key_col, keys: list) -> dict:
+    # id вставленных строк по естественному ключу (без RETURNING — одинаково для SQLite и PostgreSQL)
+    return dict(db.session.query(key_col, model.id).filter(key_col.in_(keys)).all())
+
+
+def _not_after(ts: datetime, now: datetime) -> datetime:
+    # история не уходит в будущее: иначе временные ряды и окна прореживания снапшотов считают её свежей
+    return min(ts, now)
+
+
+def seed_vacancies(rnd: random.Random, tag: str, n: int, employers: int, now: datetime) -> list[tuple[str, str]]:
+    """VacancySkillSet (+ работодатели с анализами вакансий); возвращает [(hh_id, роль)]."""
+    roles = list(ROLE_SKILLS)
+    vacancies = []
+    rows = []
+    for j in range(n):
+        role = roles[j % len(roles)]
+        hh_id = f"seed-{tag}-{j}"
+        skills = rnd.sample(ROLE_SKILLS[role], k=min(len(ROLE_SKILLS[role]), rnd.randint(4, 8)))
+        skills += rnd.sample(COMMON_HARD, k=rnd.randint(0, 2))
+        rows.append({"hh_id": hh_id, "skills_json": json.dumps(skills, ensure_ascii=False), "updated_at": now})
+        vacancies.append((hh_id, role))
+    _insert(vector_app.VacancySkillSet, rows)
+
+    if employers:
+        pw = generate_password_hash("seed-password")
+        emails = [f"emp-{tag}-{i}@{SEED_DOMAIN}" for i in range(employers)]
+        _insert(vector_app.User, [{"role": "employer", "email": e, "password_hash": pw, "created_at": now}
+                                  for e in emails])
+        user_ids = _ids_by(vector_app.User, vector_app.User.email, emails)
+        _insert(vector_app.Employer, [{"user_id": user_ids[e], "company": f"ТОО Компания {i}",
+                                       "city": _weighted(rnd, CITIES), "created_at": now}
+                                      for i, e in enumerate(emails)])
+        emp_ids = list(_ids_by(vector_app.Employer, vector_app.Employer.user_id, list(user_ids.values())).values())
+        _insert(vector_app.EmployerVacancyAnalysis, [{
+            "employer_id": emp_ids[j % len(emp_ids)], "title": role, "hh_id": hh_id,
+            "skills_json": json.dumps(ROLE_SKILLS[role][:6], ensure_ascii=False), "created_at": now,
+        } for j, (hh_id, role) in enumerate(vacancies[: employers * 5])])
+    db.session.commit()
+    return vacancies
+
+
+def seed_students(rnd: random.Random, tag: str, n: int, vacancies: list, args, now: datetime) -> dict:
+    pw = generate_password_hash("seed-password")  # один хэш на всех: pbkdf2 на 100k строк — минуты
+    by_role = {}
+    for hh_id, role in vacancies:
+        by_role.setdefault(role, []).append(hh_id)
+    roles = list(ROLE_SKILLS)
+    counts = dict.fromkeys(("users", "skills", "analyses", "skill_snapshots", "market_fit", "applications"), 0)
+
+    for start in range(0, n, args.batch):
+        idx = range(start, min(n, start + args.batch))
+        emails = [f"st-{tag}-{i}@{SEED_DOMAIN}" for i in idx]
+        created = {e: now - timedelta(days=rnd.randrange(args.days), seconds=rnd.randrange(86400)) for e in emails}
+        _insert(vector_app.User, [{"role": "student", "email": e, "password_hash": pw, "created_at": created[e]}
+                                  for e in emails])
+        user_ids = _ids_by(vector_app.User, vector_app.User.email, emails)
+
+        profiles = {}
+        st_rows = []
+        for e in emails:
+            role = rnd.choice(roles)
+            second = rnd.choice(roles)
+            has_resume = rnd.random() < 0.6
+            profiles[user_ids[e]] = (role, created[e])
+            st_rows.append({
+                "user_id": user_ids[e],
+                "full_name": f"{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}",
+                "city": _weighted(rnd, CITIES),
+                "college": rnd.choice(COLLEGES),
+                "speciality": role,
+                "start_year": str(rnd.randint(2019, 2025)),
+                "job_intent": rnd.choice(["yes", "maybe", "no"]),
+                "remote": rnd.random() < 0.3,
+                "roles_csv": ", ".join(dict.fromkeys([role, second])),
+                "resume_title": role if has_resume else "",
+                "resume_summary": f"Начинающий специалист: {role}." if has_resume else "",
+                "resume_contacts": "+7 700 000 00 00" if has_resume else "",
+                "projects_json": json.dumps([{"name": f"Учебный проект {role}", "url": "", "desc": ""}]
+                                            if rnd.random() < 0.4 else [], ensure_ascii=False),
+                "readiness_json": "{}",
+                "created_at": created[e],
+            })
+        _insert(vector_app.Student, st_rows)
+        student_ids = _ids_by(vector_app.Student, vector_app.Student.user_id, list(user_ids.values()))
+
+        skills, analyses, snaps, fits, apps = [], [], [], [], []
+        for user_id, sid in student_ids.items():
+            role, created_at = profiles[user_id]
+            if rnd.random() >= args.analyzed:
+                continue  # не прошёл интервью: ни навыков, ни анализа
+            hard = [(name, rnd.randint(30, 95)) for name in _student_hard_skills(rnd, role)]
+            soft = [(name, rnd.randint(40, 95)) for name in rnd.sample(SOFT_SKILLS, k=rnd.randint(2, 5))]
+            skills += [{"student_id": sid, "kind": "hard", "name": s, "score": sc} for s, sc in hard]
+            skills += [{"student_id": sid, "kind": "soft", "name": s, "score": sc} for s, sc in soft]
+            analyses.append({
+                "student_id": sid,
+                "personality_type": rnd.choice(PERSONALITIES),
+                "personality_short": "Любит разбираться в деталях и доводить дело до конца.",
+                "top_roles_json": json.dumps([role] + rnd.sample(roles, k=2), ensure_ascii=False),
+                "learning_plan_json": "[]",
+                "created_at": created_at,
+            })
+            skill_pack = json.dumps([{"name": s, "score": sc, "kind": "hard"} for s, sc in hard], ensure_ascii=False)
+            market = ROLE_SKILLS[role]
+            have = [s for s, _ in hard if s in market]
+            missing = [s for s in market if s not in have]
+            for k in range(rnd.randint(1, args.snapshots)):
+                ts = _not_after(created_at + timedelta(days=k * rnd.randint(1, 14)), now)
+                snaps.append({"student_id": sid, "created_at": ts, "personality_type": analyses[-1]["personality_type"],
+                              "skills_json": skill_pack, "note": "после анализа"})
+                fits.append({"student_id": sid, "created_at": ts, "role": role,
+                             "market_fit_percent": int(round(len(have) / len(market) * 100)),
+                             "missing_json": json.dumps(missing, ensure_ascii=False),
+                             "have_json": json.dumps(have, ensure_ascii=False),
+                             "top_market_json": json.dumps(market, ensure_ascii=False),
+                             "note": "после анализа"})
+            pool = by_role.get(role) or [hh for hh, _ in vacancies]
+            for hh_id in rnd.sample(pool, k=min(len(pool), rnd.randint(0, args.applications))):
+                apps.append({"student_id": sid, "hh_id": hh_id, "hh_url": f"https://hh.kz/vacancy/{hh_id}",
+                             "vacancy_name": role, "employer_name": "ТОО Компания", "status": _weighted(rnd, STATUSES),
+                             "created_at": _not_after(created_at + timedelta(days=rnd.randint(0, 30)), now)})
+
+        _insert(vector_app.StudentSkill, skills)
+        _insert(vector_app.StudentAnalysis, analyses)
+        _insert(vector_app.SkillSnapshot, snaps)
+        _insert(vector_app.MarketFitSnapshot, fits)
+        _insert(vector_app.VacancyApplication, apps)
+        db.session.commit()
+
+        for key, rows in (("users", emails), ("skills", skills), ("analyses", analyses),
+                          ("skill_snapshots", snaps), ("market_fit", fits), ("applications", apps)):
+            counts[key] += len(rows)
+        print(f"  students {min(n, start + args.batch):>8,}/{n:,}", flush=True)
+    return counts
+
+
+def drop_seeded():
+    """Удаляет всё, что создал seed_data.py (по почте *@seed.vector.local)."""
+    m = vector_app
+    users = db.session.query(m.User.id).filter(m.User.email.like(f"%@{SEED_DOMAIN}"))
+    students = db.session.query(m.Student.id).filter(m.Student.user_id.in_(users))
+    employers = db.session.query(m.Employer.id).filter(m.Employer.user_id.in_(users))
+    analyses = db.session.query(m.EmployerVacancyAnalysis.id).filter(m.EmployerVacancyAnalysis.employer_id.in_(employers))
+
+    m.CandidateStatus.query.filter(
+        m.CandidateStatus.student_id.in_(students) | m.CandidateStatus.vacancy_analysis_id.in_(analyses)
+    ).delete(synchronize_session=False)
+    for model in (m.StudentSkill, m.StudentAnalysis, m.SkillSnapshot, m.MarketFitSnapshot,
+                  m.VacancyApplication, m.StudentMessage):
+        model.query.filter(model.student_id.in_(students)).delete(synchronize_session=False)
+    m.EmployerVacancyAnalysis.query.filter(m.EmployerVacancyAnalysis.employer_id.in_(employers)).delete(synchronize_session=False)
+    m.Student.query.filter(m.Student.user_id.in_(users)).delete(synchronize_session=False)
+    m.Employer.query.filter(m.Employer.user_id.in_(users)).delete(synchronize_session=False)
+    m.VacancySkillSet.query.filter(m.VacancySkillSet.hh_id.like("seed-%")).delete(synchronize_session=False)
+    n = m.User.query.filter(m.User.email.like(f"%@{SEED_DOMAIN}")).delete(synchronize_session=False)
+    db.session.commit()
+    return n
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VECTOR AI synthetic dataset")
+    parser.add_argument("--students", type=int, default=10000)
+    parser.add_argument("--employers", type=int, default=20)
+    parser.add_argument("--vacancies", type=int, default=500, help="канонических наборов навыков (VacancySkillSet)")
+    parser.add_argument("--analyzed", type=float, default=0.8, help="доля студентов с анализом и навыками")
+    parser.add_argument("--snapshots", type=int, default=4, help="до N снапшотов истории на студента")
+    parser.add_argument("--applications", type=int, default=8, help="до N откликов на студента")
+    parser.add_argument("--days", type=int, default=365, help="разброс дат регистрации")
+    parser.add_argument("--batch", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--drop", action="store_true", help="удалить ранее сгенерированные данные и выйти")
+    args = parser.parse_args()
+
+    with vector_app.app.app_context():
+        print(f"backend: {db.engine.dialect.name} ({db.engine.url.render_as_string(hide_password=True)})")
+        if args.drop:
+            print(f"dropped users: {drop_seeded()}")
+            return
+
+        tag = str(args.seed)
+        if vector_app.User.query.filter(vector_app.User.email.like(f"%-{tag}-%@{SEED_DOMAIN}")).first():
+            raise SystemExit(f"seed {tag} already loaded: run with --drop first or pick another --seed")
+
+        rnd = random.Random(args.seed)
+        now = datetime.utcnow()
+        t0 = time.perf_counter()
+        vacancies = seed_vacancies(rnd, tag, args.vacancies, args.employers, now)
+        counts = seed_students(rnd, tag, args.students, vacancies, args, now)
+        vector_app.backfill_readiness_scores()
+        dt = time.perf_counter() - t0
+
+    total = sum(counts.values()) + len(vacancies)
+    print(f"vacancies {len(vacancies):,}, employers {args.employers:,}, "
+          + ", ".join(f"{k} {v:,}" for k, v in counts.items()))
+    print(f"DONE: {total:,} rows in {dt:.1f} s ({total / max(dt, 1e-9):,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()